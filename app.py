@@ -1,14 +1,26 @@
 import streamlit as st
 import requests
 import json
+import time
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
-import re
-from google_sheets_handler import GoogleSheetsHandler
-import dateparser
+from google_sheets_handler import GoogleSheetsHandler, save_to_google_sheets as save_new_appointment
+from appointment_mirror import AppointmentMirror
+from slot_extractor import extract_slots
+from clinic_config import clinic_config
+from specialty_router import SpecialtyRouter
+from config import (
+    API_URL, API_CONNECT_TIMEOUT_SECONDS, API_READ_TIMEOUT_SECONDS, API_MAX_RETRIES,
+    API_RETRY_BACKOFF_SECONDS, API_POOL_SIZE,
+)
+
+# Re-read on every rerun; the file is only parsed again when it has changed
+clinic = clinic_config.current()
 
 # Page configuration
 st.set_page_config(
-    page_title="HealthCare Plus Clinic Chatbot",
+    page_title=f"{clinic.clinic_name} Chatbot",
     page_icon="🏥",
     layout="wide"
 )
@@ -29,16 +41,8 @@ if "appointment_saved" not in st.session_state:
     st.session_state.appointment_saved = False
 if "last_processed_message" not in st.session_state:  # Track last processed message
     st.session_state.last_processed_message = None
-import re
-
-def clean_markdown(text: str) -> str:
-    """Remove basic Markdown formatting like **bold** or _italic_."""
-    if not text:
-        return text
-    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)  # remove **bold**
-    text = re.sub(r"\*(.*?)\*", r"\1", text)      # remove *italic*
-    text = re.sub(r"_(.*?)_", r"\1", text)        # remove _italic_
-    return text.strip()
+if "session_id" not in st.session_state:  # Server-side conversation this browser tab owns
+    st.session_state.session_id = None
 
 # Track conversation progress
 def update_conversation_state():
@@ -52,60 +56,88 @@ def update_conversation_state():
     else:
         st.session_state.conversation_state = "ready_to_confirm"
 
-# API URL
-API_URL = "http://localhost:8000"
+API_TIMEOUT = (API_CONNECT_TIMEOUT_SECONDS, API_READ_TIMEOUT_SECONDS)
+
+@st.cache_resource
+def get_api_session():
+    """One pooled, keep-alive HTTP session shared by every browser tab.
+
+    Connection failures are retried for every call, since nothing reached the API.
+    Error statuses are only retried for idempotent methods (GET, DELETE); a chat turn
+    rejected as busy is retried by stream_chat_response, which knows it is safe.
+    """
+    retry = Retry(
+        total=API_MAX_RETRIES,
+        connect=API_MAX_RETRIES,
+        read=API_MAX_RETRIES,
+        status=API_MAX_RETRIES,
+        backoff_factor=API_RETRY_BACKOFF_SECONDS,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS", "DELETE"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=API_POOL_SIZE, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+api = get_api_session()
+
+@st.cache_resource
+def get_specialty_router():
+    """Offline complaint -> department matching for the fallback when the API is down"""
+    return SpecialtyRouter()
 
 # Initialize Google Sheets handler
 @st.cache_resource
 def get_sheets_handler():
     return GoogleSheetsHandler()
 
+@st.cache_resource
+def get_appointment_mirror(_handler):
+    mirror = AppointmentMirror(_handler)
+    mirror.start()
+    return mirror
+
 try:
     sheets_handler = get_sheets_handler()
+    appointment_mirror = get_appointment_mirror(sheets_handler)
     sheets_available = True
 except Exception:
     sheets_available = False
 
 # App title and description
-st.title("🏥 HealthCare Plus Clinic Chatbot")
+st.title(f"🏥 {clinic.clinic_name} Chatbot")
 st.markdown("""
 Welcome to our clinic's virtual assistant! I'm here to help you schedule an appointment 
 with one of our specialists. Please chat with me to book your visit.
 """)
 
-# Doctors information
-doctors_info = {
-    "General Medicine": ["Dr. Smith", "Dr. Johnson"],
-    "Cardiology": ["Dr. Williams", "Dr. Brown"],
-    "Dermatology": ["Dr. Davis", "Dr. Miller"],
-    "Orthopedics": ["Dr. Wilson", "Dr. Moore"],
-    "Pediatrics": ["Dr. Taylor", "Dr. Anderson"],
-    "Neurology": ["Dr. Thomas", "Dr. Jackson"]
-}
-
 # Create a container for the sidebar
 sidebar = st.sidebar
 
 with sidebar:
-    st.header("🏥 HealthCare Plus Clinic")
+    st.header(f"🏥 {clinic.clinic_name}")
     
     st.subheader("👨‍⚕️ Our Specialists")
-    for specialty, doctors in doctors_info.items():
+    for specialty, doctors in clinic.specialties.items():
         with st.expander(f"{specialty}"):
             for doctor in doctors:
                 st.write(f"• {doctor}")
     
     st.write("---")
     st.subheader("🕒 Working Hours")
-    st.write("**Weekdays:** 9:00 AM - 6:00 PM")
-    st.write("**Saturdays:** 10:00 AM - 4:00 PM")
-    st.write("**Sundays:** Closed")
+    st.write(f"**Weekdays:** {clinic.working_hours['weekdays']}")
+    st.write(f"**Saturdays:** {clinic.working_hours['saturdays']}")
+    st.write(f"**Sundays:** {clinic.working_hours['sundays']}")
     
     st.write("---")
     st.subheader("📞 Contact Info")
-    st.write("**Phone:** +1-555-123-4567")
-    st.write("**Email:** info@healthcareplus.com")
-    st.write("**Address:** 123 Medical Plaza, Health City, HC 12345")
+    st.write(f"**Phone:** {clinic.contact_info['phone']}")
+    st.write(f"**Email:** {clinic.contact_info['email']}")
+    st.write(f"**Address:** {clinic.contact_info['address']}")
     
     st.write("---")
     st.subheader("📋 Your Appointment Status")
@@ -120,6 +152,12 @@ with sidebar:
     st.write(f"{time_status} **Time:** {st.session_state.patient_info['appointment_time'] or 'Not set'}")
     
     if st.button("Reset Conversation"):
+        if st.session_state.session_id:
+            try:
+                api.delete(f"{API_URL}/chat/{st.session_state.session_id}", timeout=API_TIMEOUT)
+            except requests.exceptions.RequestException:
+                pass
+        st.session_state.session_id = None
         st.session_state.messages = []
         st.session_state.patient_info = {
             "name": None,
@@ -136,16 +174,8 @@ def save_to_google_sheets(patient_info):
     if not sheets_available:
         return False
     
-    try:
-        success = sheets_handler.add_appointment(
-            patient_info["name"],
-            patient_info.get("recommended_doctor", "Not specified"),
-            patient_info.get("appointment_date", "Not specified"),
-            patient_info.get("appointment_time", "Not specified")
-        )
-        return success
-    except Exception as e:
-        return False
+    # Skips appointments already present in the sheet
+    return save_new_appointment(sheets_handler, appointment_mirror, patient_info)
 
 def get_fallback_response(user_input, message_history):
     """Simple fallback responses when the main API is down"""
@@ -158,7 +188,7 @@ def get_fallback_response(user_input, message_history):
     # Simple rule-based responses
     if any(greeting in user_input_lower for greeting in ["hi", "hello", "hey", "hola"]):
         st.session_state.conversation_state = "asking_name"
-        return "Hello! Welcome to HealthCare Plus Clinic. I'm here to help you schedule an appointment. May I know your name please?"
+        return f"Hello! Welcome to {clinic.clinic_name}. I'm here to help you schedule an appointment. May I know your name please?"
     
     elif st.session_state.conversation_state == "asking_name":
         # If it's a reasonable name (not just "yes", "no", etc.)
@@ -173,30 +203,23 @@ def get_fallback_response(user_input, message_history):
             return "Could you please tell me your name again?"
     
     elif st.session_state.conversation_state == "asking_doctor":
-        if any(dept in user_input_lower for dept in ["general medicine", "general"]):
-            st.session_state.patient_info["recommended_doctor"] = "Dr. Smith"
+        match = get_specialty_router().route(user_input)
+        if match:
+            st.session_state.patient_info["recommended_doctor"] = match.doctor
             update_conversation_state()
-            return "Thank you! I recommend Dr. Smith from our general medicine department. When would you like to schedule your appointment?"
-        elif any(dept in user_input_lower for dept in ["dermatology", "skin"]):
-            st.session_state.patient_info["recommended_doctor"] = "Dr. Davis"
-            update_conversation_state()
-            return "Thank you! I recommend Dr. Davis from our dermatology department. When would you like to schedule your appointment?"
+            return f"Thank you! I recommend {match.doctor} from our {match.label.lower()} department. When would you like to schedule your appointment?"
         else:
             return "Thank you! When would you like to schedule your appointment?"
     
     elif st.session_state.conversation_state == "asking_time":
         # Try to extract date and time
-        date_pattern = r"(\d{1,2}\s+(january|february|march|april|may|june|july|august|september|october|november|december)\s+\d{4})"
-        time_pattern = r"(\d{1,2}:\d{2}\s*(am|pm))"
-        
-        date_match = re.search(date_pattern, user_input_lower)
-        time_match = re.search(time_pattern, user_input_lower)
+        slots = extract_slots(user_input)
         
-        if date_match:
-            st.session_state.patient_info["appointment_date"] = date_match.group(1).title()
+        if slots.date:
+            st.session_state.patient_info["appointment_date"] = slots.date.title()
         
-        if time_match:
-            st.session_state.patient_info["appointment_time"] = time_match.group(1).upper()
+        if slots.time:
+            st.session_state.patient_info["appointment_time"] = slots.time
         
         if st.session_state.patient_info["appointment_date"] and st.session_state.patient_info["appointment_time"]:
             update_conversation_state()
@@ -226,93 +249,69 @@ def get_fallback_response(user_input, message_history):
         return "I'm here to help you schedule an appointment. Could you please tell me your name so we can get started?"
 
 
-def update_patient_info_from_conversation(user_input, bot_response):
-    """Extract patient information from formatted confirmation messages"""
-    bot_response_lower = bot_response.lower()
-    
-    # Check if we've already processed and saved this appointment
-    if st.session_state.get("appointment_saved", False):
-        print("Appointment already saved, skipping extraction")
-        return None
-    
-    # Check if this is a formatted confirmation message with all details
-    is_formatted_message = all([
-        "date:" in bot_response_lower,
-        "time:" in bot_response_lower,
-        "doctor name:" in bot_response_lower or "doctor:" in bot_response_lower,
-        "patient name:" in bot_response_lower or "name:" in bot_response_lower
-    ])
-    
-    # Only extract information if this is a formatted confirmation message
-    if is_formatted_message:
-        print(f"Processing formatted confirmation message: {bot_response}")
-        
-        # Extract name - look for "Your Name: " or "Name: " followed by the name
-        name_patterns = [
-            r"patient name:\s*([^\n]+)",
-            r"your name:\s*([^\n]+)",
-            r"name:\s*([^\n]+)"
-        ]
-        
-        for pattern in name_patterns:
-            name_match = re.search(pattern, bot_response, re.IGNORECASE)
-            if name_match:
-                st.session_state.patient_info["name"] = clean_markdown(name_match.group(1))
-                print(f"Extracted name: {st.session_state.patient_info['name']}")
-                break
-        
-        # Extract doctor - look for "Doctor: " or "Doctor Name: " followed by the doctor's name
-        doctor_pattern = r"(?:doctor name|doctor):\s*([^\n]+)"
-        doctor_match = re.search(doctor_pattern, bot_response, re.IGNORECASE)
-        
-        if doctor_match:
-            st.session_state.patient_info["recommended_doctor"] = clean_markdown(doctor_match.group(1))
-            print(f"Extracted doctor: {st.session_state.patient_info['recommended_doctor']}")
-        
-        # Extract date - look for "Date: " followed by the date
-        date_pattern = r"date:\s*([^\n]+)"
-        date_match = re.search(date_pattern, bot_response, re.IGNORECASE)
-        if date_match:
-            st.session_state.patient_info["appointment_date"] = clean_markdown(date_match.group(1))
-            print(f"Extracted date: {st.session_state.patient_info['appointment_date']}")
-        
-        # Extract time - look for "Time: " followed by the time
-        time_pattern = r"time:\s*([^\n]+)"
-        time_match = re.search(time_pattern, bot_response, re.IGNORECASE)
-        if time_match:
-            st.session_state.patient_info["appointment_time"] = clean_markdown(time_match.group(1))
-            print(f"Extracted time: {st.session_state.patient_info['appointment_time']}")
-        
-        # Update conversation state based on what we extracted
-        update_conversation_state()
-        
-        # If we successfully extracted all information, return a confirmation message
-        if all([
-            st.session_state.patient_info.get("name"),
-            st.session_state.patient_info.get("recommended_doctor"),
-            st.session_state.patient_info.get("appointment_date"),
-            st.session_state.patient_info.get("appointment_time")
-        ]):
-            # Save to Google Sheets if all info is available AND not already saved
-            if sheets_available and not st.session_state.get("appointment_saved", False):
-                success = save_to_google_sheets(st.session_state.patient_info)
-                if success:
-                    st.session_state.appointment_saved = True  # Mark as saved
-                    print("Appointment saved to Google Sheets")
+def apply_booking_update(result):
+    """Update the sidebar from the structured booking fields the API returns; no parsing needed"""
+    appointment = result.get("appointment") or {}
+    for field, key in [("name", "patient_name"), ("recommended_doctor", "recommended_doctor"),
+                       ("appointment_date", "appointment_date"), ("appointment_time", "appointment_time")]:
+        if appointment.get(key):
+            st.session_state.patient_info[field] = appointment[key]
+    # The slot was taken before the save; the reply has asked the patient for another time
+    if result.get("booking_status") == "conflict" and not result.get("booking_complete"):
+        st.session_state.patient_info["appointment_time"] = None
+    update_conversation_state()
+
+    # The server saves a confirmed appointment itself, exactly once
+    if result.get("booking_complete"):
+        st.session_state.appointment_saved = result.get("booking_status") in ("booked", "duplicate")
+        st.session_state.conversation_state = "done"
+
+class ChatStreamError(Exception):
+    """The API reported an error in the middle of a streamed reply"""
+
+    def __init__(self, detail, retry_after=None):
+        super().__init__(detail)
+        # Set when the API was too busy to start the turn, so sending it again is safe
+        self.retry_after = retry_after
+
+
+def stream_chat_response(user_input):
+    """Yield reply tokens from the API's Server-Sent Events stream, retrying while it is too busy"""
+    for attempt in range(API_MAX_RETRIES + 1):
+        try:
+            yield from _stream_chat_once(user_input)
+            return
+        except ChatStreamError as e:
+            if e.retry_after is None or attempt == API_MAX_RETRIES:
+                raise
+            time.sleep(max(float(e.retry_after), API_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+
+def _stream_chat_once(user_input):
+    with api.post(
+        f"{API_URL}/chat/stream",
+        json={"message": user_input, "session_id": st.session_state.session_id},
+        stream=True,
+        timeout=API_TIMEOUT,
+    ) as response:
+        response.raise_for_status()
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = "message"
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                payload = json.loads(line[len("data:"):])
+                if event == "session":
+                    st.session_state.session_id = payload["session_id"]
+                elif event == "error":
+                    raise ChatStreamError(payload["detail"], payload.get("retry_after"))
+                elif event == "done":
+                    st.session_state.last_chat_result = payload
+                    return
                 else:
-                    print("Failed to save appointment to Google Sheets")
-            
-            confirmation_message = (
-                f"✅ Thank you {st.session_state.patient_info['name']}! "
-                f"Your appointment with {st.session_state.patient_info['recommended_doctor']} "
-                f"has been booked on {st.session_state.patient_info['appointment_date']} at {st.session_state.patient_info['appointment_time']}."
-            )
-            st.session_state.conversation_state = "done"
-            return confirmation_message
-    
-    # If this isn't a formatted message, don't extract anything
-    print("Not a formatted confirmation message, skipping extraction")
-    return None
+                    yield payload["token"]
 
 for message in st.session_state.messages:
     with st.chat_message(message["role"]):
@@ -332,35 +331,20 @@ if prompt := st.chat_input("Type your message here..."):
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Get chatbot response (this is where the delay happens)
+        # Stream the chatbot response so the first tokens show up as soon as they are generated
         try:
-            # Show a spinner while waiting for API response
-            with st.spinner("Thinking..."):
-                response = requests.post(
-                    f"{API_URL}/chat",
-                    json={"message": prompt},
-                    timeout=8  # Reasonable timeout
-                )
-                
-            if response.status_code == 200:
-                bot_response = response.json()["response"]
-                
-                # Display assistant response
-                with st.chat_message("assistant"):
-                    st.markdown(bot_response)
-
-                # Add to chat history
-                st.session_state.messages.append({"role": "assistant", "content": bot_response})
-                
-                # Extract info (non-blocking, happens after response is shown)
-                if not st.session_state.get("appointment_saved", False):
-                    update_patient_info_from_conversation(prompt, bot_response)
-                
-        except requests.exceptions.RequestException as e:
+            with st.chat_message("assistant"):
+                bot_response = st.write_stream(stream_chat_response(prompt))
+
+            # Add to chat history
+            st.session_state.messages.append({"role": "assistant", "content": bot_response})
+
+            # Booking details arrive as structured fields with the final event
+            apply_booking_update(st.session_state.pop("last_chat_result", {}))
+
+        except (requests.exceptions.RequestException, ChatStreamError) as e:
             # Show fallback immediately
             fallback_response = get_fallback_response(prompt, st.session_state.messages)
             with st.chat_message("assistant"):
                 st.markdown(fallback_response)
             st.session_state.messages.append({"role": "assistant", "content": fallback_response})
-        
- 
\ No newline at end of file
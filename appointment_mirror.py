@@ -0,0 +1,86 @@
+import logging
+import threading
+import time
+from config import MIRROR_SYNC_INTERVAL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def appointment_key(patient_name, recommended_doctor, appointment_date, appointment_time):
+    """Index key for an appointment; case and surrounding whitespace are ignored"""
+    return tuple(
+        str(value or "").strip().lower()
+        for value in (patient_name, recommended_doctor, appointment_date, appointment_time)
+    )
+
+
+class AppointmentMirror:
+    """Local copy of the appointment sheet with a hash index on (patient, doctor, date, time).
+
+    The mirror only downloads rows past the last row it has seen, so a sync costs
+    O(new rows). Duplicate checks read the in-memory index and never touch the network.
+    """
+
+    def __init__(self, sheets_handler, sync_interval=MIRROR_SYNC_INTERVAL_SECONDS, on_new_rows=None):
+        self.sheets_handler = sheets_handler
+        # Called with each batch of newly mirrored rows, e.g. to update slot availability
+        self.on_new_rows = on_new_rows
+        self.sync_interval = sync_interval
+        self.rows = []
+        self._index = set()
+        # Sheet rows already mirrored, including the header row
+        self._synced_rows = 1
+        # Wall-clock time of the last successful sync, None until the first one
+        self.last_sync = None
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def sync(self):
+        """Fetch rows appended to the sheet since the last sync; return how many were added"""
+        try:
+            new_rows = self.sheets_handler.get_appointments_since(self._synced_rows + 1)
+        except Exception as e:
+            logger.warning(f"Appointment mirror sync failed: {str(e)}")
+            return 0
+
+        with self._lock:
+            for row in new_rows:
+                self.rows.append(row)
+                if len(row) >= 5:
+                    self._index.add(appointment_key(*row[1:5]))
+            self._synced_rows += len(new_rows)
+            self.last_sync = time.time()
+        if new_rows and self.on_new_rows:
+            self.on_new_rows(new_rows)
+        return len(new_rows)
+
+    def contains(self, patient_name, recommended_doctor, appointment_date, appointment_time):
+        key = appointment_key(patient_name, recommended_doctor, appointment_date, appointment_time)
+        with self._lock:
+            return key in self._index
+
+    def record(self, patient_name, recommended_doctor, appointment_date, appointment_time):
+        """Index a booking that has been accepted but may not have reached the sheet yet"""
+        key = appointment_key(patient_name, recommended_doctor, appointment_date, appointment_time)
+        with self._lock:
+            self._index.add(key)
+
+    def start(self):
+        """Do an initial sync, then keep syncing in the background"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sheets-mirror", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+
+    def __len__(self):
+        return len(self._index)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.sync()
+            self._stopping.wait(self.sync_interval)
@@ -0,0 +1,174 @@
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+from config import (
+    APPOINTMENT_QUEUE_DB, SHEETS_BATCH_SIZE, SHEETS_FLUSH_INTERVAL_SECONDS,
+    SHEETS_RETRY_BASE_SECONDS, SHEETS_RETRY_MAX_SECONDS,
+)
+from google_sheets_handler import appointment_row
+
+logger = logging.getLogger(__name__)
+
+
+class AppointmentQueue:
+    """Write-behind queue for bookings.
+
+    Each booking is committed to a local SQLite log first, so accepting it is a
+    local write. A background thread pushes pending rows to Google Sheets in
+    batches with append_rows, retrying with exponential backoff, and deletes them
+    from the log once Sheets has accepted them. Delivery is at-least-once: a crash
+    between the append and the delete re-sends that batch on restart.
+
+    Every uvicorn worker runs a flusher on the same log, so a batch is claimed in one
+    write transaction before it is sent and other workers skip claimed rows. A claim
+    that is never settled (the worker died mid-send) lapses after CLAIM_SECONDS.
+    """
+
+    CLAIM_SECONDS = 120
+
+    def __init__(self, sheets_handler, db_path=APPOINTMENT_QUEUE_DB, batch_size=SHEETS_BATCH_SIZE,
+                 flush_interval=SHEETS_FLUSH_INTERVAL_SECONDS, retry_base=SHEETS_RETRY_BASE_SECONDS,
+                 retry_max=SHEETS_RETRY_MAX_SECONDS):
+        self.sheets_handler = sheets_handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        # Workers share the file; wait for another worker's claim instead of failing
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, row TEXT NOT NULL, created_at REAL NOT NULL, claimed_at REAL)"
+        )
+        columns = [column[1] for column in self._conn.execute("PRAGMA table_info(pending)")]
+        if "claimed_at" not in columns:
+            # Logs written before claims existed
+            self._conn.execute("ALTER TABLE pending ADD COLUMN claimed_at REAL")
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self.failures = 0
+        self.flushed_rows = 0
+        self.api_calls = 0
+
+    def enqueue(self, patient_name, recommended_doctor, appointment_date, appointment_time):
+        """Durably record a booking and return its log id; Sheets is updated in the background"""
+        row = appointment_row(patient_name, recommended_doctor, appointment_date, appointment_time)
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT INTO pending (row, created_at) VALUES (?, ?)", (json.dumps(row), time.time())
+            )
+            self._conn.commit()
+        if self.pending_count() >= self.batch_size:
+            self._wake.set()
+        return cursor.lastrowid
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="sheets-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self, drain=True, timeout=30):
+        """Stop the flusher, first pushing whatever is pending when drain is set"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+        if drain:
+            deadline = time.monotonic() + timeout
+            while self._claimable_count() and time.monotonic() < deadline:
+                if not self.flush_once():
+                    break
+        remaining = self.pending_count()
+        if remaining:
+            logger.warning(f"{remaining} appointments left in the local log; they will be sent on next start")
+
+    def flush_once(self):
+        """Send one batch to Sheets; return True if the batch was delivered or nothing was pending"""
+        batch = self._claim()
+        if not batch:
+            return True
+
+        try:
+            self.api_calls += 1
+            self.sheets_handler.add_appointments([json.loads(row) for _, row in batch])
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"Failed to flush {len(batch)} appointments to Google Sheets: {str(e)}")
+            # Let the rows go so the next attempt, from any worker, picks them up
+            with self._db_lock:
+                self._conn.executemany("UPDATE pending SET claimed_at = NULL WHERE id = ?",
+                                       [(row_id,) for row_id, _ in batch])
+                self._conn.commit()
+            return False
+
+        with self._db_lock:
+            self._conn.executemany("DELETE FROM pending WHERE id = ?", [(row_id,) for row_id, _ in batch])
+            self._conn.commit()
+        self.failures = 0
+        self.flushed_rows += len(batch)
+        return True
+
+    def _claim(self):
+        """Mark the next unclaimed batch as this worker's, atomically across processes; return its rows"""
+        now = time.time()
+        with self._db_lock:
+            # IMMEDIATE takes the write lock up front, so two workers can't select the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                batch = self._conn.execute(
+                    "SELECT id, row FROM pending WHERE claimed_at IS NULL OR claimed_at < ? ORDER BY id LIMIT ?",
+                    (now - self.CLAIM_SECONDS, self.batch_size),
+                ).fetchall()
+                self._conn.executemany("UPDATE pending SET claimed_at = ? WHERE id = ?",
+                                       [(now, row_id) for row_id, _ in batch])
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return batch
+
+    def _claimable_count(self):
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM pending WHERE claimed_at IS NULL OR claimed_at < ?",
+                (time.time() - self.CLAIM_SECONDS,),
+            ).fetchone()[0]
+
+    def pending_count(self):
+        with self._db_lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def stats(self):
+        return {
+            "pending": self.pending_count(),
+            "flushed_rows": self.flushed_rows,
+            "api_calls": self.api_calls,
+            "consecutive_failures": self.failures,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self._next_delay())
+            self._wake.clear()
+            if self._stopping.is_set():
+                break
+            # Keep sending full batches while they are available and Sheets is healthy
+            while self.flush_once() and self._claimable_count() >= self.batch_size:
+                pass
+
+    def _next_delay(self):
+        if not self.failures:
+            return self.flush_interval
+        backoff = min(self.retry_max, self.retry_base * (2 ** (self.failures - 1)))
+        return backoff * random.uniform(0.5, 1.0)
@@ -0,0 +1,165 @@
+import re
+import threading
+from datetime import datetime, timedelta
+from clinic_config import clinic_config, doctor_key
+from config import APPOINTMENT_SLOT_MINUTES, AVAILABILITY_HORIZON_DAYS
+
+
+def parse_slot(appointment_date, appointment_time):
+    """Parse normalised 'YYYY-MM-DD' and 'HH:MM' strings; return None if they aren't in that form"""
+    try:
+        return datetime.strptime(f"{appointment_date} {appointment_time}", "%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return None
+
+
+class AvailabilityEngine:
+    """Per-doctor calendar of booked slots.
+
+    Each doctor has one integer bitmap per day, where bit i means the slot starting at
+    i * slot_minutes after midnight is taken. The clinic's open slots for a weekday are a
+    precomputed mask, so checking a slot is a dict lookup plus a bit test, and finding the
+    next free slots walks bits rather than appointments.
+
+    With claims (a slot_claims.SlotClaims), a booking must also win the slot in the store
+    every worker shares; the bitmap then only mirrors what this worker has seen.
+    """
+
+    def __init__(self, snapshot=None, slot_minutes=APPOINTMENT_SLOT_MINUTES,
+                 horizon_days=AVAILABILITY_HORIZON_DAYS, claims=None):
+        self.slot_minutes = slot_minutes
+        self.horizon_days = horizon_days
+        self.claims = claims
+        # doctor key -> {date ordinal: booked slot bitmap}
+        self._booked = {}
+        self._lock = threading.Lock()
+        if snapshot is None:
+            # Follow clinic_details.json, picking up schedule changes without a restart
+            snapshot = clinic_config.current()
+            clinic_config.subscribe(self.configure)
+        self.configure(snapshot)
+
+    def configure(self, snapshot):
+        """Adopt a clinic config snapshot's hours and doctors; bookings already made are kept"""
+        hours = snapshot.hours_table
+        open_masks = [self._open_mask(day_hours) for day_hours in hours]
+        doctors = {key: doctor for key, (doctor, _) in snapshot.doctor_index.items()}
+        names = "|".join(re.escape(key) for key in doctors)
+        pattern = re.compile(r"\b(?:dr\.?\s*|doctor\s+)?(" + names + r")\b", re.IGNORECASE)
+        # Surnames like Brown are ordinary words too; only "Dr. Brown" is sure to mean the doctor
+        titled_pattern = re.compile(r"\b(?:dr\.?\s*|doctor\s+)(" + names + r")\b", re.IGNORECASE)
+        # Each is swapped as a whole, so readers never see half of a reload
+        self.hours = hours
+        self.open_masks = open_masks
+        self._doctor_lookup = (doctors, pattern, titled_pattern)
+
+    @property
+    def doctors(self):
+        return self._doctor_lookup[0]
+
+    def find_doctor(self, text, titled=False):
+        """Return the clinic's spelling of the last doctor named in text, if any.
+
+        With titled, only names written with "Dr." or "doctor" in front count.
+        """
+        doctors, pattern, titled_pattern = self._doctor_lookup
+        matches = (titled_pattern if titled else pattern).findall(text or "")
+        return doctors[matches[-1].lower()] if matches else None
+
+    def find_doctors(self, text):
+        """All distinct clinic doctors named in text, in order of first mention"""
+        doctors, pattern, _ = self._doctor_lookup
+        found = dict.fromkeys(doctors[match.lower()] for match in pattern.findall(text or ""))
+        return list(found)
+
+    def is_open(self, when):
+        slot = self._slot_index(when)
+        return slot is not None and bool(self.open_masks[when.weekday()] >> slot & 1)
+
+    def is_free(self, doctor, when):
+        """True if the clinic is open at `when` and the doctor has nothing booked in that slot"""
+        if not self.is_open(when):
+            return False
+        with self._lock:
+            booked = self._booked.get(doctor_key(doctor), {}).get(when.toordinal(), 0)
+        return not booked >> self._slot_index(when) & 1
+
+    def book(self, doctor, when):
+        """Reserve a slot; return False if it is closed or already taken"""
+        if not self.is_open(when):
+            return False
+        slot_bit = 1 << self._slot_index(when)
+        with self._lock:
+            days = self._booked.setdefault(doctor_key(doctor), {})
+            booked = days.get(when.toordinal(), 0)
+            if booked & slot_bit:
+                return False
+            days[when.toordinal()] = booked | slot_bit
+        if self.claims and not self.claims.claim(doctor, when):
+            # Another worker holds it; keep the bit so the slot isn't offered from here again
+            return False
+        return True
+
+    def release(self, doctor, when):
+        slot = self._slot_index(when)
+        if slot is None:
+            return
+        if self.claims:
+            self.claims.release(doctor, when)
+        with self._lock:
+            days = self._booked.get(doctor_key(doctor), {})
+            if when.toordinal() in days:
+                days[when.toordinal()] &= ~(1 << slot)
+
+    def upcoming_bookings(self, doctor, today=None):
+        """Number of slots booked for the doctor from today on"""
+        first_day = (today or datetime.now().date()).toordinal()
+        with self._lock:
+            days = dict(self._booked.get(doctor_key(doctor), {}))
+        return sum(bin(booked).count("1") for ordinal, booked in days.items() if ordinal >= first_day)
+
+    def next_free_slots(self, doctor, after, count=3):
+        """Return up to `count` free slot start times for the doctor at or after `after`"""
+        key = doctor_key(doctor)
+        results = []
+        first_slot = -(-(after.hour * 60 + after.minute) // self.slot_minutes)  # round up
+        day = after.date()
+        with self._lock:
+            days = dict(self._booked.get(key, {}))
+
+        for offset in range(self.horizon_days):
+            current = day + timedelta(days=offset)
+            free = self.open_masks[current.weekday()] & ~days.get(current.toordinal(), 0)
+            if offset == 0:
+                free &= ~((1 << first_slot) - 1)
+            while free and len(results) < count:
+                slot = (free & -free).bit_length() - 1
+                free &= free - 1
+                results.append(datetime.combine(current, datetime.min.time())
+                               + timedelta(minutes=slot * self.slot_minutes))
+            if len(results) >= count:
+                break
+        return results
+
+    def load(self, rows):
+        """Mark the slots of sheet rows [timestamp, patient, doctor, date, time] as booked"""
+        for row in rows:
+            if len(row) < 5:
+                continue
+            when = parse_slot(row[3], row[4])
+            if when:
+                self.book(row[2], when)
+
+    def _slot_index(self, when):
+        minutes = when.hour * 60 + when.minute
+        if minutes % self.slot_minutes:
+            return None
+        return minutes // self.slot_minutes
+
+    def _open_mask(self, hours):
+        if hours is None:
+            return 0
+        opens, closes = hours
+        first = -(-opens // self.slot_minutes)
+        last = closes // self.slot_minutes  # the last slot must start before closing
+        return ((1 << last) - 1) & ~((1 << first) - 1)
@@ -0,0 +1,77 @@
+import asyncio
+import time
+from llm_scheduler import LLMQueueFullError
+from config import BATCH_PARALLELISM, BATCH_BUSY_RETRIES
+
+# Items without a session key each get a conversation of their own
+_NO_SESSION = object()
+
+
+async def run_batch(items, session_for, parallelism=BATCH_PARALLELISM, finish=None):
+    """Run many chat turns concurrently and return one result dict per item, in input order.
+
+    items is a list of (session_key, message). Turns that share a session_key run one
+    after another, in order, on the same conversation; different conversations run in
+    parallel, at most `parallelism` turns at a time. session_for(session_key) returns
+    (session_id, engine) and is called once per conversation; a key of None starts a
+    fresh conversation for that item alone. finish(session_id, engine), if given, is
+    called after each turn and its dict is merged into the item's result.
+    """
+    conversations = {}
+    for index, (session_key, message) in enumerate(items):
+        key = (_NO_SESSION, index) if session_key is None else session_key
+        conversations.setdefault(key, []).append((index, message))
+
+    results = [None] * len(items)
+    semaphore = asyncio.Semaphore(max(1, parallelism))
+
+    async def run_conversation(key, turns):
+        fresh = isinstance(key, tuple) and key[0] is _NO_SESSION
+        session_id, engine = session_for(None if fresh else key)
+        for index, message in turns:
+            async with semaphore:
+                results[index] = await _run_turn(session_id, engine, message, finish)
+
+    await asyncio.gather(*(run_conversation(key, turns) for key, turns in conversations.items()))
+    return results
+
+
+async def _run_turn(session_id, engine, message, finish):
+    start = time.perf_counter()
+    result = {"session_id": session_id, "response": None, "error": None}
+    for attempt in range(BATCH_BUSY_RETRIES + 1):
+        try:
+            result["response"] = await engine.aget_response(message)
+            break
+        except LLMQueueFullError as e:
+            # A rejected turn isn't recorded, so it is safe to send again once there is room
+            if attempt == BATCH_BUSY_RETRIES:
+                result["error"] = str(e)
+            else:
+                await asyncio.sleep(e.retry_after)
+        except Exception as e:
+            result["error"] = str(e)
+            break
+    if finish:
+        result.update(finish(session_id, engine))
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    return result
+
+
+def chat_batch(items, engine_factory=None, parallelism=BATCH_PARALLELISM):
+    """Run a batch outside the API, with a new isolated ChatbotEngine per conversation.
+
+    Takes the same (session_key, message) items as run_batch; the keys only group turns
+    into conversations. Pass engine_factory to share an LLM client or use a fake one.
+    """
+    if engine_factory is None:
+        from chatbot_engine import ChatbotEngine
+        engine_factory = ChatbotEngine
+
+    def session_for(session_key):
+        return session_key, engine_factory()
+
+    def finish(session_id, engine):
+        return {"booking_state": engine.booking.state, "appointment": engine.booking.details()}
+
+    return asyncio.run(run_batch(items, session_for, parallelism, finish))
@@ -0,0 +1,114 @@
+"""Micro-benchmark: per-message cost of slot extraction, old regex loops vs slot_extractor.
+
+Run from the repository root:
+    python benchmarks/bench_slot_extractor.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from slot_extractor import extract_slots, parse_recap  # noqa: E402
+
+MESSAGES = [
+    "Hi, my name is John Smith",
+    "I'd like to see Dr. Williams on 12 March 2026 at 10:30 AM",
+    "I have had a bad headache for three days and some dizziness",
+    "tomorrow at 3 PM works for me",
+    "What are your opening hours?",
+]
+
+RECAP = (
+    "Here is your appointment recap:\n"
+    "**Patient Name:** John Smith\n"
+    "**Doctor Name:** Dr. Williams\n"
+    "**Date:** 12 March 2026\n"
+    "**Time:** 10:30 AM\n"
+    "Thank you for choosing HealthCare Plus Clinic!"
+)
+
+
+def legacy_extract_info(text, info_type):
+    """The per-call pattern lists ChatbotEngine.extract_info used to build"""
+    if info_type == "name":
+        patterns = [r"my name is ([A-Za-z\s]+)", r"i'm ([A-Za-z\s]+)",
+                    r"call me ([A-Za-z\s]+)", r"this is ([A-Za-z\s]+)"]
+    elif info_type == "doctor":
+        patterns = [r"Dr\. ([A-Za-z\s]+)", r"doctor ([A-Za-z\s]+)"]
+    elif info_type == "date":
+        patterns = [r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
+                    r"(\d{1,2} (January|February|March|April|May|June|July|August|September|October|November|December) \d{4})",
+                    r"(today|tomorrow)"]
+    else:
+        patterns = [r"(\d{1,2}:\d{2} (AM|PM))", r"(\d{1,2} (AM|PM))", r"(\d{1,2} o'clock)"]
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            return match.group(1).strip()
+    return None
+
+
+def legacy_clean_markdown(text):
+    text = re.sub(r"\*\*(.*?)\*\*", r"\1", text)
+    text = re.sub(r"\*(.*?)\*", r"\1", text)
+    text = re.sub(r"_(.*?)_", r"\1", text)
+    return text.strip()
+
+
+def legacy_parse_recap(text):
+    """The substring checks and searches app.py ran on every assistant message"""
+    lower = text.lower()
+    if not all(["date:" in lower, "time:" in lower, "doctor:" in lower or "doctor name:" in lower,
+                "name:" in lower]):
+        return None
+    result = {}
+    for pattern in [r"patient name:\s*([^\n]+)", r"your name:\s*([^\n]+)", r"name:\s*([^\n]+)"]:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            result["name"] = legacy_clean_markdown(match.group(1))
+            break
+    for field, pattern in [("doctor", r"(?:doctor name|doctor):\s*([^\n]+)"),
+                           ("date", r"date:\s*([^\n]+)"), ("time", r"time:\s*([^\n]+)")]:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            result[field] = legacy_clean_markdown(match.group(1))
+    return result
+
+
+def legacy_messages():
+    for message in MESSAGES:
+        for info_type in ("name", "doctor", "date", "time"):
+            legacy_extract_info(message, info_type)
+
+
+def new_messages():
+    # Bypass the memo so the benchmark measures the scan itself
+    for message in MESSAGES:
+        extract_slots.__wrapped__(message)
+
+
+def cached_messages():
+    for message in MESSAGES:
+        extract_slots(message)
+
+
+def report(label, func, number, per=1):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number / per
+    print(f"{label:<32} {seconds * 1e6:9.2f} us")
+    return seconds
+
+
+if __name__ == "__main__":
+    n = len(MESSAGES)
+    print(f"Slot extraction over {n} messages (per message):")
+    old = report("  legacy extract_info x4", legacy_messages, 2000, per=n)
+    new = report("  extract_slots (uncached)", new_messages, 2000, per=n)
+    report("  extract_slots (memoised)", cached_messages, 2000, per=n)
+    print(f"  speed-up: {old / new:.1f}x")
+
+    print("Recap parsing:")
+    old = report("  legacy app.py scrape", lambda: legacy_parse_recap(RECAP), 5000)
+    new = report("  parse_recap", lambda: parse_recap(RECAP), 5000)
+    print(f"  speed-up: {old / new:.1f}x")
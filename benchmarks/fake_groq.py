@@ -0,0 +1,127 @@
+"""Local stand-in for the Groq chat completions API, for offline load tests.
+
+Serves the OpenAI-compatible /openai/v1/chat/completions route the groq client calls,
+streaming or not, with configurable time to first token, jitter and token rate.
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port>.
+
+    python benchmarks/fake_groq.py --port 8100 --latency-ms 300 --jitter-ms 100 --tokens-per-second 400
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Canned replies chosen by what the patient's last message looks like
+REPLIES = [
+    ("name", "Thank you! Based on what you've described, I recommend seeing one of our general "
+             "medicine doctors, Dr. Smith or Dr. Johnson. Which doctor would you prefer?"),
+    ("headache", "I'm sorry to hear about your headache and dizziness. I recommend seeing Dr. Thomas, "
+                 "one of our neurologists. When would you like to come in?"),
+    ("", "Hello! Welcome to HealthCare Plus Clinic. May I know your name, please?"),
+]
+
+settings = {
+    "latency_ms": float(os.getenv("FAKE_GROQ_LATENCY_MS", "300")),
+    "jitter_ms": float(os.getenv("FAKE_GROQ_JITTER_MS", "100")),
+    "tokens_per_second": float(os.getenv("FAKE_GROQ_TOKENS_PER_SECOND", "400")),
+    "error_rate": float(os.getenv("FAKE_GROQ_ERROR_RATE", "0")),
+}
+
+app = FastAPI(title="Fake Groq")
+
+
+def pick_reply(messages):
+    last = next((m.get("content", "") for m in reversed(messages) if m.get("role") == "user"), "")
+    last = last.lower()
+    return next(reply for keyword, reply in REPLIES if keyword in last)
+
+
+def first_token_delay():
+    jitter = random.uniform(-settings["jitter_ms"], settings["jitter_ms"])
+    return max(0.0, settings["latency_ms"] + jitter) / 1000
+
+
+def tokenize(text):
+    """Words with their trailing space, roughly how the real model streams"""
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + words[-1:]
+
+
+def usage(messages, tokens):
+    prompt_tokens = sum(len(m.get("content", "")) // 4 + 4 for m in messages)
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens)}
+
+
+@app.post("/openai/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    model = body.get("model", "fake")
+    if random.random() < settings["error_rate"]:
+        return JSONResponse({"error": {"message": "fake overload"}}, status_code=503)
+
+    reply = pick_reply(messages)
+    tokens = tokenize(reply)
+    per_token = 1 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    created = int(time.time())
+
+    if not body.get("stream"):
+        await asyncio.sleep(first_token_delay() + per_token * len(tokens))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            "usage": usage(messages, tokens),
+        }
+
+    def chunk(delta, finish_reason=None, **extra):
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }) + "\n\n"
+
+    async def stream():
+        await asyncio.sleep(first_token_delay())
+        yield chunk({"role": "assistant", "content": ""})
+        for token in tokens:
+            yield chunk({"content": token})
+            await asyncio.sleep(per_token)
+        yield chunk({}, "stop", x_groq={"usage": usage(messages, tokens)})
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency-ms", type=float, default=settings["latency_ms"], help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=settings["jitter_ms"], help="+/- uniform jitter")
+    parser.add_argument("--tokens-per-second", type=float, default=settings["tokens_per_second"])
+    parser.add_argument("--error-rate", type=float, default=settings["error_rate"],
+                        help="fraction of calls answered with a 503")
+    args = parser.parse_args()
+    settings.update(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                    tokens_per_second=args.tokens_per_second, error_rate=args.error_rate)
+
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
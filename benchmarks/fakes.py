@@ -0,0 +1,75 @@
+"""Offline stand-ins for the network-backed pieces the benchmarks touch."""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google_sheets_handler import GoogleSheetsHandler, HEADERS  # noqa: E402
+
+DOCTORS = ["Dr. Smith", "Dr. Johnson", "Dr. Williams", "Dr. Brown", "Dr. Davis", "Dr. Miller"]
+
+
+def make_rows(count):
+    """Deterministic appointment rows shaped like the real sheet"""
+    return [
+        [
+            f"2025-01-01 09:{i % 60:02d}:00",
+            f"Patient {i}",
+            DOCTORS[i % len(DOCTORS)],
+            f"2026-{i % 12 + 1:02d}-{i % 28 + 1:02d}",
+            f"{9 + i % 9:02d}:{(i % 2) * 30:02d}",
+        ]
+        for i in range(count)
+    ]
+
+
+class FakeWorksheet:
+    """In-memory gspread worksheet supporting the calls GoogleSheetsHandler makes.
+
+    latency adds a fixed delay to every call, standing in for the Sheets API round trip.
+    """
+
+    def __init__(self, rows=(), latency=0.0):
+        self.values = [list(HEADERS)] + [list(row) for row in rows]
+        self.requests = 0
+        self.latency = latency
+
+    def _request(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def row_values(self, row):
+        self._request()
+        return list(self.values[row - 1]) if row <= len(self.values) else []
+
+    def insert_row(self, values, index=1):
+        self._request()
+        self.values.insert(index - 1, list(values))
+
+    def append_row(self, values):
+        self._request()
+        self.values.append(list(values))
+
+    def append_rows(self, rows):
+        self._request()
+        self.values.extend(list(row) for row in rows)
+
+    def get_all_values(self):
+        self._request()
+        # gspread returns a fresh copy of every cell on each call
+        return [list(row) for row in self.values]
+
+    def get(self, range_name):
+        """Supports the open-ended 'A{start}:E' ranges the handler asks for"""
+        self._request()
+        start = int(range_name.split(":")[0][1:])
+        return [list(row) for row in self.values[start - 1:]]
+
+
+def fake_sheets_handler(rows=(), latency=0.0):
+    """A real GoogleSheetsHandler wired to a FakeWorksheet instead of the Sheets API"""
+    handler = GoogleSheetsHandler.__new__(GoogleSheetsHandler)
+    handler.sheet = FakeWorksheet(rows, latency)
+    return handler
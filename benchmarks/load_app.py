@@ -0,0 +1,54 @@
+"""Run main.py's app with Google Sheets swapped for an in-memory worksheet.
+
+Used by load_test.py; set GROQ_BASE_URL to a fake_groq.py server so nothing leaves the machine.
+
+    GROQ_BASE_URL=http://127.0.0.1:8100 python benchmarks/load_app.py --port 8000
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from fakes import fake_sheets_handler  # noqa: E402
+
+
+def use_fake_sheets(service, latency=0.0):
+    """Point an imported main module at a fake sheet, as if GoogleSheetsHandler had connected"""
+    from appointment_queue import AppointmentQueue
+    from appointment_mirror import AppointmentMirror
+    from google_sheets_handler import LazySheetsHandler
+
+    handler = fake_sheets_handler(latency=latency)
+    lazy_handler = LazySheetsHandler(lambda: handler)
+    service.sheets_handler = lazy_handler
+    service.sheets_available = True
+    service.warm_up_status["sheets"] = False
+    service.appointment_queue = AppointmentQueue(lazy_handler)
+    service.appointment_mirror = AppointmentMirror(lazy_handler, on_new_rows=service.availability.load)
+    return handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--sheet-latency-ms", type=float, default=150,
+                        help="delay added to every fake Sheets API call")
+    args = parser.parse_args()
+
+    # Keep the write-behind log out of the working tree; config reads it at import
+    os.environ.setdefault("APPOINTMENT_QUEUE_DB", os.path.join(tempfile.mkdtemp(), "load_test_queue.db"))
+    os.environ.setdefault("GROQ_API_KEY", "fake")
+
+    import main as service
+    use_fake_sheets(service, latency=args.sheet_latency_ms / 1000)
+
+    import uvicorn
+    uvicorn.run(service.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
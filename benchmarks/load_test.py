@@ -0,0 +1,339 @@
+"""End-to-end load test for the FastAPI service, runnable offline.
+
+Starts benchmarks/fake_groq.py and the app (via benchmarks/load_app.py, with an
+in-memory Google Sheet), then drives scripted multi-turn booking conversations
+at a fixed concurrency (closed loop) or arrival rate (open loop). Reports
+throughput, p50/p95/p99 latency and error rate for each endpoint.
+
+    python benchmarks/load_test.py --concurrency 50 --duration 60
+    python benchmarks/load_test.py --rate 5 --duration 60 --stream-ratio 0.5 --llm-latency-ms 800
+    python benchmarks/load_test.py --app-url http://127.0.0.1:8000 --concurrency 20   # an app you started
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import requests
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FIRST_NAMES = ["Ayesha", "John", "Maria", "Omar", "Grace", "Liam", "Fatima", "Noah", "Sara", "Ethan"]
+LAST_NAMES = ["Khan", "Smith", "Garcia", "Ali", "Chen", "Brown", "Ahmed", "Wilson", "Lopez", "Clark"]
+DOCTORS = ["Dr. Smith", "Dr. Johnson", "Dr. Williams", "Dr. Brown", "Dr. Davis", "Dr. Miller",
+           "Dr. Wilson", "Dr. Moore", "Dr. Taylor", "Dr. Anderson", "Dr. Thomas", "Dr. Jackson"]
+FAQ_QUESTIONS = ["What are your working hours?", "What is your phone number?", "Where is the clinic located?"]
+APOLOGY = "technical difficulties"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(url, timeout=1).ok:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_services(args):
+    """Start the fake LLM and the app as subprocesses; return (app_url, processes)"""
+    output = None if args.verbose else subprocess.DEVNULL
+    groq_port, app_port = free_port(), free_port()
+    groq = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_groq.py"), "--port", str(groq_port),
+        "--latency-ms", str(args.llm_latency_ms), "--jitter-ms", str(args.llm_jitter_ms),
+        "--tokens-per-second", str(args.llm_tokens_per_second), "--error-rate", str(args.llm_error_rate),
+    ], stdout=output, stderr=output)
+    env = dict(os.environ, GROQ_BASE_URL=f"http://127.0.0.1:{groq_port}", GROQ_API_KEY="fake")
+    app = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "load_app.py"), "--port", str(app_port),
+        "--sheet-latency-ms", str(args.sheet_latency_ms),
+    ], stdout=output, stderr=output, env=env, cwd=os.path.dirname(BENCH_DIR))
+    processes = [groq, app]
+    try:
+        wait_for(f"http://127.0.0.1:{groq_port}/docs")
+        # /ready turns 200 once the app has warmed up its LLM client and mirrored the sheet
+        wait_for(f"http://127.0.0.1:{app_port}/ready")
+    except RuntimeError:
+        stop_services(processes)
+        raise
+    return f"http://127.0.0.1:{app_port}", processes
+
+
+def stop_services(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+class Recorder:
+    """Collects per-request outcomes from every worker thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.first_token = defaultdict(list)
+        self.errors = defaultdict(lambda: defaultdict(int))
+        self.conversations = 0
+        self.bookings = defaultdict(int)
+
+    def request(self, endpoint, latency, error=None, first_token=None):
+        with self._lock:
+            self.latencies[endpoint].append(latency)
+            if first_token is not None:
+                self.first_token[endpoint].append(first_token)
+            if error:
+                self.errors[endpoint][error] += 1
+
+    def conversation(self, booking_status):
+        with self._lock:
+            self.conversations += 1
+            self.bookings[booking_status or "not_confirmed"] += 1
+
+    def report(self, elapsed):
+        rows = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            errors = sum(self.errors[endpoint].values())
+            row = {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+                "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+                "error_rate": round(errors / len(values), 4),
+                "errors": dict(self.errors[endpoint]),
+            }
+            first_token = sorted(self.first_token.get(endpoint, []))
+            if first_token:
+                row["first_token_p50_ms"] = round(percentile(first_token, 0.50) * 1000, 1)
+                row["first_token_p99_ms"] = round(percentile(first_token, 0.99) * 1000, 1)
+            rows[endpoint] = row
+        return {
+            "elapsed_seconds": round(elapsed, 2),
+            "conversations": self.conversations,
+            "conversations_per_second": round(self.conversations / elapsed, 2),
+            "bookings": dict(self.bookings),
+            "endpoints": rows,
+        }
+
+
+class Conversation:
+    """One scripted patient: greet, give a name, maybe ask an FAQ, pick a doctor, a slot, confirm"""
+
+    def __init__(self, app_url, recorder, rng, stream, http, timeout):
+        self.app_url = app_url
+        self.recorder = recorder
+        self.rng = rng
+        self.stream = stream
+        self.http = http
+        self.timeout = timeout
+        self.session_id = None
+
+    def script(self):
+        rng = self.rng
+        turns = ["Hi", f"My name is {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"]
+        if rng.random() < 0.3:
+            turns.append(rng.choice(FAQ_QUESTIONS))
+        turns.append(f"I'd like to see {rng.choice(DOCTORS)}")
+        return turns
+
+    def random_slot(self):
+        day = date.today() + timedelta(days=self.rng.randint(1, 30))
+        while day.weekday() == 6:
+            day += timedelta(days=1)
+        last_hour = 15 if day.weekday() == 5 else 17
+        hour = self.rng.randint(10 if day.weekday() == 5 else 9, last_hour)
+        minute = self.rng.choice([0, 30])
+        return f"{day.day} {day.strftime('%B %Y')} at {hour % 12 or 12}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+    def run(self):
+        for message in self.script():
+            if self.send(message) is None:
+                return self.recorder.conversation("aborted")
+
+        # A taken or closed slot keeps the booking asking for a time; try a few others
+        result = None
+        for _ in range(3):
+            result = self.send(self.random_slot())
+            if result is None:
+                return self.recorder.conversation("aborted")
+            if result.get("booking_state") == "confirming":
+                break
+        result = self.send("Yes, please confirm") if result.get("booking_state") == "confirming" else result
+        self.recorder.conversation(result.get("booking_status") if result else "aborted")
+        if self.session_id:
+            self.http.delete(f"{self.app_url}/chat/{self.session_id}", timeout=self.timeout)
+
+    def send(self, message):
+        """Send one turn; return the structured result, or None if the request failed"""
+        endpoint = "/chat/stream" if self.stream else "/chat"
+        payload = {"message": message, "session_id": self.session_id}
+        start = time.perf_counter()
+        try:
+            if self.stream:
+                result, first_token = self._stream(payload, start)
+            else:
+                response = self.http.post(f"{self.app_url}/chat", json=payload, timeout=self.timeout)
+                response.raise_for_status()
+                result, first_token = response.json(), None
+        except requests.HTTPError as e:
+            self.recorder.request(endpoint, time.perf_counter() - start, error=f"http_{e.response.status_code}")
+            return None
+        except (requests.RequestException, ValueError) as e:
+            self.recorder.request(endpoint, time.perf_counter() - start, error=type(e).__name__)
+            return None
+
+        elapsed = time.perf_counter() - start
+        if result is None or APOLOGY in result.get("response", ""):
+            self.recorder.request(endpoint, elapsed, error="apology", first_token=first_token)
+            return None
+        self.recorder.request(endpoint, elapsed, first_token=first_token)
+        self.session_id = result.get("session_id") or self.session_id
+        return result
+
+    def _stream(self, payload, start):
+        first_token = None
+        event = None
+        with self.http.post(f"{self.app_url}/chat/stream", json=payload, stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event:"):
+                    event = line[6:].strip()
+                elif line.startswith("data:"):
+                    data = json.loads(line[5:])
+                    if event == "session":
+                        self.session_id = data["session_id"]
+                    elif event == "done":
+                        return data, first_token
+                    elif event == "error":
+                        return None, first_token
+                    elif first_token is None:
+                        first_token = time.perf_counter() - start
+                    event = None
+        return None, first_token
+
+
+def run_load(args, app_url):
+    recorder = Recorder()
+    local = threading.local()
+    seeds = random.Random(args.seed)
+    deadline = time.monotonic() + args.duration
+
+    def http():
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        return local.session
+
+    def conversation(seed):
+        rng = random.Random(seed)
+        Conversation(app_url, recorder, rng, rng.random() < args.stream_ratio, http(), args.timeout).run()
+
+    def closed_loop_worker():
+        while time.monotonic() < deadline:
+            conversation(seeds.random())
+
+    start = time.monotonic()
+    if args.rate:
+        # Open loop: patients arrive as a Poisson process whatever the response times are
+        with ThreadPoolExecutor(max_workers=args.max_workers) as pool:
+            while time.monotonic() < deadline:
+                pool.submit(conversation, seeds.random())
+                time.sleep(seeds.expovariate(args.rate))
+    else:
+        threads = [threading.Thread(target=closed_loop_worker, daemon=True) for _ in range(args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.monotonic() - start
+
+    report = recorder.report(elapsed)
+    try:
+        report["server_stats"] = requests.get(f"{app_url}/stats", timeout=5).json()
+    except (requests.RequestException, ValueError):
+        pass
+    return report
+
+
+def print_report(report, args):
+    mode = f"{args.rate}/s arrivals" if args.rate else f"{args.concurrency} concurrent patients"
+    print(f"\n{mode}, {report['elapsed_seconds']}s: {report['conversations']} conversations "
+          f"({report['conversations_per_second']}/s), bookings {report['bookings']}")
+    print(f"\n{'endpoint':<14} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'p99 ms':>9} {'errors':>8} {'ttft p50':>9}")
+    for endpoint, row in report["endpoints"].items():
+        print(f"{endpoint:<14} {row['requests']:>9} {row['throughput_rps']:>8} {row['p50_ms']:>9} "
+              f"{row['p95_ms']:>9} {row['p99_ms']:>9} {row['error_rate']:>8.2%} "
+              f"{row.get('first_token_p50_ms', '-'):>9}")
+        if row["errors"]:
+            print(f"{'':<14} errors: {row['errors']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=20, help="patients chatting at once (closed loop)")
+    load.add_argument("--rate", type=float, help="new conversations per second (open loop; overrides --concurrency)")
+    load.add_argument("--max-workers", type=int, default=500, help="thread cap for open-loop mode")
+    load.add_argument("--duration", type=float, default=30, help="seconds to generate load")
+    load.add_argument("--stream-ratio", type=float, default=0.0, help="fraction of conversations using /chat/stream")
+    load.add_argument("--timeout", type=float, default=60, help="client timeout per request")
+    load.add_argument("--seed", type=int, default=1)
+    fakes = parser.add_argument_group("fake backends")
+    fakes.add_argument("--llm-latency-ms", type=float, default=300, help="fake LLM time to first token")
+    fakes.add_argument("--llm-jitter-ms", type=float, default=100)
+    fakes.add_argument("--llm-tokens-per-second", type=float, default=400)
+    fakes.add_argument("--llm-error-rate", type=float, default=0.0)
+    fakes.add_argument("--sheet-latency-ms", type=float, default=150, help="delay per fake Sheets API call")
+    parser.add_argument("--app-url", help="load an already running app instead of starting one")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the fake LLM and app logs")
+    args = parser.parse_args()
+
+    processes = []
+    app_url = args.app_url
+    if not app_url:
+        app_url, processes = start_services(args)
+    try:
+        report = run_load(args, app_url)
+    finally:
+        stop_services(processes)
+
+    print_report(report, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+"""Replay recorded multi-turn conversations through ChatbotEngine and check what it extracted.
+
+Each line of a transcript file is one conversation:
+
+    {"id": "chest-pain", "turns": [
+        {"user": "Hi", "assistant": "Hello! May I have your name?", "expect": {"booking_state": "asking_name"}},
+        ...],
+     "expected": {"patient_name": "Ayesha Khan", "recommended_doctor": "Dr. Williams", "booking_state": "done"}}
+
+"assistant" is the reply the LLM gave when the conversation was recorded; the recorded
+backend plays it back, so runs are fast and repeatable. "expect" (per turn) and "expected"
+(after the last turn) hold slot values to diff against the engine's booking state:
+booking_state, patient_name, recommended_doctor, appointment_date, appointment_time, plus
+response_contains for a substring of the reply. A list of values accepts any of them, e.g.
+either doctor of a department, since new patients are spread across both. Conversations
+run concurrently through batch_chat.run_batch; turns within one conversation stay in order.
+
+Dates are written as weekday tokens so transcripts never go stale: "{tuesday} at 10:00 AM"
+becomes e.g. "November 03, 2026 at 10:00 AM" and "{tuesday:iso}" becomes "2026-11-03", for
+the first Tuesday at least a week after the day of the run.
+
+    python benchmarks/replay.py                                         # bundled transcripts, recorded replies
+    python benchmarks/replay.py my_logs.jsonl --repeat 20 --parallelism 32 --llm-latency-ms 300
+    python benchmarks/replay.py --backend groq --parallelism 4          # the real model from config.py
+
+Exits with status 1 if any expectation fails, so it can gate a prompt or model change.
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from langchain_core.language_models import SimpleChatModel  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.outputs import ChatGeneration, ChatResult  # noqa: E402
+
+from availability import AvailabilityEngine  # noqa: E402
+from batch_chat import run_batch  # noqa: E402
+from chatbot_engine import ChatbotEngine, create_llm  # noqa: E402
+from faq_router import FAQRouter  # noqa: E402
+from specialty_router import SpecialtyRouter  # noqa: E402
+from load_test import percentile  # noqa: E402
+
+DEFAULT_TRANSCRIPTS = os.path.join(BENCH_DIR, "transcripts.jsonl")
+SLOT_FIELDS = ["booking_state", "patient_name", "recommended_doctor", "appointment_date", "appointment_time"]
+FALLBACK_REPLY = "Could you tell me a little more so I can help you book an appointment?"
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+DATE_TOKEN = re.compile(r"\{(" + "|".join(WEEKDAYS) + r")(:iso)?\}")
+
+
+class RecordedChatModel(SimpleChatModel):
+    """Plays back the replies recorded for one conversation, matched on the patient's message.
+
+    Replies for the same message are used in recording order; a message with nothing
+    recorded gets a generic reply. latency delays every call, standing in for the API.
+    """
+
+    replies: dict = {}
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self):
+        return "recorded"
+
+    def _call(self, messages, stop=None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._next_reply(messages)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # SimpleChatModel would run _call in a thread; sleep on the loop so latency doesn't need one
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = AIMessage(content=self._next_reply(messages))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _next_reply(self, messages):
+        queue = self.replies.get(messages[-1].content)
+        return queue.popleft() if queue else FALLBACK_REPLY
+
+
+def resolve_dates(value, today):
+    """Replace weekday tokens in a transcript's strings with real dates a week or more after today"""
+    if isinstance(value, dict):
+        return {key: resolve_dates(item, today) for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_dates(item, today) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def replace(match):
+        start = today + timedelta(days=7)
+        day = start + timedelta(days=(WEEKDAYS.index(match.group(1)) - start.weekday()) % 7)
+        return day.strftime("%Y-%m-%d" if match.group(2) else "%B %d, %Y")
+
+    return DATE_TOKEN.sub(replace, value)
+
+
+def load_transcripts(path, today=None):
+    today = today or date.today()
+    transcripts = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            transcript = resolve_dates(json.loads(line), today)
+            if not transcript.get("turns"):
+                raise ValueError(f"{path}:{line_number}: transcript has no turns")
+            transcript.setdefault("id", f"line-{line_number}")
+            transcripts.append(transcript)
+    return transcripts
+
+
+def make_llm_factory(backend, latency):
+    """Return llm_for(transcript), building the LLM a replayed conversation talks to"""
+    if backend == "groq":
+        # One shared client, as in the API; set GROQ_BASE_URL to aim it at benchmarks/fake_groq.py
+        llm = create_llm()
+        return lambda transcript: llm
+
+    def recorded(transcript):
+        replies = defaultdict(deque)
+        if backend == "recorded":
+            for turn in transcript["turns"]:
+                if turn.get("assistant"):
+                    replies[turn["user"]].append(turn["assistant"])
+        return RecordedChatModel(replies=dict(replies), latency=latency)
+
+    return recorded
+
+
+def diff(expected, actual):
+    """Fields whose values differ, as {field: {"expected": ..., "actual": ...}}"""
+    mismatches = {}
+    for field, want in expected.items():
+        if field == "response_contains":
+            got = actual.get("response") or ""
+            if want.lower() not in got.lower():
+                mismatches[field] = {"expected": want, "actual": got}
+        elif actual.get(field) not in (want if isinstance(want, list) else [want]):
+            mismatches[field] = {"expected": want, "actual": actual.get(field)}
+    return mismatches
+
+
+async def replay(transcripts, llm_for, parallelism):
+    """Replay every transcript; return the per-turn results, in transcript and turn order"""
+    availability = AvailabilityEngine()
+    faq_router = FAQRouter()
+    specialty_router = SpecialtyRouter(availability=availability)
+    # Keyed by position, so a transcript repeated with --repeat is still its own conversation
+    items = [(index, turn["user"]) for index, transcript in enumerate(transcripts) for turn in transcript["turns"]]
+
+    def session_for(key):
+        engine = ChatbotEngine(llm=llm_for(transcripts[key]), faq_router=faq_router, availability=availability,
+                               specialty_router=specialty_router)
+        return key, engine
+
+    def finish(session_id, engine):
+        return {"booking_state": engine.booking.state, **engine.booking.details()}
+
+    return await run_batch(items, session_for, parallelism, finish)
+
+
+def check(transcripts, results):
+    """Diff every turn and every final state against the transcript's expectations"""
+    report = []
+    position = 0
+    for transcript in transcripts:
+        turns = results[position:position + len(transcript["turns"])]
+        position += len(transcript["turns"])
+        failures = []
+        for number, (turn, result) in enumerate(zip(transcript["turns"], turns), 1):
+            if result["error"]:
+                failures.append({"turn": number, "error": result["error"]})
+            mismatches = diff(turn.get("expect", {}), result)
+            if mismatches:
+                failures.append({"turn": number, "mismatches": mismatches})
+        final = diff(transcript.get("expected", {}), turns[-1])
+        if final:
+            failures.append({"turn": "final", "mismatches": final})
+        report.append({
+            "id": transcript["id"],
+            "passed": not failures,
+            "failures": failures,
+            "turn_latency_ms": [result["latency_ms"] for result in turns],
+            "final": {field: turns[-1].get(field) for field in SLOT_FIELDS},
+        })
+    return report
+
+
+def summarize(report, elapsed):
+    latencies = sorted(latency for row in report for latency in row["turn_latency_ms"])
+    by_turn = defaultdict(list)
+    for row in report:
+        for number, latency in enumerate(row["turn_latency_ms"], 1):
+            by_turn[number].append(latency)
+    passed = sum(row["passed"] for row in report)
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "conversations": len(report),
+        "passed": passed,
+        "failed": len(report) - passed,
+        "turns": len(latencies),
+        "turns_per_second": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "turn_p50_ms": percentile(latencies, 0.50),
+        "turn_p95_ms": percentile(latencies, 0.95),
+        "turn_max_ms": latencies[-1] if latencies else 0.0,
+        "turn_p95_ms_by_position": {number: percentile(sorted(values), 0.95) for number, values in sorted(by_turn.items())},
+    }
+
+
+def print_report(report, summary):
+    for row in report:
+        if row["passed"]:
+            continue
+        print(f"FAIL {row['id']}")
+        for failure in row["failures"]:
+            if "error" in failure:
+                print(f"  turn {failure['turn']}: error: {failure['error']}")
+            for field, values in failure.get("mismatches", {}).items():
+                print(f"  turn {failure['turn']}: {field}: expected {values['expected']!r}, got {values['actual']!r}")
+    print(f"{summary['passed']}/{summary['conversations']} conversations passed, "
+          f"{summary['turns']} turns in {summary['elapsed_seconds']}s ({summary['turns_per_second']} turns/s)")
+    print(f"turn latency p50 {summary['turn_p50_ms']} ms, p95 {summary['turn_p95_ms']} ms, max {summary['turn_max_ms']} ms")
+    positions = ", ".join(f"{number}: {value}" for number, value in summary["turn_p95_ms_by_position"].items())
+    print(f"p95 by turn number (ms): {positions}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("transcripts", nargs="?", default=DEFAULT_TRANSCRIPTS, help="JSONL transcript file")
+    parser.add_argument("--backend", choices=["recorded", "fake", "groq"], default="recorded",
+                        help="recorded: replay the logged replies; fake: a canned reply; groq: the configured model")
+    parser.add_argument("--parallelism", type=int, default=8, help="turns in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="replay every transcript this many times")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="simulated LLM latency for recorded/fake")
+    parser.add_argument("--output", help="also write the full report as JSON to this file")
+    args = parser.parse_args()
+
+    transcripts = load_transcripts(args.transcripts) * max(1, args.repeat)
+    llm_for = make_llm_factory(args.backend, args.llm_latency_ms / 1000)
+
+    start = time.perf_counter()
+    results = asyncio.run(replay(transcripts, llm_for, args.parallelism))
+    elapsed = time.perf_counter() - start
+
+    report = check(transcripts, results)
+    summary = summarize(report, elapsed)
+    print_report(report, summary)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"backend": args.backend, "summary": summary, "conversations": report}, f, indent=2)
+    sys.exit(0 if summary["failed"] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Offline micro-benchmarks for the chatbot's hot paths.
+
+Reports ops/sec and the peak bytes allocated by one call for each case, writes the
+results to benchmarks/latest.json and compares them with benchmarks/baseline.json.
+
+Run from the repository root:
+    python benchmarks/run_benchmarks.py                      # run and compare with the baseline
+    python benchmarks/run_benchmarks.py --save-baseline      # record a new baseline
+    python benchmarks/run_benchmarks.py --sheet-rows 10000,100000,1000000
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel  # noqa: E402
+
+from appointment_mirror import AppointmentMirror  # noqa: E402
+from chatbot_engine import ChatbotEngine  # noqa: E402
+from date_normalizer import validate_many  # noqa: E402
+from slot_extractor import clean_markdown, parse_recap  # noqa: E402
+from specialty_router import SpecialtyRouter  # noqa: E402
+from fakes import fake_sheets_handler, make_rows  # noqa: E402
+
+BASELINE_FILE = os.path.join(BENCH_DIR, "baseline.json")
+LATEST_FILE = os.path.join(BENCH_DIR, "latest.json")
+
+RECAP = (
+    "Here is your appointment recap:\n"
+    "**Patient Name:** John Smith\n"
+    "**Doctor Name:** Dr. Williams\n"
+    "**Date:** 12 March 2026\n"
+    "**Time:** 10:30 AM\n"
+    "Thank you for choosing HealthCare Plus Clinic!"
+)
+
+
+def measure(func, min_time):
+    """Run func until min_time has passed; return throughput and the peak allocation of one call"""
+    func()  # warm up
+    ops = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        ops += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "ops_per_sec": round(ops / elapsed, 1),
+        "us_per_op": round(elapsed / ops * 1e6, 3),
+        "peak_alloc_bytes": peak - baseline,
+    }
+
+
+def unique_messages(count):
+    """Distinct messages so extract_slots' memo can't answer from cache"""
+    templates = [
+        "Hi, my name is Patient {i}",
+        "I'd like to see Dr. Williams on {d} March 2026 at 10:30 AM ({i})",
+        "I have had a bad headache for {i} days and some dizziness",
+        "tomorrow at {h} PM works for me, ref {i}",
+    ]
+    return [templates[i % len(templates)].format(i=i, d=i % 28 + 1, h=i % 5 + 1) for i in range(count)]
+
+
+def legacy_duplicate_check(handler, appointment):
+    """The full-sheet scan save_to_google_sheets used to do on every save"""
+    current = " | ".join(str(item) for item in appointment)
+    for row in handler.get_existing_appointments():
+        if len(row) >= 5 and " | ".join(str(item) for item in row[1:5]) == current:
+            return True
+    return False
+
+
+def engine_cases(min_time):
+    engine = ChatbotEngine(llm=FakeListChatModel(responses=["ok"]))
+    router = SpecialtyRouter()
+    messages = itertools.cycle(unique_messages(200000))
+    candidates = [(f"{day} October 2026", f"{hour}:{minute:02d} {'AM' if hour < 12 else 'PM'}")
+                  for day in range(1, 29) for hour in range(8, 13) for minute in (0, 30)]
+    return {
+        "extract_info": measure(lambda: engine.extract_info(next(messages), "date"), min_time),
+        "validate_date_time": measure(lambda: engine.validate_date_time("21 October 2030", "10:30 AM"), min_time),
+        "normalize_time": measure(lambda: engine.normalize_time("10:30 AM"), min_time),
+        f"validate_many[{len(candidates)}]": measure(lambda: validate_many(candidates), min_time),
+        "parse_recap": measure(lambda: parse_recap(RECAP), min_time),
+        "clean_markdown": measure(lambda: clean_markdown("**Dr. Williams** on _12 March 2026_"), min_time),
+        "specialty_route": measure(lambda: router.route("I've had chest pain and palpitations since yesterday"), min_time),
+    }
+
+
+def sheets_cases(row_counts, min_time):
+    results = {}
+    for count in row_counts:
+        rows = make_rows(count)
+        handler = fake_sheets_handler(rows)
+        mirror = AppointmentMirror(handler)
+        mirror.sync()
+        # Worst case for the scan: the appointment is not in the sheet
+        missing = ("New Patient", "Dr. Smith", "2026-12-31", "17:30")
+        results[f"duplicate_check_scan[{count}]"] = measure(
+            lambda: legacy_duplicate_check(handler, missing), min_time)
+        results[f"duplicate_check_mirror[{count}]"] = measure(
+            lambda: mirror.contains(*missing), min_time)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print each case against the baseline; return the names that got slower than threshold"""
+    regressions = []
+    print(f"\n{'case':<36} {'ops/sec':>14} {'baseline':>14} {'change':>9} {'peak alloc':>12}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        change = ""
+        if base:
+            ratio = result["ops_per_sec"] / base["ops_per_sec"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio < -threshold:
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<36} {result['ops_per_sec']:>14,.1f} "
+              f"{(base or {}).get('ops_per_sec', 0):>14,.1f} {change:>9} "
+              f"{result['peak_alloc_bytes']:>10,} B")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheet-rows", default="10000,100000",
+                        help="comma-separated sheet sizes for the duplicate-check cases")
+    parser.add_argument("--min-time", type=float, default=0.3, help="seconds to run each case")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fractional slowdown versus the baseline that counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    args = parser.parse_args()
+
+    row_counts = [int(count) for count in args.sheet_rows.split(",") if count]
+    results = {}
+    results.update(engine_cases(args.min_time))
+    results.update(sheets_cases(row_counts, args.min_time))
+
+    report = {
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "results": results,
+    }
+    with open(LATEST_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = {}
+    if os.path.exists(BASELINE_FILE) and not args.save_baseline:
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)["results"]
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline saved to {BASELINE_FILE}")
+    elif regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+import re
+import threading
+from datetime import datetime
+from prompt_templates import (
+    GREETING_PROMPT, PROBLEM_PROMPT, TIME_PROMPT, RECOMMEND_PROMPT, SLOT_CONFIRM_PROMPT, SLOT_UNAVAILABLE_PROMPT,
+    RECAP_PROMPT, CONFIRMATION_PROMPT,
+)
+from slot_extractor import extract_slots, parse_recap, stated_name
+from config import SPECIALTY_SKIP_LLM_CONFIDENCE
+
+CONFIRM_PATTERN = re.compile(r"\b(confirm|confirmed|yes|yeah|yep|sure|book it|finalize|go ahead|okay|ok)\b", re.IGNORECASE)
+DECLINE_PATTERN = re.compile(r"\b(no|not|don't|change|another|different|cancel)\b", re.IGNORECASE)
+# A bare reply to "may I know your name?" with any of these is not a name
+NON_NAME_WORDS = {
+    "hi", "hello", "hey", "hola", "good", "morning", "afternoon", "evening", "night",
+    "yes", "no", "ok", "okay", "sure", "thanks", "thank", "please", "sorry",
+    "what", "why", "how", "when", "where", "who", "which",
+    "i", "i'm", "im", "am", "me", "my", "we", "you", "a", "an", "the", "in", "on", "at", "for", "to", "of", "and", "or", "is", "it",
+    "book", "booking", "appointment", "appointments", "schedule", "visit", "checkup", "consultation",
+    "need", "want", "like", "help", "see", "doctor", "dr", "clinic",
+    "today", "tomorrow", "tonight", "next", "this", "week", "month", "weekend", "day", "days",
+    "soon", "later", "asap", "now", "urgent", "emergency", "earliest", "anytime", "any",
+    "hmm", "hm", "um", "umm", "uh", "er", "erm", "ah",
+}
+NAME_REPLY_PATTERN = re.compile(r"^[A-Za-z][A-Za-z'-]*(?:\s+[A-Za-z][A-Za-z'-]*){0,2}$")
+
+
+class TurnStats:
+    """Counts how each chat turn was answered, shared by every session"""
+
+    SOURCES = ("faq", "state_machine", "llm", "fallback")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.SOURCES, 0)
+
+    def record(self, source):
+        with self._lock:
+            self.counts[source] += 1
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            avoided = total - self.counts["llm"]
+            return {
+                **self.counts,
+                "total": total,
+                "llm_avoided_ratio": round(avoided / total, 3) if total else 0.0,
+            }
+
+
+turn_stats = TurnStats()
+
+
+class BookingStateMachine:
+    """Server-side slot filling: name -> doctor -> date/time -> confirm.
+
+    Every patient message updates the slots. When a turn is fully determined (a doctor was
+    just chosen, a requested slot validated or failed validation, or the patient confirmed
+    a validated slot) handle() returns the reply from the templates and the LLM is skipped.
+    Anything open-ended returns None and goes to the LLM.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.reset()
+
+    def reset(self):
+        self.name = None
+        self.doctor = None
+        self.date = None
+        self.time = None
+        self.slot_validated = False
+        self.slot_dt = None
+        self.confirmed = False
+        # Outcome of saving the confirmed appointment; set once so it is saved exactly once
+        self.save_status = None
+        self._name_requested = False
+
+    def dump_state(self):
+        """Slots and flags as plain JSON values, for sessions kept outside this process"""
+        return {
+            "name": self.name,
+            "doctor": self.doctor,
+            "date": self.date,
+            "time": self.time,
+            "validated": self.slot_validated,
+            "slot": self.slot_dt.isoformat() if self.slot_dt else None,
+            "confirmed": self.confirmed,
+            "saved": self.save_status,
+            "name_requested": self._name_requested,
+        }
+
+    def load_state(self, state):
+        self.name = state["name"]
+        self.doctor = state["doctor"]
+        self.date = state["date"]
+        self.time = state["time"]
+        self.slot_validated = state["validated"]
+        self.slot_dt = datetime.fromisoformat(state["slot"]) if state["slot"] else None
+        self.confirmed = state["confirmed"]
+        self.save_status = state["saved"]
+        self._name_requested = state["name_requested"]
+
+    @property
+    def state(self):
+        if self.confirmed:
+            return "done"
+        if not self.name:
+            return "asking_name"
+        if not self.doctor:
+            return "asking_doctor"
+        if not self.slot_validated:
+            return "asking_time"
+        return "confirming"
+
+    def handle(self, user_input):
+        """Update slots from a patient message; return a template reply if the turn is determined"""
+        if self.confirmed:
+            return None
+
+        slots = extract_slots(user_input)
+        self._update_name(user_input, slots)
+
+        doctor_chosen = self._update_doctor(self.without_name(user_input))
+        recommendation = None
+        if not self.doctor and self.name:
+            recommendation = self._recommend_doctor(self.without_name(user_input))
+            doctor_chosen = recommendation is not None
+        if slots.date:
+            self.date, self.slot_validated = slots.date, False
+        if slots.time:
+            self.time, self.slot_validated = slots.time, False
+
+        if self.state == "confirming" and CONFIRM_PATTERN.search(user_input) and not DECLINE_PATTERN.search(user_input):
+            self.confirmed = True
+            conflict = self._save_confirmed()
+            if conflict:
+                return conflict
+            details = self._template_values()
+            return RECAP_PROMPT.format(**details) + CONFIRMATION_PROMPT.format(**details)
+
+        if not (self.name and self.doctor):
+            return None
+
+        if (slots.date or slots.time) and self.date and self.time:
+            is_valid, message = self.engine.validate_date_time(self.date, self.time, self.doctor)
+            if not is_valid:
+                self.time = None
+                return SLOT_UNAVAILABLE_PROMPT.format(reason=message.rstrip(".") + ".")
+            self.slot_dt = self._slot_datetime()
+            self.slot_validated = True
+            return SLOT_CONFIRM_PROMPT.format(**self._template_values())
+
+        if doctor_chosen and not (slots.date or slots.time):
+            if recommendation:
+                return RECOMMEND_PROMPT.format(specialty=recommendation.label, **self._template_values())
+            return TIME_PROMPT.format(**self._template_values())
+
+        return None
+
+    def fallback_reply(self, user_input):
+        """Template reply moving the booking on when the LLM can't take the turn; handle() has run first"""
+        state = self.state
+        if state == "asking_name":
+            self._name_requested = True
+            return GREETING_PROMPT.format(clinic_name=self.engine.clinic.clinic_name)
+        if state == "asking_doctor":
+            router = self.engine.specialty_router
+            # Any match beats asking again while there is no LLM to ask follow-up questions
+            match = router.route(self.without_name(user_input)) if router else None
+            if not match:
+                return PROBLEM_PROMPT.format(patient_name=self.name)
+            self.doctor = match.doctor
+            self.slot_validated = False
+            return RECOMMEND_PROMPT.format(specialty=match.label, **self._template_values())
+        if state == "asking_time":
+            return TIME_PROMPT.format(**self._template_values())
+        if state == "confirming":
+            return SLOT_CONFIRM_PROMPT.format(**self._template_values())
+        return CONFIRMATION_PROMPT.format(**self._template_values())
+
+    def observe_reply(self, reply, user_input=""):
+        """Learn from an LLM reply: a recap of the booking, a single recommended doctor, or a request for the name.
+
+        A recap only fills in the slots, after the same checks as a slot the patient typed;
+        the booking is confirmed and saved by handle() once the patient confirms it. Returns
+        the reply the patient should get instead when the recap needs correcting, else None.
+        """
+        recap = parse_recap(reply) if not self.confirmed else None
+        if recap:
+            return self._adopt_recap(recap, user_input)
+        if not self.doctor and self.engine.availability:
+            doctors = self.engine.availability.find_doctors(self.without_name(reply))
+            if len(doctors) == 1:
+                self.doctor = doctors[0]
+        self._name_requested = not self.name and "name" in reply.lower()
+
+    def appointment(self):
+        """The booked appointment once the patient has confirmed it, else None"""
+        if not self.confirmed:
+            return None
+        return self.details()
+
+    def details(self):
+        """Slots collected so far; date and time are normalised (YYYY-MM-DD, HH:MM) once validated"""
+        validated = self.slot_validated and self.slot_dt
+        return {
+            "patient_name": self.name,
+            "recommended_doctor": self.doctor,
+            "appointment_date": self.slot_dt.strftime("%Y-%m-%d") if validated else self.date,
+            "appointment_time": self.slot_dt.strftime("%H:%M") if validated else self.time,
+        }
+
+    def _adopt_recap(self, recap, user_input):
+        """Take the slots of a recap the LLM wrote, validated; the LLM itself can't confirm a booking"""
+        availability = self.engine.availability
+        doctor = availability.find_doctor(recap.doctor) if availability else recap.doctor
+        if not doctor:
+            return None
+        if not self.name:
+            self.name = recap.name
+        self.doctor = doctor
+        self.slot_validated = False
+        is_valid, message = self.engine.validate_date_time(recap.date, recap.time, doctor)
+        if not is_valid:
+            self.date, self.time = recap.date, None
+            return SLOT_UNAVAILABLE_PROMPT.format(reason=message.rstrip(".") + ".")
+        self.date, self.time = recap.date, recap.time
+        self.slot_dt = self._slot_datetime()
+        self.slot_validated = True
+        if CONFIRM_PATTERN.search(user_input) and not DECLINE_PATTERN.search(user_input):
+            # The LLM may have told the patient it is booked; ask them to confirm the checked slot
+            return SLOT_CONFIRM_PROMPT.format(**self._template_values())
+        return None
+
+    def _save_confirmed(self):
+        """Save the appointment just confirmed; if the slot was taken meanwhile, reopen the time and return the reply"""
+        save = self.engine.save_appointment
+        # A conflict leaves the booking unconfirmed, so the next confirmation is saved again
+        if not save or self.save_status not in (None, "conflict"):
+            return None
+        self.save_status, alternatives = save(**self.details())
+        if self.save_status != "conflict":
+            return None
+        reason = f"{self.doctor} has just been booked by another patient at that time."
+        if alternatives:
+            options = ", ".join(
+                datetime.strptime(slot, "%Y-%m-%d %H:%M").strftime("%A, %B %d at %I:%M %p") for slot in alternatives
+            )
+            reason += f" The nearest free slots are: {options}."
+        self.confirmed = False
+        self.slot_validated = False
+        self.time = None
+        return SLOT_UNAVAILABLE_PROMPT.format(reason=reason)
+
+    def _update_name(self, user_input, slots):
+        # Once known the name stays, except for an explicit correction; later "I'm free
+        # on Monday" is not a new one
+        corrected = stated_name(user_input)
+        if corrected and self.name:
+            self.name = corrected.title()
+            return
+        if self.state != "asking_name":
+            return
+        if slots.name:
+            self.name = slots.name.title()
+        elif self._name_requested and self._is_name_reply(user_input, slots):
+            self.name = user_input.strip().rstrip(".!").title()
+
+    def _is_name_reply(self, user_input, slots):
+        """True if a bare reply to "may I know your name?" looks like a name, not a complaint or a time"""
+        reply = user_input.strip().rstrip(".!")
+        if not NAME_REPLY_PATTERN.match(reply) or NON_NAME_WORDS.intersection(reply.lower().split()):
+            return False
+        if slots.date or slots.time:
+            return False
+        router = self.engine.specialty_router
+        return not (router and router.mentions(reply))
+
+    def without_name(self, text):
+        """text minus the patient's own name, so 'John Smith' is never read as Dr. Smith"""
+        if not self.name:
+            return text
+        # "Dr. Smith" stays even when the patient is also called Smith
+        return re.sub(r"(?<!dr\. )(?<!dr )(?<!doctor )" + re.escape(self.name), " ", text, flags=re.IGNORECASE)
+
+    def _update_doctor(self, user_input):
+        availability = self.engine.availability
+        # A bare surname ("brown spots") is left to the specialty router or the LLM
+        doctor = availability.find_doctor(user_input, titled=True) if availability else None
+        if doctor and doctor != self.doctor:
+            self.doctor = doctor
+            self.slot_validated = False
+            return True
+        return False
+
+    def _recommend_doctor(self, complaint):
+        """Pick the doctor for a complaint the specialty router is sure about; return its match"""
+        router = self.engine.specialty_router
+        match = router.route(complaint) if router else None
+        if not match or match.confidence < SPECIALTY_SKIP_LLM_CONFIDENCE:
+            return None
+        self.doctor = match.doctor
+        self.slot_validated = False
+        return match
+
+    def _slot_datetime(self):
+        normalized = f"{self.engine.normalize_date(self.date)} {self.engine.normalize_time(self.time)}"
+        return datetime.strptime(normalized, "%Y-%m-%d %H:%M")
+
+    def _template_values(self):
+        validated = self.slot_validated and self.slot_dt
+        return {
+            "patient_name": self.name,
+            "recommended_doctor": self.doctor,
+            "appointment_date": self.slot_dt.strftime("%B %d, %Y") if validated else self.date,
+            "appointment_time": self.slot_dt.strftime("%I:%M %p") if validated else self.time,
+        }
@@ -1,187 +1,439 @@
-from langchain_groq import ChatGroq
-from langchain.schema import HumanMessage, SystemMessage
-from prompt_templates import SYSTEM_PROMPT
-from langchain.schema import AIMessage
-from config import MODEL_NAME, MAX_TOKENS, TEMPERATURE
-import re
-from datetime import datetime
+from langchain_core.messages import HumanMessage, SystemMessage
+from clinic_config import clinic_config
+from langchain_core.messages import AIMessage
+from config import (
+    MODEL_NAME, MAX_TOKENS, TEMPERATURE, GROQ_BASE_URL, SPECIALTY_HINT_CONFIDENCE,
+    LLM_DEADLINE_SECONDS, HEDGE_MODEL_NAME, HEDGE_MIN_DELAY_SECONDS,
+)
+from context_window import ContextWindow, estimate_tokens
+from slot_extractor import extract_slots
+from booking_state import BookingStateMachine, turn_stats
+from date_normalizer import normalize_date, normalize_time, validate_slot
+from metrics import stage, llm_call, STAGE_SECONDS, LLM_TOKENS
+from llm_scheduler import LANE_CONFIRM, LANE_BOOKING, LANE_NEW, LLMQueueFullError, rate_limit_delay
+from llm_resilience import LLMUnavailableError, hedged_invoke, hedged_stream
+from contextlib import asynccontextmanager, nullcontext
+import asyncio
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_llm_lock = threading.Lock()
+# Sync callers share one background event loop, so async clients keep their connection pools
+_sync_loop = None
+_sync_loop_lock = threading.Lock()
+
+# One-letter tags for history messages in a dumped session
+MESSAGE_TYPES = {"h": HumanMessage, "a": AIMessage, "s": SystemMessage}
+MESSAGE_KINDS = {"human": "h", "ai": "a", "system": "s"}
+
+def create_llm(model=MODEL_NAME):
+    """Build the Groq chat client; langchain_groq is imported here because it is slow to load"""
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=model,
+        max_tokens=MAX_TOKENS,
+        temperature=TEMPERATURE,
+        base_url=GROQ_BASE_URL,
+    )
+
+def _run_sync(coroutine):
+    """Run a coroutine on the shared background loop and wait for its result"""
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="chatbot-sync-loop", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _sync_loop).result()
 
 class ChatbotEngine:
-    def __init__(self):
-        self.llm = ChatGroq(
-            model=MODEL_NAME,
-            max_tokens=MAX_TOKENS,
-            temperature=TEMPERATURE,
-        )
+    def __init__(self, llm=None, limiter=None, faq_router=None, availability=None, specialty_router=None,
+                 breaker=None, hedge_llm=None, save_appointment=None, llm_provider=None, hedge_llm_provider=None):
+        # Sessions share one client; only the conversation history is per-patient.
+        # Without one, the client is created on first use so constructing an engine stays cheap.
+        # A provider hands out a shared client on first use instead, so a client that can't
+        # be built only fails the turns that need the LLM.
+        self._llm = llm
+        self._hedge_llm = hedge_llm
+        self._llm_provider = llm_provider
+        self._hedge_llm_provider = hedge_llm_provider
+        # With a breaker, LLM turns have a deadline and fall back to the booking templates
+        self.breaker = breaker
+        self.limiter = limiter
+        self.faq_router = faq_router
+        self.availability = availability
+        self.specialty_router = specialty_router
+        # Saves an appointment as soon as the patient confirms it, returning (status, alternatives);
+        # without one, confirmed appointments are left unsaved
+        self.save_appointment = save_appointment
+        self.clinic = clinic_config.current()
         self.conversation_history = []
-        self.system_message = SystemMessage(content=SYSTEM_PROMPT)
+        self.system_message = SystemMessage(content=self.clinic.system_prompt)
         self.conversation_history.append(self.system_message)
+        self.context_window = ContextWindow()
+        self.booking = BookingStateMachine(self)
+
+    @property
+    def llm(self):
+        if self._llm is None and self._llm_provider:
+            return self._llm_provider()
+        if self._llm is None:
+            with _llm_lock:
+                if self._llm is None:
+                    self._llm = create_llm()
+        return self._llm
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    @property
+    def hedge_llm(self):
+        """Client for HEDGE_MODEL_NAME, or None when hedging is off"""
+        if self._hedge_llm is None and self._hedge_llm_provider:
+            return self._hedge_llm_provider()
+        if self._hedge_llm is None and HEDGE_MODEL_NAME:
+            with _llm_lock:
+                if self._hedge_llm is None:
+                    self._hedge_llm = create_llm(HEDGE_MODEL_NAME)
+        return self._hedge_llm
         
     def get_response(self, user_input):
-        # Add user message to history
-        self.conversation_history.append(HumanMessage(content=user_input))
-        
-        # Get response from LLM
-        response = self.llm.invoke(self.conversation_history)
-        
-        # Add assistant response to history
-        self.conversation_history.append(response)
-        
+        """Blocking variant of aget_response, going through the same limiter, breaker and hedge.
+
+        For scripts and threads without an event loop; async code should await aget_response.
+        """
+        return _run_sync(self.aget_response(user_input))
+
+    async def aget_response(self, user_input):
+        """Async variant of get_response that does not block the event loop"""
+        local_answer = self._answer_locally(user_input)
+        if local_answer:
+            return local_answer
+        if self.breaker and not self.breaker.allow():
+            return self._rule_based_reply(user_input)
+
+        user_message = HumanMessage(content=user_input)
+        messages = self._prompt_messages(user_message)
+
+        try:
+            async with self._queued_llm_slot(messages):
+                with llm_call("invoke"), stage("llm"):
+                    response = await self._invoke_llm(messages)
+        except LLMQueueFullError:
+            raise
+        except Exception as e:
+            if not self.breaker:
+                raise
+            logger.warning(f"Answering without the LLM: {type(e).__name__}: {str(e)}")
+            return self._rule_based_reply(user_input)
+
+        # Only record the turn once the LLM has answered, so a rejected call can be retried cleanly
+        self.conversation_history.extend([user_message, response])
+        correction = self._record_llm_reply(messages, response.content, response.usage_metadata)
+
+        if correction:
+            # The LLM's recap needed correcting; the patient gets the corrected reply instead
+            self._replace_last_reply(correction)
+            return correction
         return response.content
+
+    async def astream_response(self, user_input):
+        """Yield response tokens as the LLM produces them"""
+        local_answer = self._answer_locally(user_input)
+        if local_answer:
+            yield local_answer
+            return
+        if self.breaker and not self.breaker.allow():
+            yield self._rule_based_reply(user_input)
+            return
+
+        user_message = HumanMessage(content=user_input)
+        messages = self._prompt_messages(user_message)
+        parts = []
+        usage = None
+
+        try:
+            async with self._queued_llm_slot(messages):
+                with llm_call("stream"), stage("llm"):
+                    start = time.perf_counter()
+                    async for chunk in self._stream_llm(messages):
+                        if chunk.usage_metadata:
+                            usage = chunk.usage_metadata
+                        if chunk.content:
+                            if not parts:
+                                STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_first_token")
+                            parts.append(chunk.content)
+                            yield chunk.content
+        except LLMQueueFullError:
+            raise
+        except Exception as e:
+            # Once part of the reply has gone out there is nothing clean to fall back to
+            if not self.breaker or parts:
+                raise
+            logger.warning(f"Answering without the LLM: {type(e).__name__}: {str(e)}")
+            yield self._rule_based_reply(user_input)
+            return
+
+        reply = "".join(parts)
+        self.conversation_history.extend([user_message, AIMessage(content=reply)])
+        correction = self._record_llm_reply(messages, reply, usage)
+        if correction:
+            # The recap has already gone out; follow it with the correction
+            yield "\n\n" + correction
+            self._replace_last_reply(f"{reply}\n\n{correction}")
+
+    async def _invoke_llm(self, messages):
+        """One LLM call; with a breaker it is hedged, bounded by LLM_DEADLINE_SECONDS and recorded"""
+        if not self.breaker:
+            return await self.llm.ainvoke(messages)
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(
+                hedged_invoke(self.llm, self.hedge_llm, messages, self._hedge_delay()), LLM_DEADLINE_SECONDS)
+        except asyncio.TimeoutError:
+            self.breaker.record(time.monotonic() - start, ok=False)
+            raise LLMUnavailableError(f"No reply from the LLM within {LLM_DEADLINE_SECONDS:g}s")
+        except Exception:
+            self.breaker.record(time.monotonic() - start, ok=False)
+            raise
+        self.breaker.record(time.monotonic() - start, ok=True)
+        return response
+
+    async def _stream_llm(self, messages):
+        """Stream an LLM reply; with a breaker the first chunk is hedged, bounded and recorded"""
+        if not self.breaker:
+            async for chunk in self.llm.astream(messages):
+                yield chunk
+            return
+        start = time.monotonic()
+        stream = hedged_stream(self.llm, self.hedge_llm, messages, self._hedge_delay(), LLM_DEADLINE_SECONDS)
+        first = True
+        try:
+            async for chunk in stream:
+                if first:
+                    # Time to the first chunk is what the patient waits on, so that is what is tracked
+                    self.breaker.record(time.monotonic() - start, ok=True)
+                    first = False
+                yield chunk
+        except Exception:
+            if first:
+                self.breaker.record(time.monotonic() - start, ok=False)
+            raise
+        finally:
+            await stream.aclose()
+
+    def _hedge_delay(self):
+        """Send the hedge once the call is slower than the recent p95"""
+        return max(HEDGE_MIN_DELAY_SECONDS, self.breaker.p95() or 0.0)
+
+    def _rule_based_reply(self, user_input):
+        """Answer a turn from the booking templates while the LLM is down or too slow"""
+        reply = self.booking.fallback_reply(user_input)
+        turn_stats.record("fallback")
+        self.conversation_history.extend([HumanMessage(content=user_input), AIMessage(content=reply)])
+        return reply
+
+    def _prompt_messages(self, user_message):
+        """Messages to send this turn: the context window plus any availability facts"""
+        self._refresh_system_message()
+        with stage("context_window"):
+            messages = self.context_window.build(self.conversation_history, user_message)
+        with stage("availability_check"):
+            note = self._availability_note(user_message.content)
+        if note:
+            messages.insert(-1, note)
+        hint = self._specialty_hint(user_message.content)
+        if hint:
+            messages.insert(-1, hint)
+        return messages
+
+    def _refresh_system_message(self):
+        """Switch to the current clinic's system prompt if clinic_details.json was reloaded"""
+        clinic = clinic_config.current()
+        if clinic is not self.clinic:
+            self.clinic = clinic
+            self.system_message = SystemMessage(content=clinic.system_prompt)
+            self.conversation_history[0] = self.system_message
+
+    def _availability_note(self, user_input):
+        """Tell the LLM whether a requested slot is free, so it never confirms a double booking"""
+        if not self.availability:
+            return None
+        slots = extract_slots(user_input)
+        if not slots.date or not slots.time:
+            return None
+        # Same lookup as the booking state machine: "Dr." required, the patient's own name ignored
+        doctor = self.availability.find_doctor(self.booking.without_name(user_input), titled=True)
+        doctor = doctor or self._current_doctor()
+        if not doctor:
+            return None
+
+        is_valid, message = self.validate_date_time(slots.date, slots.time, doctor)
+        if is_valid:
+            return SystemMessage(content=f"Availability check: {doctor} is free on {message}.")
+        return SystemMessage(content=f"Availability check: {message} Do not confirm this slot; offer these options instead.")
+
+    def _specialty_hint(self, user_input):
+        """Pass the specialty router's pick to the LLM when it is likely but not certain"""
+        if not self.specialty_router or self.booking.doctor:
+            return None
+        match = self.specialty_router.route(user_input)
+        if not match or match.confidence < SPECIALTY_HINT_CONFIDENCE:
+            return None
+        return SystemMessage(content=(
+            f"Department check: the complaint most likely belongs to {match.label} "
+            f"(confidence {match.confidence:.2f}). Unless the patient asks for someone else, "
+            f"recommend {match.doctor}, who has the most free time in that department."
+        ))
+
+    def _current_doctor(self):
+        """The doctor being booked, else the one most recently named with "Dr." in this conversation"""
+        if self.booking.doctor:
+            return self.booking.doctor
+        for msg in reversed(self.conversation_history[1:]):
+            doctor = self.availability.find_doctor(self.booking.without_name(msg.content), titled=True)
+            if doctor:
+                return doctor
+        return self.availability.find_doctor(self.context_window.slots.get("doctor"))
+
+    def _answer_locally(self, user_input):
+        """Answer FAQs and fully-determined booking turns without the LLM, recording the exchange"""
+        with stage("faq"):
+            # A booking request that also mentions a specialty or asks for the address
+            # must reach the state machine, or its date, time or doctor would be lost
+            slots = extract_slots(user_input)
+            answer = None
+            if self.faq_router and not (slots.date or slots.time or slots.doctor):
+                answer = self.faq_router.answer(user_input)
+        source = "faq"
+        if not answer:
+            with stage("booking_state"):
+                answer = self.booking.handle(user_input)
+            source = "state_machine"
+        if answer:
+            turn_stats.record(source)
+            self.conversation_history.extend([HumanMessage(content=user_input), AIMessage(content=answer)])
+        return answer
+
+    def _record_llm_reply(self, messages, reply, usage=None):
+        turn_stats.record("llm")
+        # Groq reports usage; fall back to the same estimate the context window budgets with
+        usage = usage or {}
+        prompt_tokens = usage.get("input_tokens") or sum(estimate_tokens(m.content) for m in messages)
+        completion_tokens = usage.get("output_tokens") or estimate_tokens(reply)
+        LLM_TOKENS.observe(prompt_tokens, kind="prompt")
+        LLM_TOKENS.observe(completion_tokens, kind="completion")
+        if self.limiter:
+            self.limiter.settle(self._token_reservation(messages), prompt_tokens + completion_tokens)
+        with stage("reply_extraction"):
+            return self.booking.observe_reply(reply, messages[-1].content)
+
+    def _replace_last_reply(self, reply):
+        self.conversation_history[-1] = AIMessage(content=reply)
+
+    def _llm_slot(self, messages):
+        if not self.limiter:
+            return nullcontext()
+        return self.limiter.slot(self._llm_lane(), self._token_reservation(messages))
+
+    def _llm_lane(self):
+        """Scheduler lane for this turn: confirmations first, then bookings under way, then new chats"""
+        if self.booking.state == "confirming":
+            return LANE_CONFIRM
+        if len(self.conversation_history) > 1 or self.context_window.folded_turns or self.booking.name:
+            return LANE_BOOKING
+        return LANE_NEW
+
+    @staticmethod
+    def _token_reservation(messages):
+        # Rate limits count the reply too, so reserve the most it can be until the real usage is known
+        return sum(estimate_tokens(m.content) for m in messages) + MAX_TOKENS
+
+    @asynccontextmanager
+    async def _queued_llm_slot(self, messages):
+        """_llm_slot, timing how long the call waited for a free slot.
+
+        A 429 from the provider pauses the scheduler and surfaces as LLMQueueFullError,
+        so the caller gets a Retry-After instead of the apology message.
+        """
+        start = time.perf_counter()
+        async with self._llm_slot(messages):
+            STAGE_SECONDS.observe(time.perf_counter() - start, stage="llm_queue")
+            try:
+                yield
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is None:
+                    raise
+                if self.limiter:
+                    self.limiter.pause(delay)
+                raise LLMQueueFullError("The assistant is being rate limited", retry_after=math.ceil(delay)) from e
     
     def extract_info(self, text, info_type):
-        """Extract specific information from conversation using simple pattern matching"""
-        if info_type == "name":
-            patterns = [
-                r"my name is ([A-Za-z\s]+)",
-                r"i'm ([A-Za-z\s]+)",
-                r"call me ([A-Za-z\s]+)",
-                r"this is ([A-Za-z\s]+)",
-            ]
-        elif info_type == "problem":
+        """Extract specific information from conversation using the shared slot extractor"""
+        if info_type == "problem":
             # Just return the latest user message as problem for simplicity
             for msg in reversed(self.conversation_history):
                 if isinstance(msg, HumanMessage):
                     return msg.content
             return ""
-        elif info_type == "doctor":
-            patterns = [
-                r"Dr\. ([A-Za-z\s]+)",
-                r"doctor ([A-Za-z\s]+)",
-            ]
-        elif info_type == "date":
-            patterns = [
-                r"(\d{1,2}[/-]\d{1,2}[/-]\d{2,4})",
-                r"(\d{1,2} (January|February|March|April|May|June|July|August|September|October|November|December) \d{4})",
-                r"(today|tomorrow)",
-            ]
-        elif info_type == "time":
-            patterns = [
-                r"(\d{1,2}:\d{2} (AM|PM))",
-                r"(\d{1,2} (AM|PM))",
-                r"(\d{1,2} o'clock)",
-            ]
-        else:
-            return None
-            
-        if info_type in ["problem"]:  # Special handling
-            return self._extract_special_info(info_type)
-            
-        for pattern in patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                return match.group(1).strip()
+        if info_type in ("name", "doctor", "date", "time"):
+            return extract_slots(text).get(info_type)
         return None
     
-    def _extract_special_info(self, info_type):
-        """Special extraction methods for certain info types"""
-        if info_type == "problem":
-            # Look for the first user message after greeting
-            for i, msg in enumerate(self.conversation_history):
-                if isinstance(msg, HumanMessage) and i > 2:  # Skip initial messages
-                    # Check if this might be describing a problem
-                    if len(msg.content.split()) > 3:  # More than 3 words likely a problem description
-                        return msg.content
-        return None
-    
-    def validate_date_time(self, date_str, time_str):
-        """Validate if the date and time are correct and within working hours"""
-        from datetime import datetime
-        
+    def validate_date_time(self, date_str, time_str, doctor=None):
+        """Validate if the date and time are correct, within working hours and free for the doctor"""
         try:
-            # Parse date (handle different formats)
-            if not date_str or not time_str:
-                return False, "Please provide both date and time"
-            
-            # Normalize date first
-            normalized_date = self.normalize_date(date_str)
-            normalized_time = self.normalize_time(time_str)
+            is_valid, appointment_dt, message = validate_slot(date_str, time_str)
+            if not is_valid:
+                return False, message
             
-            if not normalized_date or not normalized_time:
-                return False, "I couldn't understand the date or time format"
+            if doctor and self.availability and not self.availability.is_free(doctor, appointment_dt):
+                alternatives = self.availability.next_free_slots(doctor, appointment_dt)
+                options = ", ".join(slot.strftime("%A, %B %d at %I:%M %p") for slot in alternatives)
+                return False, f"{doctor} is not available at that time. The nearest free slots are: {options}."
             
-            # Parse the datetime
-            try:
-                appointment_dt = datetime.strptime(f"{normalized_date} {normalized_time}", "%Y-%m-%d %H:%M")
-            except:
-                return False, "Invalid date or time format"
-            
-            # Check if it's in the future
-            if appointment_dt < datetime.now():
-                return False, "Please provide a future date and time"
-            
-            # Check day of week (0=Monday, 6=Sunday)
-            day_of_week = appointment_dt.weekday()
-            
-            # Check working hours
-            hour = appointment_dt.hour
-            
-            # Weekday hours: 9 AM - 6 PM (9-18)
-            if day_of_week < 5:  # Monday-Friday
-                if hour < 9 or hour >= 18:
-                    return False, "Our clinic is open from 9:00 AM to 6:00 PM on weekdays"
-            # Saturday hours: 10 AM - 4 PM (10-16)
-            elif day_of_week == 5:  # Saturday
-                if hour < 10 or hour >= 16:
-                    return False, "Our clinic is open from 10:00 AM to 4:00 PM on Saturdays"
-            else:  # Sunday
-                return False, "Our clinic is closed on Sundays"
-            
-            return True, f"{appointment_dt.strftime('%A, %B %d, %Y at %I:%M %p')}"
+            return True, message
             
         except Exception as e:
             return False, f"Error validating date: {str(e)}"
-        def normalize_date(self, date_str):
-            """Normalize date format to YYYY-MM-DD"""
-            if not date_str:
-                return None
-                
-            date_str = date_str.lower()
-            
-            # Handle relative dates
-            if date_str == "today":
-                return datetime.now().strftime("%Y-%m-%d")
-            elif date_str == "tomorrow":
-                from datetime import timedelta
-                return (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
-            
-            # Handle various date formats
-            try:
-                # Try different date formats
-                for fmt in ("%m/%d/%Y", "%m-%d-%Y", "%d/%m/%Y", "%d-%m-%Y", 
-                        "%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y"):
-                    try:
-                        dt = datetime.strptime(date_str, fmt)
-                        return dt.strftime("%Y-%m-%d")
-                    except ValueError:
-                        continue
-            except:
-                pass
-                
-            return date_str  # Return as-is if can't parse
-        
+
+    def normalize_date(self, date_str):
+        """Normalize date format to YYYY-MM-DD"""
+        if not date_str:
+            return None
+        return normalize_date(date_str) or date_str  # Return as-is if can't parse
+    
     def normalize_time(self, time_str):
         """Normalize time format to HH:MM"""
         if not time_str:
             return None
-            
-        time_str = time_str.upper()
-        
-        # Handle various time formats
-        try:
-            # Try different time formats
-            for fmt in ("%I:%M %p", "%I %p", "%H:%M"):
-                try:
-                    from datetime import datetime
-                    dt = datetime.strptime(time_str, fmt)
-                    return dt.strftime("%H:%M")
-                except ValueError:
-                    continue
-        except:
-            pass
-            
-        return time_str  # Return as-is if can't parse
+        return normalize_time(time_str) or time_str  # Return as-is if can't parse
     
+    def dump_state(self):
+        """Everything a session needs to carry on in another process, as plain JSON values.
+
+        The system prompt is left out; it comes from the clinic config wherever the session resumes.
+        """
+        return {
+            "history": [[MESSAGE_KINDS[msg.type], msg.content] for msg in self.conversation_history[1:]],
+            "context": self.context_window.dump_state(),
+            "booking": self.booking.dump_state(),
+        }
+
+    def load_state(self, state):
+        self.conversation_history = [self.system_message] + [
+            MESSAGE_TYPES[kind](content=content) for kind, content in state["history"]
+        ]
+        self.context_window.load_state(state["context"])
+        self.booking.load_state(state["booking"])
+
     def reset_conversation(self):
         """Reset the conversation history"""
-        self.conversation_history = [self.system_message]
\ No newline at end of file
+        self.conversation_history = [self.system_message]
+        self.context_window.reset()
+        self.booking.reset()
\ No newline at end of file
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from config import CLINIC_DETAILS_FILE, CLINIC_CONFIG_CHECK_SECONDS
+from prompt_templates import build_system_prompt
+
+logger = logging.getLogger(__name__)
+
+# Resolved against this file, not the working directory, so any launcher finds it
+CLINIC_DETAILS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CLINIC_DETAILS_FILE)
+
+# clinic_details.json working_hours key for each weekday (0=Monday, 6=Sunday)
+WEEKDAY_HOURS_KEYS = ["weekdays"] * 5 + ["saturdays", "sundays"]
+HOURS_PATTERN = re.compile(r"(\d{1,2}:\d{2}\s*[AP]M)\s*-\s*(\d{1,2}:\d{2}\s*[AP]M)", re.IGNORECASE)
+
+
+def parse_hours(text):
+    """Turn '9:00 AM - 6:00 PM' into (540, 1080) minutes after midnight, or None if closed"""
+    match = HOURS_PATTERN.search(text or "")
+    if not match:
+        return None
+    opens, closes = (datetime.strptime(part.upper().replace(" ", ""), "%I:%M%p") for part in match.groups())
+    return opens.hour * 60 + opens.minute, closes.hour * 60 + closes.minute
+
+
+def doctor_key(name):
+    """'Dr. Smith', 'dr smith' and 'Smith' all map to 'smith'"""
+    name = re.sub(r"^\s*(dr\.?|doctor)\s+", "", str(name or ""), flags=re.IGNORECASE)
+    return " ".join(re.sub(r"[^a-z ]", " ", name.lower()).split())
+
+
+def specialty_label(specialty):
+    return specialty.replace("_", " ").title()
+
+
+class ClinicSnapshot:
+    """One version of clinic_details.json plus everything derived from it.
+
+    Built once per version and never mutated, so readers can hold on to a snapshot
+    for the length of a request without locking.
+    """
+
+    def __init__(self, details, mtime=None, version=1):
+        self.details = details
+        self.mtime = mtime
+        self.version = version
+        self.clinic_name = details["clinic_name"]
+        self.working_hours = details["working_hours"]
+        self.contact_info = details["contact_info"]
+        self.system_prompt = build_system_prompt(details)
+        # Display label ("General Medicine") -> doctors
+        self.specialties = {specialty_label(specialty): list(doctors) for specialty, doctors in details["doctors"].items()}
+        # doctor_key -> (clinic spelling of the name, specialty key)
+        self.doctor_index = {
+            doctor_key(doctor): (doctor, specialty)
+            for specialty, doctors in details["doctors"].items()
+            for doctor in doctors
+        }
+        # (opens, closes) in minutes after midnight for each weekday (0=Monday), None when closed
+        self.hours_table = [parse_hours(self.working_hours[key]) for key in WEEKDAY_HOURS_KEYS]
+
+
+class ClinicConfig:
+    """Serves the current ClinicSnapshot and swaps in a new one when the file changes.
+
+    current() stats the file at most once every check_interval seconds; when the mtime
+    has moved, the file is parsed and every derived table rebuilt once, then published
+    with a single reference swap. Subscribers (FAQ router, availability) are told about
+    each new snapshot. A file that fails to parse is logged and the old snapshot kept.
+    """
+
+    def __init__(self, path=CLINIC_DETAILS_PATH, check_interval=CLINIC_CONFIG_CHECK_SECONDS):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._next_check = time.monotonic() + check_interval
+        # mtime of a version that failed to load, so it is reported once rather than every check
+        self._failed_mtime = None
+        self._snapshot = self._load(version=1)
+
+    def current(self):
+        if time.monotonic() >= self._next_check:
+            self.reload()
+        return self._snapshot
+
+    def subscribe(self, listener):
+        """Call listener(snapshot) whenever a new snapshot is swapped in"""
+        with self._lock:
+            self._listeners.append(listener)
+        return listener
+
+    def reload(self, force=False):
+        """Re-read the file if it changed since the last load; return True if a new snapshot was published"""
+        with self._lock:
+            self._next_check = time.monotonic() + self.check_interval
+            previous = self._snapshot
+            mtime = None
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                if not force and mtime in (previous.mtime, self._failed_mtime):
+                    return False
+                snapshot = self._load(version=previous.version + 1)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                self._failed_mtime = mtime
+                logger.warning(f"Keeping clinic config version {previous.version}: {str(e)}")
+                return False
+
+            self._snapshot = snapshot
+            logger.info(f"Loaded clinic config version {snapshot.version} from {self.path}")
+            for listener in self._listeners:
+                try:
+                    listener(snapshot)
+                except Exception as e:
+                    logger.error(f"Clinic config listener failed: {str(e)}")
+            return True
+
+    def _load(self, version):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, "r") as f:
+            details = json.load(f)
+        return ClinicSnapshot(details, mtime=mtime, version=version)
+
+
+clinic_config = ClinicConfig()
@@ -6,15 +6,97 @@ load_dotenv()
 # API Keys
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GOOGLE_SHEETS_CREDENTIALS = os.getenv("GOOGLE_SHEETS_CREDENTIALS")
+# Override to send LLM calls to another OpenAI-compatible endpoint (e.g. benchmarks/fake_groq.py)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL")
 
 # Google Sheets Configuration
 SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "1J8lKX67070VMjAa5BodZD9AEFP-CTGQwGT9Ff27lh7k")
 SHEET_NAME = os.getenv("SHEET_NAME", "Sheet1")
 
+# Bookings are logged locally first and flushed to the sheet in batches
+APPOINTMENT_QUEUE_DB = os.getenv("APPOINTMENT_QUEUE_DB", "appointment_queue.db")
+SHEETS_BATCH_SIZE = int(os.getenv("SHEETS_BATCH_SIZE", "50"))
+SHEETS_FLUSH_INTERVAL_SECONDS = float(os.getenv("SHEETS_FLUSH_INTERVAL_SECONDS", "2"))
+SHEETS_RETRY_BASE_SECONDS = float(os.getenv("SHEETS_RETRY_BASE_SECONDS", "1"))
+SHEETS_RETRY_MAX_SECONDS = float(os.getenv("SHEETS_RETRY_MAX_SECONDS", "60"))
+MIRROR_SYNC_INTERVAL_SECONDS = float(os.getenv("MIRROR_SYNC_INTERVAL_SECONDS", "30"))
+
 # Model Configuration
 MODEL_NAME = "llama-3.1-8b-instant"
 MAX_TOKENS = 1024
 TEMPERATURE = 0.3
 
-# Clinic Details
-CLINIC_DETAILS_FILE = "clinic_details.json"
\ No newline at end of file
+# LLM Resilience Configuration
+# A turn the LLM hasn't answered (or started streaming) by then is answered from the booking templates
+LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "6"))
+# Optional second model raced against MODEL_NAME when it is slower than its recent p95; empty turns hedging off
+HEDGE_MODEL_NAME = os.getenv("HEDGE_MODEL_NAME", "")
+# Hedge no earlier than this, and at this delay until there are enough calls for a p95
+HEDGE_MIN_DELAY_SECONDS = float(os.getenv("HEDGE_MIN_DELAY_SECONDS", "1.5"))
+# The breaker opens when the last BREAKER_WINDOW calls (at least BREAKER_MIN_CALLS) fail this often or are this slow
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_P95_SECONDS = float(os.getenv("BREAKER_P95_SECONDS", "5"))
+# How long turns skip the LLM once the breaker has opened, before one probe call is tried
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+# Prompt Context Configuration (tokens are estimated at ~4 characters each)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_MIN_RECENT_MESSAGES = int(os.getenv("CONTEXT_MIN_RECENT_MESSAGES", "4"))
+
+# LLM Concurrency Configuration
+MAX_CONCURRENT_LLM_CALLS = int(os.getenv("MAX_CONCURRENT_LLM_CALLS", "8"))
+MAX_LLM_QUEUE = int(os.getenv("MAX_LLM_QUEUE", "64"))
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "30"))
+# Provider rate limits to stay under, per minute (0 = no limit); set them to your Groq plan's
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+# Batch Chat Configuration
+BATCH_PARALLELISM = int(os.getenv("BATCH_PARALLELISM", "8"))
+BATCH_MAX_PARALLELISM = int(os.getenv("BATCH_MAX_PARALLELISM", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+# Times a batch turn is re-sent after the LLM queue turned it away
+BATCH_BUSY_RETRIES = int(os.getenv("BATCH_BUSY_RETRIES", "3"))
+
+# Specialty Router Configuration (complaint -> department, confidence in [0, 1))
+# Below this the LLM decides alone; from it up the router's pick is passed to the LLM as a hint
+SPECIALTY_HINT_CONFIDENCE = float(os.getenv("SPECIALTY_HINT_CONFIDENCE", "0.5"))
+# From this up the doctor is recommended from a template and the LLM is skipped
+SPECIALTY_SKIP_LLM_CONFIDENCE = float(os.getenv("SPECIALTY_SKIP_LLM_CONFIDENCE", "0.75"))
+
+# FAQ Router Configuration
+FAQ_CACHE_SIZE = int(os.getenv("FAQ_CACHE_SIZE", "2048"))
+
+# Session Store Configuration
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "5000"))
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "1800"))
+MAX_SESSION_STORE_BYTES = int(os.getenv("MAX_SESSION_STORE_BYTES", str(64 * 1024 * 1024)))
+# memory keeps sessions in this process; sqlite or redis share them between uvicorn workers,
+# together with doctor slot claims and idempotency results
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_DB = os.getenv("SESSION_DB", "sessions.db")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+# Idempotency Configuration (stored results of keyed booking requests)
+IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+
+# Appointment Slot Configuration
+APPOINTMENT_SLOT_MINUTES = int(os.getenv("APPOINTMENT_SLOT_MINUTES", "30"))
+AVAILABILITY_HORIZON_DAYS = int(os.getenv("AVAILABILITY_HORIZON_DAYS", "60"))
+
+# Streamlit Front End Configuration
+API_URL = os.getenv("API_URL", "http://localhost:8000")
+API_CONNECT_TIMEOUT_SECONDS = float(os.getenv("API_CONNECT_TIMEOUT_SECONDS", "3"))
+# Longest gap allowed between streamed tokens (or before the first one)
+API_READ_TIMEOUT_SECONDS = float(os.getenv("API_READ_TIMEOUT_SECONDS", "60"))
+API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "3"))
+API_RETRY_BACKOFF_SECONDS = float(os.getenv("API_RETRY_BACKOFF_SECONDS", "0.5"))
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "10"))
+
+# Clinic Details (relative paths are resolved against the project directory)
+CLINIC_DETAILS_FILE = os.getenv("CLINIC_DETAILS_FILE", "clinic_details.json")
+# How often the file's mtime is checked for changes to hot-reload
+CLINIC_CONFIG_CHECK_SECONDS = float(os.getenv("CLINIC_CONFIG_CHECK_SECONDS", "5"))
\ No newline at end of file
@@ -0,0 +1,101 @@
+from langchain_core.messages import HumanMessage, SystemMessage
+from config import CONTEXT_TOKEN_BUDGET, CONTEXT_MIN_RECENT_MESSAGES
+from slot_extractor import extract_slots
+
+SUMMARY_SLOTS = [
+    ("name", "Patient name"),
+    ("doctor", "Doctor"),
+    ("date", "Date"),
+    ("time", "Time"),
+]
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token) that needs no tokenizer"""
+    return len(text) // 4 + 4
+
+
+class ContextWindow:
+    """Keeps the prompt sent to the LLM within a token budget.
+
+    The system prompt and the most recent turns are always sent. Older turns are
+    removed from the history and folded into a short summary of the booking slots
+    collected so far.
+    """
+
+    def __init__(self, token_budget=CONTEXT_TOKEN_BUDGET,
+                 min_recent_messages=CONTEXT_MIN_RECENT_MESSAGES):
+        self.token_budget = token_budget
+        self.min_recent_messages = min_recent_messages
+        self.slots = {}
+        self.folded_turns = 0
+
+    def build(self, history, user_message):
+        """Return the messages to send for this turn, folding old turns out of history in place"""
+        system_message, turns = history[0], history[1:]
+        fixed_tokens = estimate_tokens(system_message.content) + estimate_tokens(user_message.content)
+
+        # Walk back from the newest turn until the budget is used up
+        keep = 0
+        used = fixed_tokens + self._summary_tokens()
+        for message in reversed(turns):
+            cost = estimate_tokens(message.content)
+            if keep >= self.min_recent_messages and used + cost > self.token_budget:
+                break
+            used += cost
+            keep += 1
+
+        fold_count = len(turns) - keep
+        # Fold whole exchanges so the kept history still starts with a patient message
+        if fold_count % 2:
+            fold_count += 1
+        if fold_count > 0:
+            self._fold(turns[:fold_count])
+            del history[1:1 + fold_count]
+
+        messages = [system_message]
+        summary = self.summary_message()
+        if summary:
+            messages.append(summary)
+        messages.extend(history[1:])
+        messages.append(user_message)
+        return messages
+
+    def summary_message(self):
+        if not self.folded_turns:
+            return None
+        collected = "; ".join(
+            f"{label}: {self.slots[slot]}" for slot, label in SUMMARY_SLOTS if self.slots.get(slot)
+        )
+        return SystemMessage(content=(
+            f"Summary of {self.folded_turns} earlier messages. "
+            f"Details collected so far: {collected or 'none yet'}."
+        ))
+
+    def reset(self):
+        self.slots = {}
+        self.folded_turns = 0
+
+    def dump_state(self):
+        return {"slots": self.slots, "folded": self.folded_turns}
+
+    def load_state(self, state):
+        self.slots = dict(state["slots"])
+        self.folded_turns = state["folded"]
+
+    def _summary_tokens(self):
+        summary = self.summary_message()
+        # Reserve room for a summary that may appear once folding starts
+        return estimate_tokens(summary.content) if summary else 40
+
+    def _fold(self, messages):
+        for message in messages:
+            slots = extract_slots(message.content)
+            for slot, _ in SUMMARY_SLOTS:
+                # Names are only taken from the patient's own messages
+                if slot == "name" and not isinstance(message, HumanMessage):
+                    continue
+                value = slots.get(slot)
+                if value:
+                    self.slots[slot] = value
+        self.folded_turns += len(messages)
@@ -0,0 +1,215 @@
+import re
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from clinic_config import clinic_config
+
+MONTHS = {
+    name: number
+    for number, names in enumerate([
+        ("january", "jan"), ("february", "feb"), ("march", "mar"), ("april", "apr"), ("may",),
+        ("june", "jun"), ("july", "jul"), ("august", "aug"), ("september", "sep", "sept"),
+        ("october", "oct"), ("november", "nov"), ("december", "dec"),
+    ], start=1)
+    for name in names
+}
+WEEKDAYS = {
+    name: number
+    for number, names in enumerate([
+        ("monday", "mon"), ("tuesday", "tue", "tues"), ("wednesday", "wed"), ("thursday", "thu", "thur", "thurs"),
+        ("friday", "fri"), ("saturday", "sat"), ("sunday", "sun"),
+    ])
+    for name in names
+}
+MONTH_NAMES = "|".join(sorted(MONTHS, key=len, reverse=True))
+WEEKDAY_NAMES = "|".join(sorted(WEEKDAYS, key=len, reverse=True))
+ORDINAL = r"(?:st|nd|rd|th)?"
+
+ISO_DATE = re.compile(r"^(\d{4})-(\d{1,2})-(\d{1,2})$")
+NUMERIC_DATE = re.compile(r"^(\d{1,2})[/-](\d{1,2})(?:[/-](\d{2}|\d{4}))?$")
+DAY_MONTH = re.compile(rf"^(\d{{1,2}}){ORDINAL}\s+(?:of\s+)?({MONTH_NAMES})\.?,?(?:\s+(\d{{4}}))?$")
+MONTH_DAY = re.compile(rf"^({MONTH_NAMES})\.?\s+(\d{{1,2}}){ORDINAL},?(?:\s+(\d{{4}}))?$")
+WEEKDAY = re.compile(rf"^(?:(next|this|coming)\s+)?({WEEKDAY_NAMES})\.?$")
+RELATIVE_DAYS = {"today": 0, "tomorrow": 1, "day after tomorrow": 2}
+
+TIME_12H = re.compile(r"^(\d{1,2})(?:[:.](\d{2}))?\s*([ap])\.?\s*m\.?$")
+TIME_24H = re.compile(r"^(\d{1,2})[:.](\d{2})$")
+TIME_OCLOCK = re.compile(r"^(\d{1,2})\s*o'?clock$")
+NAMED_TIMES = {"noon": "12:00", "midday": "12:00", "midnight": "00:00"}
+
+# Only English is spoken to the bot, so the fallback parser doesn't try every locale
+DATEPARSER_LANGUAGES = ["en"]
+_dateparser = None
+
+
+def _clean(text):
+    return " ".join(str(text).lower().replace(",", " , ").split()).replace(" ,", ",")
+
+
+@lru_cache(maxsize=4096)
+def _normalize_date(text, today_ordinal):
+    today = date.fromordinal(today_ordinal)
+    text = _clean(text)
+
+    if text in RELATIVE_DAYS:
+        return (today + timedelta(days=RELATIVE_DAYS[text])).isoformat()
+
+    match = ISO_DATE.match(text)
+    if match:
+        return _build(int(match.group(1)), int(match.group(2)), int(match.group(3)), today)
+
+    match = NUMERIC_DATE.match(text)
+    if match:
+        first, second = int(match.group(1)), int(match.group(2))
+        year = _year(match.group(3))
+        # Month first (US style) unless that can't be a month
+        month, day = (first, second) if first <= 12 else (second, first)
+        return _build(year, month, day, today)
+
+    match = DAY_MONTH.match(text)
+    if match:
+        return _build(_year(match.group(3)), MONTHS[match.group(2)], int(match.group(1)), today)
+
+    match = MONTH_DAY.match(text)
+    if match:
+        return _build(_year(match.group(3)), MONTHS[match.group(1)], int(match.group(2)), today)
+
+    match = WEEKDAY.match(text)
+    if match:
+        # The next such weekday after today; "next monday" said on a Sunday is tomorrow
+        days_ahead = (WEEKDAYS[match.group(2)] - today.weekday() - 1) % 7 + 1
+        return (today + timedelta(days=days_ahead)).isoformat()
+
+    return _parse_with_dateparser(text, today)
+
+
+def _year(text):
+    if not text:
+        return None
+    year = int(text)
+    return year + 2000 if year < 100 else year
+
+
+def _build(year, month, day, today):
+    """Make an ISO date; without a year, use the next time that day comes round"""
+    try:
+        if year is not None:
+            return date(year, month, day).isoformat()
+        candidate = date(today.year, month, day)
+        if candidate < today:
+            candidate = date(today.year + 1, month, day)
+        return candidate.isoformat()
+    except ValueError:
+        return None
+
+
+def _parse_with_dateparser(text, today):
+    """Slow path for phrasings the patterns above don't cover ("in 3 days", "next week")"""
+    global _dateparser
+    if _dateparser is None:
+        try:
+            import dateparser
+        except ImportError:
+            return None
+        _dateparser = dateparser
+    parsed = _dateparser.parse(
+        text,
+        languages=DATEPARSER_LANGUAGES,
+        settings={
+            "PREFER_DATES_FROM": "future",
+            "RELATIVE_BASE": datetime.combine(today, datetime.min.time()),
+        },
+    )
+    return parsed.date().isoformat() if parsed else None
+
+
+def normalize_date(text, today=None):
+    """Normalize a date to YYYY-MM-DD; return None if it can't be understood"""
+    if not text:
+        return None
+    return _normalize_date(str(text), (today or date.today()).toordinal())
+
+
+@lru_cache(maxsize=1024)
+def normalize_time(text):
+    """Normalize a time to HH:MM (24-hour); return None if it can't be understood"""
+    if not text:
+        return None
+    text = _clean(text)
+    if text in NAMED_TIMES:
+        return NAMED_TIMES[text]
+
+    match = TIME_12H.match(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2) or 0)
+        if not 1 <= hour <= 12 or minute > 59:
+            return None
+        hour = hour % 12 + (12 if match.group(3) == "p" else 0)
+        return f"{hour:02d}:{minute:02d}"
+
+    match = TIME_24H.match(text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        return f"{hour:02d}:{minute:02d}" if hour < 24 and minute < 60 else None
+
+    match = TIME_OCLOCK.match(text)
+    if match and 1 <= int(match.group(1)) <= 12:
+        # "9 o'clock" means the clinic's morning hours; "3 o'clock" the afternoon
+        hour = int(match.group(1))
+        hour = hour + 12 if hour < 8 else hour
+        return f"{hour:02d}:00"
+
+    return None
+
+
+def _format_minutes(minutes):
+    return datetime.min.replace(hour=minutes // 60, minute=minutes % 60).strftime("%I:%M %p").lstrip("0")
+
+
+DAY_LABELS = ["weekdays"] * 5 + ["Saturdays", "Sundays"]
+
+
+def validate_many(slots, now=None, hours=None):
+    """Check many (date, time) candidates against working hours in one call.
+
+    Returns one (is_valid, datetime or None, message) tuple per candidate, in order.
+    hours defaults to the current clinic config's precomputed hours table.
+    """
+    now = now or datetime.now()
+    hours = hours or clinic_config.current().hours_table
+    today = now.date()
+    results = []
+    for date_str, time_str in slots:
+        if not date_str or not time_str:
+            results.append((False, None, "Please provide both date and time"))
+            continue
+
+        normalized_date = normalize_date(date_str, today)
+        normalized_time = normalize_time(time_str)
+        if not normalized_date or not normalized_time:
+            results.append((False, None, "I couldn't understand the date or time format"))
+            continue
+
+        appointment_dt = datetime.strptime(f"{normalized_date} {normalized_time}", "%Y-%m-%d %H:%M")
+        if appointment_dt < now:
+            results.append((False, appointment_dt, "Please provide a future date and time"))
+            continue
+
+        weekday = appointment_dt.weekday()
+        day_hours = hours[weekday]
+        minutes = appointment_dt.hour * 60 + appointment_dt.minute
+        if day_hours is None:
+            label = appointment_dt.strftime("%A") + "s"
+            results.append((False, appointment_dt, f"Our clinic is closed on {label}"))
+        elif not day_hours[0] <= minutes < day_hours[1]:
+            results.append((False, appointment_dt, (
+                f"Our clinic is open from {_format_minutes(day_hours[0])} to "
+                f"{_format_minutes(day_hours[1])} on {DAY_LABELS[weekday]}"
+            )))
+        else:
+            results.append((True, appointment_dt, appointment_dt.strftime("%A, %B %d, %Y at %I:%M %p")))
+    return results
+
+
+def validate_slot(date_str, time_str, now=None, hours=None):
+    """validate_many for a single candidate"""
+    return validate_many([(date_str, time_str)], now=now, hours=hours)[0]
@@ -0,0 +1,153 @@
+import re
+import threading
+from collections import OrderedDict
+from clinic_config import clinic_config, specialty_label
+from config import FAQ_CACHE_SIZE
+
+# Words that mean the patient is booking rather than asking about the clinic
+BOOKING_PATTERN = re.compile(r"\b(book|booking|appointment|schedule|reschedule|confirm|my name|i am|i'm)\b")
+QUESTION_PATTERN = re.compile(
+    r"\?$|^(what|what's|whats|which|who|when|where|how|do|does|are|is|can|could|tell me|give me)\b"
+)
+
+SPECIALTY_PATTERNS = {
+    "general_medicine": r"general (medicine|physicians?|practitioners?|doctors?)|\bgps?\b",
+    "cardiology": r"cardiolog\w*|heart (doctors?|specialists?)",
+    "dermatology": r"dermatolog\w*|skin (doctors?|specialists?)",
+    "orthopedics": r"orthop(a)?edic\w*|bone (doctors?|specialists?)",
+    "pediatrics": r"p(a)?ediatric\w*|children'?s doctors?|child (doctors?|specialists?)",
+    "neurology": r"neurolog\w*|brain (doctors?|specialists?)|nerve (doctors?|specialists?)",
+}
+
+# Checked in order; a question may match several intents
+INTENT_PATTERNS = [
+    ("doctors", r"\b(doctors|specialists|specialties|departments|physicians)\b"),
+    ("hours", r"\b(hours?|open|opening|close|closing|closed|timings?|working days?)\b"),
+    ("phone", r"\b(phone|telephone|call you|number)\b"),
+    ("email", r"\b(e-?mail)\b"),
+    ("address", r"\b(address|located|location|where are you|directions?)\b"),
+    ("contact", r"\b(contact|reach you|get in touch)\b"),
+]
+
+COMPILED_INTENTS = [(name, re.compile(pattern)) for name, pattern in INTENT_PATTERNS]
+
+
+def normalize_question(text):
+    """Lowercase, drop punctuation (except a trailing question mark) and collapse whitespace"""
+    text = text.lower().strip()
+    is_question = text.endswith("?")
+    text = re.sub(r"[^a-z0-9'@+\- ]+", " ", text)
+    text = " ".join(text.split())
+    return text + "?" if is_question else text
+
+
+class FAQRouter:
+    """Answers fixed clinic questions from clinic_details.json without calling the LLM"""
+
+    def __init__(self, snapshot=None, cache_size=FAQ_CACHE_SIZE):
+        self.cache_size = cache_size
+        # normalised question -> answer, for FAQs only
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.answered = 0
+        self.fallthrough = 0
+        if snapshot is None:
+            # Follow clinic_details.json so edited hours or doctors are answered without a restart
+            snapshot = clinic_config.current()
+            clinic_config.subscribe(self.configure)
+        self.configure(snapshot)
+
+    def configure(self, snapshot):
+        """Precompute the answers for a clinic config snapshot and drop answers cached from the old one"""
+        answers = self._precompute(snapshot.details)
+        specialties = [
+            (name, re.compile(SPECIALTY_PATTERNS.get(name) or re.escape(specialty_label(name).lower())))
+            for name in snapshot.details["doctors"]
+        ]
+        with self._lock:
+            self.answers = answers
+            self.specialty_patterns = specialties
+            self._cache.clear()
+
+    def answer(self, message):
+        """Return a ready answer for an FAQ, or None if the message needs the LLM"""
+        key = normalize_question(message)
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                self._cache.move_to_end(key)
+                result = self._cache[key]
+            else:
+                self.misses += 1
+                result = self._route(key)
+                # Only answers are kept; non-FAQ messages are unique patient text and would flush them out
+                if result is not None:
+                    self._cache[key] = result
+                    if len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+            if result is None:
+                self.fallthrough += 1
+            else:
+                self.answered += 1
+            return result
+
+    def stats(self):
+        with self._lock:
+            total = self.answered + self.fallthrough
+            return {
+                "cache_hits": self.hits,
+                "cache_misses": self.misses,
+                "cache_size": len(self._cache),
+                "answered": self.answered,
+                "fallthrough": self.fallthrough,
+                "answered_ratio": round(self.answered / total, 3) if total else 0.0,
+            }
+
+    def _route(self, question):
+        if not QUESTION_PATTERN.search(question) or BOOKING_PATTERN.search(question):
+            return None
+
+        specialties = [name for name, pattern in self.specialty_patterns if pattern.search(question)]
+        intents = [name for name, pattern in COMPILED_INTENTS if pattern.search(question)]
+
+        parts = [self.answers[f"specialty:{name}"] for name in specialties]
+        if specialties and "doctors" in intents:
+            intents.remove("doctors")
+        # The contact answer already covers phone, email and address
+        if "contact" in intents:
+            intents = [i for i in intents if i not in ("phone", "email", "address")]
+        parts.extend(self.answers[intent] for intent in intents)
+
+        if not parts:
+            return None
+        return " ".join(parts) + " Would you like me to help you book an appointment?"
+
+    @staticmethod
+    def _precompute(details):
+        hours = details["working_hours"]
+        contact = details["contact_info"]
+        answers = {
+            "hours": (
+                f"Our working hours are: Weekdays {hours['weekdays']}, "
+                f"Saturdays {hours['saturdays']}, Sundays {hours['sundays']}."
+            ),
+            "phone": f"You can call us at {contact['phone']}.",
+            "email": f"You can email us at {contact['email']}.",
+            "address": f"We are located at {contact['address']}.",
+            "contact": (
+                f"You can reach {details['clinic_name']} by phone at {contact['phone']}, "
+                f"by email at {contact['email']}, or visit us at {contact['address']}."
+            ),
+            "doctors": "Our specialists are: " + "; ".join(
+                f"{specialty_label(specialty)}: {', '.join(doctors)}"
+                for specialty, doctors in details["doctors"].items()
+            ) + ".",
+        }
+        for specialty, doctors in details["doctors"].items():
+            answers[f"specialty:{specialty}"] = (
+                f"Our {specialty_label(specialty)} doctors are {' and '.join(doctors)}."
+            )
+        return answers
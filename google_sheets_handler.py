@@ -1,18 +1,33 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
 import os
+import threading
 from config import GOOGLE_SHEETS_CREDENTIALS, SPREADSHEET_ID, SHEET_NAME
 from datetime import datetime
+from metrics import sheets_call
+
+HEADERS = ["Timestamp", "Patient Name", "Recommended Doctor", "Appointment Date", "Appointment Time"]
+
+def appointment_row(patient_name, recommended_doctor, appointment_date, appointment_time):
+    """Build a sheet row for an appointment, stamped with the time it was booked"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return [timestamp, patient_name, recommended_doctor, appointment_date, appointment_time]
+
+def sheets_configured():
+    """Whether a credentials file is configured, checked without touching the network"""
+    return bool(GOOGLE_SHEETS_CREDENTIALS) and os.path.exists(GOOGLE_SHEETS_CREDENTIALS)
 
 class GoogleSheetsHandler:
     def __init__(self):
+        # Imported here so modules that only need appointment_row don't pay for gspread
+        import gspread
+        from oauth2client.service_account import ServiceAccountCredentials
+
         self.scope = [
             "https://spreadsheets.google.com/feeds", 
             "https://www.googleapis.com/auth/drive"
         ]
 
         # Load credentials from JSON file path
-        if not os.path.exists(GOOGLE_SHEETS_CREDENTIALS):
+        if not sheets_configured():
             raise FileNotFoundError(f"Google Sheets credentials file not found: {GOOGLE_SHEETS_CREDENTIALS}")
 
         self.creds = ServiceAccountCredentials.from_json_keyfile_name(
@@ -20,69 +35,87 @@ class GoogleSheetsHandler:
         )
         self.client = gspread.authorize(self.creds)
 
-        # 🔎 Debug: list available worksheets
-        spreadsheet = self.client.open_by_key(SPREADSHEET_ID)
-        print("DEBUG: Available worksheets ->", [ws.title for ws in spreadsheet.worksheets()])
-
-        # Try to open worksheet
-        self.sheet = spreadsheet.worksheet(SHEET_NAME)
+        with sheets_call("open"):
+            self.sheet = self.client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
         
         # Ensure headers exist
-        headers = ["Timestamp", "Patient Name", "Recommended Doctor", "Appointment Date", "Appointment Time"]
-        if self.sheet.row_values(1) != headers:
-            self.sheet.insert_row(headers, 1)
+        with sheets_call("ensure_headers"):
+            if self.sheet.row_values(1) != HEADERS:
+                self.sheet.insert_row(HEADERS, 1)
     
     def add_appointment(self, patient_name, recommended_doctor, appointment_date, appointment_time):
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        row_data = [timestamp, patient_name, recommended_doctor, appointment_date, appointment_time]
-        self.sheet.append_row(row_data)
+        row_data = appointment_row(patient_name, recommended_doctor, appointment_date, appointment_time)
+        with sheets_call("append_row"):
+            self.sheet.append_row(row_data)
+        return True
+
+    def add_appointments(self, rows):
+        """Append several prepared rows with a single API call"""
+        with sheets_call("append_rows"):
+            self.sheet.append_rows(rows)
         return True
     
-        # In your GoogleSheetsHandler class, add this method:
     def get_existing_appointments(self):
         """Get all existing appointments from the sheet"""
         try:
-            result = self.sheet.get_all_values()
+            with sheets_call("get_all_values"):
+                result = self.sheet.get_all_values()
             return result[1:] if len(result) > 1 else []  # Skip header row
         except Exception as e:
             print(f"Error reading existing appointments: {e}")
             return []
 
-def save_to_google_sheets(patient_info):
+    def get_appointments_since(self, start_row):
+        """Get the rows from start_row (1-based) to the end of the sheet"""
+        with sheets_call("get_range"):
+            rows = self.sheet.get(f"A{start_row}:E")
+        return [list(row) for row in rows]
+
+class LazySheetsHandler:
+    """Stands in for GoogleSheetsHandler and connects on first use.
+
+    Booting never waits on the Sheets API: the first call that needs the sheet (usually
+    the background mirror sync) connects, and a failed connection is retried on the next
+    call instead of disabling Sheets for the life of the process.
+    """
+
+    def __init__(self, factory=GoogleSheetsHandler):
+        self.factory = factory
+        self._handler = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._handler is not None
+
+    def connect(self):
+        with self._lock:
+            if self._handler is None:
+                self._handler = self.factory()
+            return self._handler
+
+    def __getattr__(self, name):
+        return getattr(self.connect(), name)
+
+def save_to_google_sheets(sheets_handler, mirror, patient_info):
     """Save appointment details to Google Sheets with duplicate prevention"""
-    if not sheets_available:
-        return False
-    
+    appointment = (
+        patient_info["name"],
+        patient_info.get("recommended_doctor", "Not specified"),
+        patient_info.get("appointment_date", "Not specified"),
+        patient_info.get("appointment_time", "Not specified")
+    )
+
     try:
-        # Check if this exact appointment already exists (excluding timestamp)
-        existing_data = sheets_handler.get_existing_appointments()
-        current_appointment = (
-            patient_info["name"],
-            patient_info.get("recommended_doctor", "Not specified"),
-            patient_info.get("appointment_date", "Not specified"),
-            patient_info.get("appointment_time", "Not specified")
-        )
-        
-        # Convert to string for comparison (skip timestamp which is first element)
-        current_appointment_str = " | ".join(str(item) for item in current_appointment)
-        
-        # Check if this appointment already exists (skip timestamp in comparison)
-        for row in existing_data:
-            # Skip the timestamp (first element) when comparing
-            if len(row) >= 5:  # Make sure row has enough elements
-                row_str = " | ".join(str(item) for item in row[1:5])  # Skip timestamp, take next 4 elements
-                if row_str == current_appointment_str:
-                    print("Duplicate appointment detected, not saving")
-                    return True  # Return True as we don't want to show an error
-        
-        # If not a duplicate, save it
-        success = sheets_handler.add_appointment(
-            patient_info["name"],
-            patient_info.get("recommended_doctor", "Not specified"),
-            patient_info.get("appointment_date", "Not specified"),
-            patient_info.get("appointment_time", "Not specified")
-        )
+        # Constant-time check against the local mirror instead of downloading the sheet
+        if mirror.contains(*appointment):
+            print("Duplicate appointment detected, not saving")
+            return True  # Return True as we don't want to show an error
+
+        success = sheets_handler.add_appointment(*appointment)
+        if success:
+            mirror.record(*appointment)
         return success
     except Exception as e:
         print(f"Error saving to Google Sheets: {e}")
-        return False
\ No newline at end of file
+        return False
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import IDEMPOTENCY_CACHE_SIZE, IDEMPOTENCY_TTL_SECONDS, SESSION_BACKEND, SESSION_DB, SESSION_REDIS_URL
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was already used for a request with a different body"""
+
+
+def request_fingerprint(payload):
+    """Stable hash of a request body, to spot a key being reused for a different request"""
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IdempotencyCache:
+    """Results of requests that carried an idempotency key, with LRU and TTL eviction.
+
+    A retry with the same key (and body) gets the stored (status_code, body) back
+    instead of being processed again.
+    """
+
+    def __init__(self, max_entries=IDEMPOTENCY_CACHE_SIZE, ttl_seconds=IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # (scope, key) -> (fingerprint, status_code, body, stored_at), oldest first
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scope, key, fingerprint):
+        """Return the stored (status_code, body) for a key, or None if it hasn't been seen"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._entries.get((scope, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != fingerprint:
+                raise IdempotencyKeyReused(f"Idempotency key {key!r} was already used for a different request")
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, scope, key, fingerprint, status_code, body):
+        with self._lock:
+            self._entries[(scope, key)] = (fingerprint, status_code, body, time.monotonic())
+            self._entries.move_to_end((scope, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _expire(self, now):
+        # Entries are stored in time order, so expired ones are at the front
+        while self._entries:
+            stored_at = next(iter(self._entries.values()))[3]
+            if now - stored_at < self.ttl_seconds:
+                break
+            self._entries.popitem(last=False)
+
+
+class SQLiteIdempotencyCache:
+    """IdempotencyCache kept in SQLite, so a retry that lands on another worker is still replayed.
+
+    When two workers finish the same key at once, the first stored result wins.
+    """
+
+    # Expired and surplus entries are swept after this many puts
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path=SESSION_DB, max_entries=IDEMPOTENCY_CACHE_SIZE, ttl_seconds=IDEMPOTENCY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS idempotency ("
+            "scope TEXT NOT NULL, key TEXT NOT NULL, fingerprint TEXT NOT NULL, status_code INTEGER NOT NULL,"
+            " body TEXT NOT NULL, stored_at REAL NOT NULL, PRIMARY KEY (scope, key))"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._puts = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, scope, key, fingerprint):
+        """Return the stored (status_code, body) for a key, or None if it hasn't been seen"""
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, status_code, body FROM idempotency WHERE scope = ? AND key = ? AND stored_at > ?",
+                (scope, key, time.time() - self.ttl_seconds),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[0] != fingerprint:
+                raise IdempotencyKeyReused(f"Idempotency key {key!r} was already used for a different request")
+            self.hits += 1
+        return row[1], json.loads(row[2])
+
+    def put(self, scope, key, fingerprint, status_code, body):
+        with self._db_lock:
+            # An expired entry for the key is replaced; a live one is kept
+            self._conn.execute("DELETE FROM idempotency WHERE scope = ? AND key = ? AND stored_at <= ?",
+                               (scope, key, time.time() - self.ttl_seconds))
+            self._conn.execute(
+                "INSERT OR IGNORE INTO idempotency (scope, key, fingerprint, status_code, body, stored_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (scope, key, fingerprint, status_code, json.dumps(body), time.time()),
+            )
+            self._puts += 1
+            if self._puts % self.PURGE_EVERY == 0:
+                self._purge()
+            self._conn.commit()
+
+    def stats(self):
+        return {"entries": len(self), "hits": self.hits, "misses": self.misses}
+
+    def __len__(self):
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM idempotency WHERE stored_at > ?", (time.time() - self.ttl_seconds,)
+            ).fetchone()[0]
+
+    def _purge(self):
+        self._conn.execute("DELETE FROM idempotency WHERE stored_at <= ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM idempotency WHERE rowid NOT IN "
+            "(SELECT rowid FROM idempotency ORDER BY stored_at DESC LIMIT ?)", (self.max_entries,)
+        )
+
+
+class RedisIdempotencyCache:
+    """IdempotencyCache kept in Redis with a TTL per key; takes a redis-py style client.
+
+    As with SQLite, the first stored result for a key wins.
+    """
+
+    def __init__(self, client, ttl_seconds=IDEMPOTENCY_TTL_SECONDS, prefix="chatbot:idempotency:"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_url(cls, url=SESSION_REDIS_URL):
+        # Only needed for this backend, so it isn't in requirements.txt
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def get(self, scope, key, fingerprint):
+        """Return the stored (status_code, body) for a key, or None if it hasn't been seen"""
+        data = self.client.get(self._key(scope, key))
+        if data is None:
+            self.misses += 1
+            return None
+        stored_fingerprint, status_code, body = json.loads(data)
+        if stored_fingerprint != fingerprint:
+            raise IdempotencyKeyReused(f"Idempotency key {key!r} was already used for a different request")
+        self.hits += 1
+        return status_code, body
+
+    def put(self, scope, key, fingerprint, status_code, body):
+        self.client.set(self._key(scope, key), json.dumps([fingerprint, status_code, body]),
+                        nx=True, ex=self.ttl_seconds)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+    def _key(self, scope, key):
+        return f"{self.prefix}{scope}:{key}"
+
+
+def create_idempotency_cache(backend=SESSION_BACKEND):
+    """The idempotency cache main.py runs with, shared through the session backend unless that is memory"""
+    if backend == "sqlite":
+        return SQLiteIdempotencyCache()
+    if backend == "redis":
+        return RedisIdempotencyCache.from_url()
+    return IdempotencyCache()
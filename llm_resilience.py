@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from config import (
+    BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE, BREAKER_P95_SECONDS, BREAKER_OPEN_SECONDS,
+)
+from metrics import LLM_HEDGES
+
+
+class LLMUnavailableError(Exception):
+    """The LLM gave no usable answer in time; the turn should be answered without it"""
+
+
+class CircuitBreaker:
+    """Tracks recent LLM calls and stops sending turns to the LLM while it is unhealthy.
+
+    The breaker trips (opens) once the last `window` calls hold at least min_calls and
+    either their error rate reaches error_rate or their p95 latency reaches p95_seconds.
+    While open, allow() is False and turns are answered by the rule-based replies. After
+    open_seconds a single probe call is let through (half open): success closes the
+    breaker with a fresh window, failure opens it again.
+    """
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, error_rate=BREAKER_ERROR_RATE,
+                 p95_seconds=BREAKER_P95_SECONDS, open_seconds=BREAKER_OPEN_SECONDS):
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.p95_seconds = p95_seconds
+        self.open_seconds = open_seconds
+        # (seconds, ok) of the most recent calls
+        self._calls = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self.trips = 0
+        self.rejected = 0
+
+    def allow(self):
+        """True if this turn may call the LLM"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            now = time.monotonic()
+            if self.state == "open" and now - self._opened_at >= self.open_seconds:
+                self.state = "half_open"
+            # A probe that never reported back (turned away by the scheduler, say) is replaced
+            if self.state == "half_open" and (not self._probing or now - self._probe_started >= self.open_seconds):
+                self._probing = True
+                self._probe_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, seconds, ok):
+        with self._lock:
+            if self.state == "half_open":
+                self._probing = False
+                if ok:
+                    self.state = "closed"
+                    self._calls.clear()
+                else:
+                    self._open()
+                    return
+            self._calls.append((seconds, ok))
+            if self.state == "closed" and self._unhealthy():
+                self._open()
+
+    def p95(self):
+        """p95 latency of recent successful calls, or None before there are enough of them"""
+        with self._lock:
+            return self._p95()
+
+    def stats(self):
+        with self._lock:
+            calls = len(self._calls)
+            errors = sum(1 for _, ok in self._calls if not ok)
+            p95 = self._p95()
+            return {
+                "state": self.state,
+                "recent_calls": calls,
+                "recent_error_rate": round(errors / calls, 3) if calls else 0.0,
+                "recent_p95_seconds": round(p95, 3) if p95 is not None else None,
+                "trips": self.trips,
+                "rejected": self.rejected,
+            }
+
+    def _unhealthy(self):
+        if len(self._calls) < self.min_calls:
+            return False
+        errors = sum(1 for _, ok in self._calls if not ok)
+        if errors / len(self._calls) >= self.error_rate:
+            return True
+        p95 = self._p95()
+        return p95 is not None and p95 >= self.p95_seconds
+
+    def _p95(self):
+        durations = sorted(seconds for seconds, ok in self._calls if ok)
+        if len(durations) < self.min_calls:
+            return None
+        return durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+
+    def _open(self):
+        self.state = "open"
+        self._opened_at = time.monotonic()
+        self.trips += 1
+
+
+async def hedged_invoke(primary, hedge, messages, hedge_after):
+    """primary.ainvoke(messages), racing hedge.ainvoke(messages) if primary is slower than hedge_after.
+
+    The first successful reply wins and the other call is cancelled. A primary that fails
+    before hedge_after starts the hedge straight away. Without a hedge model this is a
+    plain ainvoke.
+    """
+    first = asyncio.create_task(primary.ainvoke(messages))
+    tasks = {first}
+    try:
+        if hedge is None:
+            return await first
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if done and first.exception() is None:
+            return first.result()
+        second = asyncio.create_task(hedge.ainvoke(messages))
+        tasks.add(second)
+        pending = {second} if done else {first, second}
+        error = first.exception() if done else None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    LLM_HEDGES.inc(winner="hedge" if task is second else "primary")
+                    return task.result()
+                error = task.exception()
+        LLM_HEDGES.inc(winner="none")
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def hedged_stream(primary, hedge, messages, hedge_after, deadline):
+    """Stream from primary, or from hedge if it produces its first chunk sooner.
+
+    The hedge stream is opened when primary has produced nothing after hedge_after (or
+    has failed). Whichever stream yields a first chunk first is followed to the end and
+    the other is closed. LLMUnavailableError is raised if neither has produced a chunk
+    by deadline; if every stream failed, the last error is raised.
+    """
+    start = time.monotonic()
+    streams = {}
+    winner = first_chunk = None
+    error = None
+
+    def open_stream(llm):
+        stream = llm.astream(messages)
+        streams[asyncio.ensure_future(stream.__anext__())] = stream
+        return stream
+
+    primary_stream = open_stream(primary)
+    hedged = False
+    hedge_started = hedge is None
+    try:
+        while winner is None:
+            elapsed = time.monotonic() - start
+            if not streams and hedge_started:
+                if hedged:
+                    LLM_HEDGES.inc(winner="none")
+                # Re-raised as is, so a provider 429 can still be told apart
+                raise error
+            if (not streams or elapsed >= hedge_after) and not hedge_started:
+                open_stream(hedge)
+                hedge_started = hedged = True
+            wait_until = deadline if hedge_started else min(deadline, hedge_after)
+            if elapsed >= deadline:
+                if hedged:
+                    LLM_HEDGES.inc(winner="none")
+                raise LLMUnavailableError(f"No reply from the LLM within {deadline:g}s")
+            done, _ = await asyncio.wait(list(streams), timeout=wait_until - elapsed,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stream = streams.pop(task)
+                try:
+                    first_chunk = task.result()
+                except StopAsyncIteration:
+                    first_chunk = None
+                except Exception as e:
+                    error = e
+                    continue
+                winner = stream
+                if hedged:
+                    LLM_HEDGES.inc(winner="primary" if stream is primary_stream else "hedge")
+                break
+    finally:
+        # Close the losers (and, on error, everything) before following the winner
+        for task in streams:
+            task.cancel()
+        await asyncio.gather(*streams, return_exceptions=True)
+        for stream in streams.values():
+            await stream.aclose()
+
+    if first_chunk is None:
+        return
+    yield first_chunk
+    try:
+        async for chunk in winner:
+            yield chunk
+    finally:
+        await winner.aclose()
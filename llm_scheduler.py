@@ -0,0 +1,220 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from config import (
+    MAX_CONCURRENT_LLM_CALLS, MAX_LLM_QUEUE, LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE,
+)
+
+# Priority lanes, most important first: a patient confirming a slot, a booking under way, a new chat
+LANE_CONFIRM = 0
+LANE_BOOKING = 1
+LANE_NEW = 2
+LANE_NAMES = ["confirm", "booking", "new"]
+
+
+class LLMQueueFullError(Exception):
+    """Raised when an LLM call cannot get a slot; callers should retry later"""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def rate_limit_delay(error):
+    """Seconds to back off if error is the provider's 429 (honouring Retry-After), else None"""
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return max(1.0, float(retry_after))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 units a second, holding at most a minute's worth"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def delay(self, amount, now):
+        """Seconds until amount can be taken; requests larger than the bucket wait for a full one"""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount, now):
+        self._refill(now)
+        self.level -= amount
+
+    def adjust(self, amount):
+        """Charge (or refund, if negative) the difference once the real usage is known"""
+        self.level = min(self.capacity, self.level - amount)
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+class LLMScheduler:
+    """Admission control in front of the LLM client.
+
+    Calls start in lane order (confirm, then booking, then new chats), first come first
+    served within a lane, and only while fewer than max_concurrent are in flight and the
+    requests-per-minute and tokens-per-minute buckets can cover them (0 turns a bucket
+    off). Up to max_waiting callers queue; when the queue is full a caller from a more
+    important lane takes the place of the newest caller in the least important one, so
+    greetings are shed before bookings. Turned-away callers get LLMQueueFullError with
+    a retry_after, as do callers whose turn couldn't start within wait_timeout.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_LLM_CALLS, max_waiting=MAX_LLM_QUEUE,
+                 wait_timeout=LLM_QUEUE_TIMEOUT_SECONDS, requests_per_minute=LLM_REQUESTS_PER_MINUTE,
+                 tokens_per_minute=LLM_TOKENS_PER_MINUTE):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.wait_timeout = wait_timeout
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # Heap of [lane, sequence, future, tokens]; a waiter that gave up has a done future
+        self._queue = []
+        self._sequence = itertools.count()
+        self._timer = None
+        # Set after the provider itself answered 429; nothing starts before then
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self.rejected = 0
+        self.shed = 0
+        self.throttled = 0
+        self.started = [0] * len(LANE_NAMES)
+
+    @property
+    def waiting(self):
+        return sum(1 for waiter in self._queue if not waiter[2].done())
+
+    @asynccontextmanager
+    async def slot(self, lane=LANE_NEW, tokens=0):
+        """Hold one LLM slot for the duration of the block; tokens is the call's estimated size"""
+        await self._acquire(lane, tokens)
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._dispatch()
+
+    def settle(self, estimated, used):
+        """Correct the token bucket once a call reports how many tokens it really used"""
+        if self.tokens and used:
+            self.tokens.adjust(used - estimated)
+
+    def pause(self, seconds):
+        """Hold every call for seconds, after the provider said it is rate limiting us"""
+        self.throttled += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._schedule(seconds)
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "shed": self.shed,
+            "throttled": self.throttled,
+            "max_concurrent": self.max_concurrent,
+            "max_waiting": self.max_waiting,
+            "started": dict(zip(LANE_NAMES, self.started)),
+            "requests_available": round(self.requests.level, 1) if self.requests else None,
+            "tokens_available": round(self.tokens.level) if self.tokens else None,
+        }
+
+    async def _acquire(self, lane, tokens):
+        now = time.monotonic()
+        delay = self._rate_delay(tokens, now)
+        # Nobody ahead and nothing to wait for: start straight away
+        if not self.waiting and self.in_flight < self.max_concurrent and delay == 0:
+            self._start(lane, tokens, now)
+            return
+        if delay > self.wait_timeout:
+            self.rejected += 1
+            raise LLMQueueFullError("The assistant is at its rate limit", retry_after=math.ceil(delay))
+        if self.waiting >= self.max_waiting and not self._shed_for(lane):
+            self.rejected += 1
+            raise LLMQueueFullError("Too many requests are waiting for the assistant",
+                                    retry_after=max(1, math.ceil(delay)))
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [lane, next(self._sequence), future, tokens])
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, timeout=self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise LLMQueueFullError("Timed out waiting for the assistant")
+        except asyncio.CancelledError:
+            # The slot may have been granted just as the caller went away
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.in_flight -= 1
+                self._dispatch()
+            raise
+
+    def _shed_for(self, lane):
+        """Make room by turning away the newest waiter in a less important lane; False if there is none"""
+        live = [waiter for waiter in self._queue if not waiter[2].done()]
+        if not live:
+            return False
+        victim = max(live, key=lambda waiter: (waiter[0], waiter[1]))
+        if victim[0] <= lane:
+            return False
+        self.shed += 1
+        victim[2].set_exception(LLMQueueFullError("The assistant is busy with other patients",
+                                                  retry_after=max(1, math.ceil(self._rate_delay(victim[3], time.monotonic())))))
+        return True
+
+    def _dispatch(self):
+        """Start queued calls in lane order while there is room; otherwise wake up when there will be"""
+        while self._queue and self.in_flight < self.max_concurrent:
+            lane, _, future, tokens = self._queue[0]
+            if future.done():
+                heapq.heappop(self._queue)
+                continue
+            now = time.monotonic()
+            delay = self._rate_delay(tokens, now)
+            if delay > 0:
+                self._schedule(delay)
+                return
+            heapq.heappop(self._queue)
+            self._start(lane, tokens, now)
+            future.set_result(None)
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        try:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+        except RuntimeError:
+            # pause() from outside the event loop; the next slot request dispatches
+            self._timer = None
+
+    def _rate_delay(self, tokens, now):
+        delay = max(0.0, self._paused_until - now)
+        if self.requests:
+            delay = max(delay, self.requests.delay(1, now))
+        if self.tokens and tokens:
+            delay = max(delay, self.tokens.delay(tokens, now))
+        return delay
+
+    def _start(self, lane, tokens, now):
+        self.in_flight += 1
+        self.started[lane] += 1
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(tokens, now)
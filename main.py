@@ -1,10 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
+from typing import List, Optional
 from chatbot_engine import ChatbotEngine
-from google_sheets_handler import GoogleSheetsHandler
+from google_sheets_handler import LazySheetsHandler, sheets_configured
+from session_store import create_session_store
+from appointment_queue import AppointmentQueue
+from appointment_mirror import AppointmentMirror
+from availability import AvailabilityEngine, parse_slot
+from slot_claims import create_slot_claims
+from faq_router import FAQRouter
+from specialty_router import SpecialtyRouter
+from booking_state import turn_stats
+from llm_scheduler import LLMScheduler, LLMQueueFullError
+from llm_resilience import CircuitBreaker
+from batch_chat import run_batch
+from config import BATCH_PARALLELISM, BATCH_MAX_PARALLELISM, BATCH_MAX_ITEMS
+from idempotency import IdempotencyKeyReused, create_idempotency_cache, request_fingerprint
+from metrics import REGISTRY, CONTENT_TYPE, REQUEST_SECONDS, Gauge, stage
+import asyncio
 import json
 import logging
+import time
 
 
 app = FastAPI(title="Clinical Chatbot API")
@@ -21,22 +39,186 @@ app.add_middleware(
 )
 
 # Initialize components
-chatbot = ChatbotEngine()
-try:
-    sheets_handler = GoogleSheetsHandler()
-    sheets_available = True
+llm_limiter = LLMScheduler()
+# Sends turns to the booking templates while Groq is failing or too slow
+llm_breaker = CircuitBreaker()
+faq_router = FAQRouter()
+availability = AvailabilityEngine(claims=create_slot_claims())
+# Recommends the least booked doctor of the department a complaint points to
+specialty_router = SpecialtyRouter(availability=availability)
+chatbot = ChatbotEngine(limiter=llm_limiter, faq_router=faq_router, availability=availability,
+                        specialty_router=specialty_router, breaker=llm_breaker)
+# Each patient gets an isolated history; all sessions share the LLM client, limiter, FAQ cache and calendar.
+# SESSION_BACKEND=sqlite (or redis) keeps histories outside the process so uvicorn --workers N can share them
+def new_engine():
+    """An engine for one conversation, on the shared clients, limiter, FAQ cache and calendar"""
+    return ChatbotEngine(
+        llm_provider=lambda: chatbot.llm, limiter=llm_limiter, faq_router=faq_router, availability=availability,
+        specialty_router=specialty_router, breaker=llm_breaker, hedge_llm_provider=lambda: chatbot.hedge_llm,
+    )
+
+sessions = create_session_store(new_engine)
+# Stored results of booking requests sent with an idempotency key, so client retries are safe
+idempotency_cache = create_idempotency_cache()
+# Only the credentials file is checked here; the sheet is opened in the background after boot
+sheets_available = sheets_configured()
+sheets_handler = LazySheetsHandler() if sheets_available else None
+if sheets_available:
     logger.info("Google Sheets integration enabled")
-except Exception as e:
-    sheets_handler = None
-    sheets_available = False
-    logger.warning(f"Google Sheets not available: {str(e)}")
+else:
+    logger.warning("Google Sheets not available: no credentials file configured")
+
+# Bookings are written to a local log and flushed to Sheets in batches in the background
+appointment_queue = AppointmentQueue(sheets_handler) if sheets_available else None
+# Local, incrementally synced copy of the sheet used for duplicate checks
+appointment_mirror = AppointmentMirror(sheets_handler, on_new_rows=availability.load) if sheets_available else None
+
+REGISTRY.register(Gauge("chatbot_sessions", "Active chat sessions", lambda: len(sessions)))
+REGISTRY.register(Gauge("chatbot_llm_in_flight", "LLM calls in progress", lambda: llm_limiter.stats()["in_flight"]))
+REGISTRY.register(Gauge("chatbot_llm_waiting", "Chat turns waiting for an LLM slot", lambda: llm_limiter.stats()["waiting"]))
+REGISTRY.register(Gauge("chatbot_llm_breaker_open", "1 while chat turns are answered without the LLM",
+                        lambda: int(llm_breaker.state == "open")))
+REGISTRY.register(Gauge("chatbot_appointment_queue_pending", "Appointments not yet flushed to Google Sheets",
+                        lambda: appointment_queue.pending_count() if appointment_queue else None))
+
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        REQUEST_SECONDS.observe(time.perf_counter() - start, route=route.path if route else "unmatched",
+                                method=request.method, status=status)
+
+# What the background warm-up has finished; /ready reports it
+warm_up_status = {"llm": False, "sheets": None if not sheets_available else False}
+
+def warm_up():
+    """Do the slow first-use work (LLM client, Sheets connection) before patients hit it"""
+    try:
+        chatbot.llm
+        warm_up_status["llm"] = True
+    except Exception as e:
+        logger.error(f"LLM client warm-up failed: {str(e)}")
+    if sheets_available:
+        try:
+            sheets_handler.connect()
+            warm_up_status["sheets"] = True
+        except Exception as e:
+            # The mirror and queue threads keep retrying the connection on their own schedule
+            logger.warning(f"Google Sheets not reachable yet: {str(e)}")
+
+@app.on_event("startup")
+async def start_appointment_queue():
+    if appointment_queue:
+        appointment_queue.start()
+        appointment_mirror.start()
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+
+@app.on_event("shutdown")
+async def drain_appointment_queue():
+    if appointment_queue:
+        appointment_mirror.stop()
+        appointment_queue.stop(drain=True)
+
+def book_appointment(patient_name, recommended_doctor, appointment_date, appointment_time):
+    """Queue an appointment; return ("booked" | "duplicate" | "conflict", alternative slots)"""
+    appointment = (patient_name, recommended_doctor, appointment_date, appointment_time)
+    if appointment_mirror.contains(*appointment):
+        return "duplicate", []
+
+    # Reserve the doctor's slot before accepting, so two patients can't take the same one
+    when = parse_slot(appointment_date, appointment_time)
+    if when and not availability.book(recommended_doctor, when):
+        alternatives = availability.next_free_slots(recommended_doctor, when)
+        return "conflict", [slot.strftime("%Y-%m-%d %H:%M") for slot in alternatives]
+
+    try:
+        appointment_queue.enqueue(*appointment)
+    except Exception:
+        if when:
+            availability.release(recommended_doctor, when)
+        raise
+    appointment_mirror.record(*appointment)
+    return "booked", []
+
+def save_confirmed_appointment(patient_name, recommended_doctor, appointment_date, appointment_time):
+    """Save an appointment during the chat turn that confirmed it; return (status, alternatives)"""
+    with stage("booking_save"):
+        if not sheets_available:
+            result = "not_saved", []
+        else:
+            try:
+                result = book_appointment(patient_name, recommended_doctor, appointment_date, appointment_time)
+            except Exception as e:
+                logger.error(f"Error saving confirmed appointment: {str(e)}")
+                result = "failed", []
+    logger.info(f"Confirmed appointment saved with status {result[0]}")
+    return result
+
+def open_session(session_id):
+    """sessions.get_or_create, with confirmed appointments saved in the turn"""
+    with stage("session"):
+        session_id, engine = sessions.get_or_create(session_id)
+    # Set per turn: an engine restored from a shared backend comes without it
+    engine.save_appointment = save_confirmed_appointment
+    return session_id, engine
+
+def booking_result(engine):
+    """Structured booking fields for a chat reply; the engine saved a confirmed appointment during the turn"""
+    booking = engine.booking
+    return {
+        "booking_state": booking.state,
+        "appointment": booking.details(),
+        "booking_complete": booking.appointment() is not None,
+        "booking_status": booking.save_status,
+    }
 
 class ChatRequest(BaseModel):
     message: str
+    session_id: Optional[str] = None
+
+class AppointmentDetails(BaseModel):
+    patient_name: Optional[str] = None
+    recommended_doctor: Optional[str] = None
+    appointment_date: Optional[str] = None
+    appointment_time: Optional[str] = None
 
 class ChatResponse(BaseModel):
     response: str
-    session_id: str = None
+    session_id: Optional[str] = None
+    booking_state: Optional[str] = None
+    # Slots collected so far; date and time are YYYY-MM-DD / HH:MM once validated
+    appointment: Optional[AppointmentDetails] = None
+    booking_complete: bool = False
+    # Outcome of saving the confirmed appointment: booked, duplicate, not_saved or failed; conflict when
+    # the slot was taken meanwhile and the patient has been asked for another time
+    booking_status: Optional[str] = None
+
+class BatchChatItem(BaseModel):
+    message: str
+    # Any label to group this batch's turns into one conversation; batch conversations are
+    # kept out of the chat sessions and dropped when the batch ends
+    session_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
+    parallelism: Optional[int] = None
+    # Evaluation runs leave confirmed bookings unsaved unless asked
+    save_bookings: bool = False
+
+class BatchChatResult(ChatResponse):
+    response: Optional[str] = None
+    error: Optional[str] = None
+    latency_ms: float
+
+class BatchChatResponse(BaseModel):
+    results: List[BatchChatResult]
+    elapsed_ms: float
 
 class AppointmentRequest(BaseModel):
     patient_name: str
@@ -44,73 +226,193 @@ class AppointmentRequest(BaseModel):
     recommended_doctor: str
     appointment_date: str
     appointment_time: str
+    # Same as the Idempotency-Key header, for clients that can't set headers
+    idempotency_key: Optional[str] = None
 
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
+    session_id = request.session_id
     try:
-        logger.info(f"Received message: {request.message}")
-        response = chatbot.get_response(request.message)
-        logger.info(f"Generated response: {response}")
-        return ChatResponse(response=response)
+        session_id, engine = open_session(request.session_id)
+        # Message text stays out of the logs; it is patient data and large at volume
+        logger.debug(f"Received message for session {session_id} ({len(request.message)} chars)")
+        response = await engine.aget_response(request.message)
+        return ChatResponse(response=response, session_id=session_id, **booking_result(engine))
+    except LLMQueueFullError as e:
+        logger.warning(f"Rejecting chat for session {session_id}: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}")
         # Return a friendly error message instead of raising exception
-        return ChatResponse(response="I apologize, I'm having some technical difficulties right now. Could you please try again or tell me how I can help you?")
+        return ChatResponse(response="I apologize, I'm having some technical difficulties right now. Could you please try again or tell me how I can help you?", session_id=session_id)
+    finally:
+        sessions.touch(session_id)
 
-@app.post("/schedule_appointment")
-async def schedule_appointment(request: AppointmentRequest):
+def sse_event(data, event=None):
+    """Format one Server-Sent Events frame"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    async def event_stream():
+        session_id = request.session_id
+        parts = []
+        try:
+            session_id, engine = open_session(request.session_id)
+            logger.debug(f"Received streaming message for session {session_id} ({len(request.message)} chars)")
+            yield sse_event({"session_id": session_id}, event="session")
+            async for token in engine.astream_response(request.message):
+                parts.append(token)
+                yield sse_event({"token": token})
+            yield sse_event({"response": "".join(parts), "session_id": session_id, **booking_result(engine)},
+                            event="done")
+        except LLMQueueFullError as e:
+            logger.warning(f"Rejecting chat stream for session {session_id}: {str(e)}")
+            yield sse_event({"detail": str(e), "retry_after": e.retry_after}, event="error")
+        except Exception as e:
+            logger.error(f"Error streaming response: {str(e)}")
+            yield sse_event({"detail": "I apologize, I'm having some technical difficulties right now. Could you please try again or tell me how I can help you?"}, event="error")
+        finally:
+            sessions.touch(session_id)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch_endpoint(request: BatchChatRequest):
+    """Run many independent conversations concurrently; results come back in request order"""
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch can hold at most {BATCH_MAX_ITEMS} items")
+    parallelism = min(request.parallelism or BATCH_PARALLELISM, BATCH_MAX_PARALLELISM)
+
+    def session_for(session_key):
+        # Like batch_chat.chat_batch: an evaluation run mustn't evict patients' sessions
+        engine = new_engine()
+        engine.save_appointment = save_confirmed_appointment if request.save_bookings else None
+        return session_key, engine
+
+    start = time.perf_counter()
+    items = [(item.session_id, item.message) for item in request.items]
+    results = await run_batch(items, session_for, parallelism, lambda session_id, engine: booking_result(engine))
+    logger.info(f"Batch of {len(items)} turns done with parallelism {parallelism}")
+    return BatchChatResponse(results=results, elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+
+@app.delete("/chat/{session_id}")
+async def end_session(session_id: str):
+    if not sessions.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"message": "Session ended"}
+
+def book_requested_appointment(request):
+    """Normalise and book an AppointmentRequest; return (status, alternatives)"""
+    normalized_date = chatbot.normalize_date(request.appointment_date)
+    normalized_time = chatbot.normalize_time(request.appointment_time)
+
+    # Commit locally; the background flusher appends it to Google Sheets
+    return book_appointment(request.patient_name, request.recommended_doctor,
+                            normalized_date or request.appointment_date,
+                            normalized_time or request.appointment_time)
+
+def run_idempotent(scope, request, header_key, handler):
+    """Run handler() at most once per idempotency key.
+
+    handler returns (status_code, body, final). Final outcomes are stored, and a retry
+    with the same key gets the stored response back (marked Idempotent-Replayed)
+    without touching the booking path. Transient errors are not stored.
+    """
+    key = header_key or request.idempotency_key
+    if not key:
+        status_code, body, _ = handler()
+        return JSONResponse(body, status_code=status_code)
+
+    fingerprint = request_fingerprint(request.model_dump(exclude={"idempotency_key"}))
     try:
-        # Normalize date and time
-        normalized_date = chatbot.normalize_date(request.appointment_date)
-        normalized_time = chatbot.normalize_time(request.appointment_time)
-        
-        # Add to Google Sheets
-        success = sheets_handler.add_appointment(
-            request.patient_name,
-            request.problem,
-            request.recommended_doctor,
-            normalized_date or request.appointment_date,
-            normalized_time or request.appointment_time
-        )
-        
-        if success:
-            return {"message": "Appointment scheduled successfully"}
-        else:
-            raise HTTPException(status_code=500, detail="Failed to schedule appointment")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error scheduling appointment: {str(e)}")
-        
-        if not sheets_available or sheets_handler is None:
-            raise HTTPException(status_code=503, detail="Google Sheets integration not available")
+        cached = idempotency_cache.get(scope, key, fingerprint)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if cached:
+        status_code, body = cached
+        return JSONResponse(body, status_code=status_code, headers={"Idempotent-Replayed": "true"})
+
+    status_code, body, final = handler()
+    if final:
+        idempotency_cache.put(scope, key, fingerprint, status_code, body)
+    return JSONResponse(body, status_code=status_code)
+
+@app.post("/schedule_appointment")
+async def schedule_appointment(request: AppointmentRequest, idempotency_key: Optional[str] = Header(None)):
+    if not sheets_available or appointment_queue is None:
+        raise HTTPException(status_code=503, detail="Google Sheets integration not available")
+
+    def schedule():
+        try:
+            status, alternatives = book_requested_appointment(request)
+        except Exception as e:
+            logger.error(f"Error scheduling appointment: {str(e)}")
+            return 500, {"detail": f"Error scheduling appointment: {str(e)}"}, False
+        if status == "duplicate":
+            return 200, {"message": "Appointment already scheduled"}, True
+        if status == "conflict":
+            return 409, {"detail": {
+                "message": f"{request.recommended_doctor} is not available at that time",
+                "alternatives": alternatives,
+            }}, True
+        return 200, {"message": "Appointment scheduled successfully"}, True
+
+    return run_idempotent("schedule_appointment", request, idempotency_key, schedule)
 
 
 @app.post("/save_appointment")
-async def save_appointment(request: AppointmentRequest):
-    try:
-        if not sheets_available:
-            return {"message": "Google Sheets integration not available"}
-        
-        # Normalize date and time
-        normalized_date = chatbot.normalize_date(request.appointment_date)
-        normalized_time = chatbot.normalize_time(request.appointment_time)
-        
-        # Add to Google Sheets
-        success = sheets_handler.add_appointment(
-            request.patient_name,
-            request.problem,
-            request.recommended_doctor,
-            normalized_date or request.appointment_date,
-            normalized_time or request.appointment_time
-        )
-        
-        if success:
-            return {"message": "Appointment saved to Google Sheets successfully"}
-        else:
-            return {"message": "Failed to save appointment"}
-            
-    except Exception as e:
-        logger.error(f"Error saving appointment: {str(e)}")
-        return {"message": f"Error saving appointment: {str(e)}"}
+async def save_appointment(request: AppointmentRequest, idempotency_key: Optional[str] = Header(None)):
+    if not sheets_available:
+        return {"message": "Google Sheets integration not available"}
+
+    def save():
+        try:
+            status, alternatives = book_requested_appointment(request)
+        except Exception as e:
+            logger.error(f"Error saving appointment: {str(e)}")
+            return 200, {"message": f"Error saving appointment: {str(e)}"}, False
+        if status == "duplicate":
+            return 200, {"message": "Appointment already saved"}, True
+        if status == "conflict":
+            return 200, {
+                "message": f"{request.recommended_doctor} is not available at that time",
+                "alternatives": alternatives,
+            }, True
+        return 200, {"message": "Appointment saved to Google Sheets successfully"}, True
+
+    return run_idempotent("save_appointment", request, idempotency_key, save)
+
+@app.get("/stats")
+async def stats():
+    return {
+        "sessions": sessions.stats(),
+        "llm": llm_limiter.stats(),
+        "llm_breaker": llm_breaker.stats(),
+        "faq": faq_router.stats(),
+        "specialty_router": specialty_router.stats(),
+        "turns": turn_stats.stats(),
+        "appointment_queue": appointment_queue.stats() if appointment_queue else None,
+        "mirrored_appointments": len(appointment_mirror) if appointment_mirror else None,
+        "idempotency": idempotency_cache.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once the LLM client is built and, if configured, the sheet is mirrored"""
+    if sheets_available:
+        warm_up_status["sheets"] = sheets_handler.connected and appointment_mirror.last_sync is not None
+    is_ready = warm_up_status["llm"] and warm_up_status["sheets"] is not False
+    return JSONResponse({"ready": is_ready, **warm_up_status}, status_code=200 if is_ready else 503)
 
 @app.get("/")
 async def root():
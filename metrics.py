@@ -0,0 +1,186 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Seconds; covers in-process stages (sub-millisecond) up to slow LLM and Sheets calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+
+
+def _label_text(labelnames, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_label_text(self.labelnames, key)} {_number(value)}" for key, value in sorted(values.items())]
+
+
+class Histogram:
+    """Distribution of observations in cumulative buckets, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts, sum, count]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes, including when it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback each time metrics are rendered"""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, callback):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+
+    def samples(self):
+        value = self.callback()
+        return [] if value is None else [f"{self.name} {_number(value)}"]
+
+
+class Registry:
+    """Metrics exposed together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_http_request_seconds", "Time to handle an HTTP request (to the first byte for streams)",
+    ["route", "method", "status"],
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_stage_seconds", "Time spent in each stage of a chat turn", ["stage"],
+))
+LLM_TOKENS = REGISTRY.register(Histogram(
+    "chatbot_llm_tokens", "Prompt and completion tokens per LLM call", ["kind"], buckets=TOKEN_BUCKETS,
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "chatbot_llm_calls_total", "LLM calls by outcome", ["mode", "outcome"],
+))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "chatbot_llm_hedges_total", "Hedged LLM calls by which request answered first", ["winner"],
+))
+SHEETS_SECONDS = REGISTRY.register(Histogram(
+    "chatbot_sheets_call_seconds", "Google Sheets API round trips", ["operation"],
+))
+SHEETS_ERRORS = REGISTRY.register(Counter(
+    "chatbot_sheets_errors_total", "Failed Google Sheets API calls", ["operation"],
+))
+
+
+def stage(name):
+    """Timing span for one stage of a chat turn"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+@contextmanager
+def sheets_call(operation):
+    """Timing span for a Sheets API call that also counts failures"""
+    with SHEETS_SECONDS.time(operation=operation):
+        try:
+            yield
+        except Exception:
+            SHEETS_ERRORS.inc(operation=operation)
+            raise
+
+
+@contextmanager
+def llm_call(mode):
+    """Count an LLM call (invoke or stream) as ok or error once it finishes"""
+    try:
+        yield
+    except Exception:
+        LLM_CALLS.inc(mode=mode, outcome="error")
+        raise
+    LLM_CALLS.inc(mode=mode, outcome="ok")
@@ -1,17 +1,17 @@
-from langchain.prompts import PromptTemplate
-import json
+from langchain_core.prompts import PromptTemplate
 
-# Load clinic details
-with open("clinic_details.json", "r") as f:
-    clinic_details = json.load(f)
 
-# Extract doctor specialties for the prompt
-doctor_specialties = "\n".join(
-    [f"- {specialty}: {', '.join(doctors)}" 
-     for specialty, doctors in clinic_details["doctors"].items()]
-)
+def format_doctor_specialties(clinic_details):
+    """Doctor specialties as a bulleted list for the prompt"""
+    return "\n".join(
+        [f"- {specialty}: {', '.join(doctors)}" 
+         for specialty, doctors in clinic_details["doctors"].items()]
+    )
 
-SYSTEM_PROMPT = f"""
+
+def build_system_prompt(clinic_details):
+    """The system prompt for a clinic; clinic_config builds it once per version of clinic_details.json"""
+    return f"""
 You are a friendly and helpful medical assistant for {clinic_details['clinic_name']}. 
 Your role is to greet patients, collect their name, ask which doctor or department they want to visit, 
 schedule an appointment, and be polite throughout the conversation.
@@ -25,7 +25,7 @@ Clinic Details:
 - Address: {clinic_details['contact_info']['address']}
 
 Available Doctors by Specialty:
-{doctor_specialties}
+{format_doctor_specialties(clinic_details)}
 
 Instructions:
 1. Greet the patient warmly and ask for their name first (this is required).
@@ -47,10 +47,8 @@ Instructions:
 """
 
 GREETING_PROMPT = PromptTemplate(
-    input_variables=[],
-    template="Hello! Welcome to {clinic_name}. I'm here to help you schedule an appointment. May I know your name please?".format(
-        clinic_name=clinic_details['clinic_name']
-    )
+    input_variables=["clinic_name"],
+    template="Hello! Welcome to {clinic_name}. I'm here to help you schedule an appointment. May I know your name please?"
 )
 
 PROBLEM_PROMPT = PromptTemplate(
@@ -63,7 +61,26 @@ TIME_PROMPT = PromptTemplate(
     template="Great! When would you like to come in for your appointment with {recommended_doctor}? Please provide a date and time that works for you."
 )
 
+RECOMMEND_PROMPT = PromptTemplate(
+    input_variables=["patient_name", "recommended_doctor", "specialty"],
+    template="Thank you, {patient_name}. For what you've described, I recommend {recommended_doctor} from our {specialty} department. When would you like to come in? Please provide a date and time that works for you."
+)
+
 CONFIRMATION_PROMPT = PromptTemplate(
     input_variables=["patient_name", "recommended_doctor", "appointment_date", "appointment_time"],
     template="Thank you, {patient_name}! I've scheduled your appointment with {recommended_doctor} on {appointment_date} at {appointment_time}. We'll see you then! Is there anything else I can help you with?"
-)
\ No newline at end of file
+)
+SLOT_CONFIRM_PROMPT = PromptTemplate(
+    input_variables=["patient_name", "recommended_doctor", "appointment_date", "appointment_time"],
+    template="Thank you, {patient_name}! {recommended_doctor} is available on {appointment_date} at {appointment_time}. Shall I book this appointment for you? Please reply 'confirm' to finalize it."
+)
+
+SLOT_UNAVAILABLE_PROMPT = PromptTemplate(
+    input_variables=["reason"],
+    template="I'm sorry, that time doesn't work. {reason} Could you please choose another date and time?"
+)
+
+RECAP_PROMPT = PromptTemplate(
+    input_variables=["patient_name", "recommended_doctor", "appointment_date", "appointment_time"],
+    template="Here is your appointment recap:\nPatient Name: {patient_name}\nDoctor Name: {recommended_doctor}\nDate: {appointment_date}\nTime: {appointment_time}\n\n"
+)
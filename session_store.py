@@ -0,0 +1,315 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import OrderedDict
+from config import (
+    MAX_SESSIONS, SESSION_TTL_SECONDS, MAX_SESSION_STORE_BYTES,
+    SESSION_BACKEND, SESSION_DB, SESSION_REDIS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rough per-message bookkeeping cost on top of the text itself
+MESSAGE_OVERHEAD_BYTES = 200
+
+
+class SessionStore:
+    """In-process store of per-patient chatbot sessions with LRU and TTL eviction"""
+
+    def __init__(self, factory, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS,
+                 max_bytes=MAX_SESSION_STORE_BYTES):
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # session_id -> [engine, last_access, size_bytes], oldest access first
+        self._sessions = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_create(self, session_id=None):
+        """Return (session_id, engine), creating a new session for unknown or missing ids"""
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            entry = self._sessions.get(session_id) if session_id else None
+            if entry is None:
+                session_id = uuid.uuid4().hex
+                entry = [self.factory(), now, 0]
+                self._sessions[session_id] = entry
+            else:
+                entry[1] = now
+                self._sessions.move_to_end(session_id)
+            self._enforce_limits(keep=session_id)
+            return session_id, entry[0]
+
+    def touch(self, session_id):
+        """Re-measure a session after a turn and evict others if the store is over budget"""
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return
+            size = self._estimate_size(entry[0])
+            self._total_bytes += size - entry[2]
+            entry[2] = size
+            entry[1] = time.monotonic()
+            self._sessions.move_to_end(session_id)
+            self._enforce_limits(keep=session_id)
+
+    def delete(self, session_id):
+        """Drop a session, returning True if it existed"""
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is None:
+                return False
+            self._total_bytes -= entry[2]
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "total_bytes": self._total_bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self, now):
+        # Entries are kept in access order, so expired sessions sit at the front
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[1] < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._total_bytes -= entry[2]
+            self.expirations += 1
+
+    def _enforce_limits(self, keep):
+        while self._sessions and (len(self._sessions) > self.max_sessions
+                                  or self._total_bytes > self.max_bytes):
+            session_id = next(iter(self._sessions))
+            if session_id == keep:
+                break
+            entry = self._sessions.pop(session_id)
+            self._total_bytes -= entry[2]
+            self.evictions += 1
+
+    @staticmethod
+    def _estimate_size(engine):
+        # The system prompt is shared by every session, so it is not counted
+        return sum(
+            len(msg.content.encode("utf-8")) + MESSAGE_OVERHEAD_BYTES
+            for msg in engine.conversation_history[1:]
+        )
+
+
+# Bump when the dumped layout changes; sessions in an older format are started afresh
+SESSION_FORMAT = 1
+
+
+def encode_session(engine):
+    """Compact bytes for a session: minified JSON of engine.dump_state(), zlib-compressed"""
+    state = {"v": SESSION_FORMAT, **engine.dump_state()}
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+
+def decode_session(data, engine):
+    """Restore a session into a fresh engine; return False if the data can't be used"""
+    try:
+        state = json.loads(zlib.decompress(data))
+        if state.get("v") != SESSION_FORMAT:
+            return False
+        engine.load_state(state)
+        return True
+    except (zlib.error, ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Discarding unreadable session: {str(e)}")
+        return False
+
+
+class SessionBackend:
+    """Key-value storage for encoded sessions shared by every worker.
+
+    Values are opaque bytes that expire ttl_seconds after they were last saved, which
+    maps onto SQLite, Redis (GET / SET EX / DEL) or any similar store.
+    """
+
+    def load(self, session_id):
+        """Return the stored bytes, or None if the session is unknown or expired"""
+        raise NotImplementedError
+
+    def save(self, session_id, data, ttl_seconds):
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        """Drop a session, returning True if it existed"""
+        raise NotImplementedError
+
+    def count(self):
+        """Number of live sessions, or None if the store can't tell cheaply"""
+        return None
+
+    def stats(self):
+        return {}
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in a local SQLite file in WAL mode, shared by every worker process on the host"""
+
+    # Expired rows are swept after this many saves
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path=SESSION_DB):
+        self.db_path = db_path
+        # Workers write to the same file; wait for the lock instead of failing
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, data BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._saves = 0
+
+    def load(self, session_id):
+        with self._db_lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, session_id, data, ttl_seconds):
+        with self._db_lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, data, time.time() + ttl_seconds),
+            )
+            self._saves += 1
+            if self._saves % self.PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+            self._conn.commit()
+
+    def delete(self, session_id):
+        with self._db_lock:
+            cursor = self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._conn.commit()
+        return cursor.rowcount > 0
+
+    def count(self):
+        with self._db_lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+
+    def stats(self):
+        with self._db_lock:
+            total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM sessions WHERE expires_at > ?", (time.time(),)
+            ).fetchone()[0]
+        return {"backend": "sqlite", "total_bytes": total_bytes}
+
+
+class RedisSessionBackend(SessionBackend):
+    """Sessions in Redis, shared across hosts; takes a redis-py style client"""
+
+    def __init__(self, client, prefix="chatbot:session:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=SESSION_REDIS_URL):
+        # Only needed for this backend, so it isn't in requirements.txt
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def load(self, session_id):
+        return self.client.get(self.prefix + session_id)
+
+    def save(self, session_id, data, ttl_seconds):
+        self.client.set(self.prefix + session_id, data, ex=ttl_seconds)
+
+    def delete(self, session_id):
+        return bool(self.client.delete(self.prefix + session_id))
+
+    def stats(self):
+        return {"backend": "redis"}
+
+
+class SharedSessionStore:
+    """SessionStore with the same interface, keeping sessions in a SessionBackend.
+
+    Each turn loads the session into a fresh engine and touch() writes it back, so any
+    worker can serve any turn and sessions outlive a restart. The store holds no engines
+    between turns. Two turns of the same session racing on different workers are not
+    merged; the later save wins.
+    """
+
+    def __init__(self, factory, backend, ttl_seconds=SESSION_TTL_SECONDS):
+        self.factory = factory
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        # Engines handed out by get_or_create, dropped once the request lets go of them
+        self._active = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.discarded = 0
+
+    def get_or_create(self, session_id=None):
+        """Return (session_id, engine), creating a new session for unknown or missing ids"""
+        engine = self.factory()
+        data = self.backend.load(session_id) if session_id else None
+        if data is not None and decode_session(data, engine):
+            self.loads += 1
+        else:
+            if data is not None:
+                self.discarded += 1
+                engine = self.factory()
+            session_id = uuid.uuid4().hex
+        with self._lock:
+            self._active[session_id] = engine
+        return session_id, engine
+
+    def touch(self, session_id):
+        """Save the session after a turn"""
+        with self._lock:
+            engine = self._active.get(session_id)
+        if engine is not None:
+            self.backend.save(session_id, encode_session(engine), self.ttl_seconds)
+
+    def delete(self, session_id):
+        with self._lock:
+            self._active.pop(session_id, None)
+        return self.backend.delete(session_id)
+
+    def stats(self):
+        return {
+            "sessions": self.backend.count(),
+            "loads": self.loads,
+            "discarded": self.discarded,
+            **self.backend.stats(),
+        }
+
+    def __len__(self):
+        return self.backend.count() or 0
+
+
+def create_session_store(factory, backend=SESSION_BACKEND):
+    """The session store main.py runs with: in-process, or shared through SQLite or Redis"""
+    if backend == "sqlite":
+        return SharedSessionStore(factory, SQLiteSessionBackend())
+    if backend == "redis":
+        return SharedSessionStore(factory, RedisSessionBackend.from_url())
+    if backend != "memory":
+        raise ValueError(f"Unknown SESSION_BACKEND {backend!r}; use memory, sqlite or redis")
+    return SessionStore(factory)
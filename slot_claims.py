@@ -0,0 +1,98 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from clinic_config import doctor_key
+from config import SESSION_BACKEND, SESSION_DB, SESSION_REDIS_URL
+
+
+def claim_key(doctor, when):
+    return doctor_key(doctor), when.strftime("%Y-%m-%d %H:%M")
+
+
+class SlotClaims:
+    """Doctor slots claimed by any worker, so uvicorn --workers N can't double-book.
+
+    Each worker keeps its own AvailabilityEngine calendar; a booking only counts once
+    its (doctor, slot) claim is accepted here, which happens for exactly one caller.
+    """
+
+    def claim(self, doctor, when):
+        """Take the slot; return False if another booking already holds it"""
+        raise NotImplementedError
+
+    def release(self, doctor, when):
+        raise NotImplementedError
+
+
+class SQLiteSlotClaims(SlotClaims):
+    """Claims in a SQLite table whose primary key is (doctor, slot), shared by the workers on a host"""
+
+    # Claims for slots already past are swept after this many claims
+    PURGE_EVERY = 500
+
+    def __init__(self, db_path=SESSION_DB):
+        self._conn = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS slot_claims ("
+            "doctor TEXT NOT NULL, slot TEXT NOT NULL, claimed_at REAL NOT NULL, PRIMARY KEY (doctor, slot))"
+        )
+        self._conn.commit()
+        self._db_lock = threading.Lock()
+        self._claims = 0
+
+    def claim(self, doctor, when):
+        with self._db_lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO slot_claims (doctor, slot, claimed_at) VALUES (?, ?, ?)",
+                (*claim_key(doctor, when), time.time()),
+            )
+            self._claims += 1
+            if self._claims % self.PURGE_EVERY == 0:
+                # Slot strings sort in time order
+                self._conn.execute("DELETE FROM slot_claims WHERE slot < ?",
+                                   (datetime.now().strftime("%Y-%m-%d %H:%M"),))
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def release(self, doctor, when):
+        with self._db_lock:
+            self._conn.execute("DELETE FROM slot_claims WHERE doctor = ? AND slot = ?", claim_key(doctor, when))
+            self._conn.commit()
+
+
+class RedisSlotClaims(SlotClaims):
+    """Claims as Redis keys set with NX, shared across hosts; takes a redis-py style client"""
+
+    # Kept this long after the slot has passed, then Redis drops them
+    KEEP_SECONDS = 86400
+
+    def __init__(self, client, prefix="chatbot:slot:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url=SESSION_REDIS_URL):
+        # Only needed for this backend, so it isn't in requirements.txt
+        import redis
+        return cls(redis.Redis.from_url(url))
+
+    def claim(self, doctor, when):
+        ttl = max(1, int((when - datetime.now()).total_seconds()) + self.KEEP_SECONDS)
+        return bool(self.client.set(self._key(doctor, when), 1, nx=True, ex=ttl))
+
+    def release(self, doctor, when):
+        self.client.delete(self._key(doctor, when))
+
+    def _key(self, doctor, when):
+        return self.prefix + "|".join(claim_key(doctor, when))
+
+
+def create_slot_claims(backend=SESSION_BACKEND):
+    """Shared slot claims for the session backend main.py runs with; None when sessions stay in-process"""
+    if backend == "sqlite":
+        return SQLiteSlotClaims()
+    if backend == "redis":
+        return RedisSlotClaims.from_url()
+    return None
@@ -0,0 +1,136 @@
+import re
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Optional
+
+MONTHS = (
+    r"(?:jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+# Words that follow "I'm" / "this is" but are not names ("I'm having a headache",
+# "I am free tomorrow", "I'm pregnant", "I'm Dr. Smith's patient"); day words are left
+# for the date group
+NOT_NAME = (
+    r"(?!(?:a|an|the|and|but|not|so|very|here|having|looking|calling|feeling|trying|going"
+    r"|dr|doctor|mr|mrs|ms|miss|nurse|patient|pregnant|diabetic|asthmatic|allergic|epileptic"
+    r"|anemic|anaemic|hypertensive|diagnosed|taking|overweight|tired|dizzy|ill|unwell|pain"
+    r"|interested|sick|fine|good|ok|okay|in|at|from|with|for|to|i|my|it|that|just|really"
+    r"|urgent|about|regarding|what|how|why|on|also|still|only|now|back|new"
+    r"|available|free|busy|sorry|worried|hoping|afraid|concerned|scared|unable|able|ready"
+    r"|glad|happy|experiencing|suffering|wondering|planning|booked|late|off|out|done"
+    r"|today|tomorrow|tonight|morning|afternoon|evening|next|this|coming"
+    r"|monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b)"
+)
+NAME_WORD = NOT_NAME + r"[A-Za-z][A-Za-z'-]*"
+# After "I'm" / "this is" only capitalised words are a name; "my name is" takes any case
+CAPITALISED_NAME_WORD = NOT_NAME + r"(?-i:[A-Z])[A-Za-z'-]*"
+
+# Every slot pattern in one alternation so a message is scanned once. Only the slot
+# groups capture, so match.lastgroup tells which slot matched.
+SLOT_PATTERN = re.compile(
+    r"(?:\bmy name is|\bcall me)\s+(?P<name>" + NAME_WORD + r"(?:\s+" + NAME_WORD + r"){0,2})"
+    r"|(?:\bi'm|\bi am|\bthis is)\s+"
+    r"(?P<introduced_name>" + CAPITALISED_NAME_WORD + r"(?:\s+" + CAPITALISED_NAME_WORD + r"){0,2})"
+    r"|(?:\bdr\.?|\bdoctor)\s+(?P<doctor>" + NAME_WORD + r")"
+    r"|(?P<date>\b\d{1,2}[/-]\d{1,2}[/-]\d{2,4}\b"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?\s+(?:of\s+)?" + MONTHS + r"\.?,?\s+\d{4}\b"
+    r"|\b" + MONTHS + r"\.?\s+\d{1,2}(?:st|nd|rd|th)?,?\s+\d{4}\b"
+    r"|\bday after tomorrow\b|\btoday\b|\btomorrow\b"
+    r"|\b(?:(?:next|this|coming)\s+)?(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b)"
+    r"|(?P<time>\b\d{1,2}(?::\d{2})?\s*(?:am|pm|a\.m\.|p\.m\.)"
+    r"|\b\d{1,2}\s+o'clock\b|\b\d{1,2}:\d{2}\b)",
+    re.IGNORECASE,
+)
+
+# Only an explicit "my name is" / "call me" may correct a name given earlier
+STATED_NAME_PATTERN = re.compile(
+    r"(?:\bmy name is|\bcall me)\s+(?P<name>" + NAME_WORD + r"(?:\s+" + NAME_WORD + r"){0,2})",
+    re.IGNORECASE,
+)
+
+RECAP_PATTERN = re.compile(
+    r"\b(?P<label>patient name|your name|doctor name|doctor|name|date|time)\**\s*:\s*(?P<value>[^\n]+)",
+    re.IGNORECASE,
+)
+RECAP_FIELDS = {
+    "patient name": "name",
+    "your name": "name",
+    "name": "name",
+    "doctor name": "doctor",
+    "doctor": "doctor",
+    "date": "date",
+    "time": "time",
+}
+
+MARKDOWN_PATTERN = re.compile(r"\*\*(.*?)\*\*|\*(.*?)\*|_(.*?)_")
+
+
+@dataclass(frozen=True)
+class ExtractedSlots:
+    """Booking slots found in a piece of text; missing slots are None"""
+    name: Optional[str] = None
+    doctor: Optional[str] = None
+    date: Optional[str] = None
+    time: Optional[str] = None
+
+    def get(self, slot):
+        return getattr(self, slot, None)
+
+    def is_complete(self):
+        return all((self.name, self.doctor, self.date, self.time))
+
+    def as_dict(self):
+        return asdict(self)
+
+    def as_patient_info(self):
+        """Same slots under the keys the Streamlit app keeps in patient_info"""
+        return {
+            "name": self.name,
+            "recommended_doctor": self.doctor,
+            "appointment_date": self.date,
+            "appointment_time": self.time,
+        }
+
+
+def clean_markdown(text):
+    """Remove basic Markdown formatting like **bold** or _italic_."""
+    if not text:
+        return text
+    return MARKDOWN_PATTERN.sub(lambda m: m.group(1) or m.group(2) or m.group(3) or "", text).strip()
+
+
+@lru_cache(maxsize=4096)
+def extract_slots(text):
+    """Pull every slot out of a message in one pass; the first mention of each slot wins"""
+    found = {}
+    for match in SLOT_PATTERN.finditer(text or ""):
+        value = match.group(match.lastgroup).strip()
+        slot = "name" if match.lastgroup == "introduced_name" else match.lastgroup
+        if slot in found:
+            continue
+        if slot == "doctor":
+            value = f"Dr. {value.title()}"
+        elif slot == "time":
+            value = value.upper()
+        found[slot] = value
+        if len(found) == 4:
+            break
+    return ExtractedSlots(**found)
+
+
+def stated_name(text):
+    """The name from an explicit "my name is X" / "call me X", or None"""
+    match = STATED_NAME_PATTERN.search(text or "")
+    return match.group("name").strip() if match else None
+
+
+def parse_recap(text):
+    """Parse a 'Patient Name: / Doctor: / Date: / Time:' recap; return None if text isn't one"""
+    found = {}
+    for match in RECAP_PATTERN.finditer(text or ""):
+        slot = RECAP_FIELDS[match.group("label").lower()]
+        if slot not in found:
+            found[slot] = clean_markdown(match.group("value"))
+    if len(found) < 4:
+        return None
+    return ExtractedSlots(**found)
@@ -0,0 +1,146 @@
+import itertools
+import math
+import re
+import threading
+from collections import defaultdict, namedtuple
+from clinic_config import clinic_config, specialty_label
+
+# Complaint words and phrases for each specialty in clinic_details.json
+SYMPTOM_TERMS = {
+    "general_medicine": [
+        "general", "general medicine", "gp", "fever", "flu", "cold", "cough", "sore throat", "throat",
+        "headache", "fatigue", "tired", "tiredness", "nausea", "vomiting", "diarrhea", "stomach",
+        "stomachache", "abdominal", "infection", "checkup", "check up", "physical", "diabetes",
+        "blood sugar", "cholesterol", "allergy", "allergies", "sinus", "congestion", "runny nose",
+        "weight", "blood pressure",
+    ],
+    "cardiology": [
+        "cardiology", "cardiologist", "cardiac", "heart", "chest", "chest pain", "palpitations",
+        "palpitation", "heartbeat", "racing heart", "arrhythmia", "hypertension",
+        "high blood pressure", "blood pressure", "shortness of breath", "breathless",
+        "breathlessness", "angina", "swollen ankles",
+    ],
+    "dermatology": [
+        "dermatology", "dermatologist", "skin", "rash", "rashes", "itch", "itchy", "itching", "acne",
+        "pimples", "eczema", "psoriasis", "mole", "moles", "hives", "dermatitis", "hair loss",
+        "dandruff", "nail", "nails", "wart", "warts", "sunburn", "blisters", "spots",
+    ],
+    "orthopedics": [
+        "orthopedics", "orthopedic", "orthopaedic", "bone", "bones", "fracture", "fractured", "broken",
+        "joint", "joints", "knee", "knees", "back pain", "lower back", "backache", "shoulder", "hip",
+        "ankle", "wrist", "sprain", "sprained", "arthritis", "spine", "neck pain", "sports injury",
+        "ligament", "tendon", "muscle",
+    ],
+    "pediatrics": [
+        "pediatrics", "pediatric", "paediatric", "pediatrician", "child", "children", "kid", "kids",
+        "baby", "infant", "toddler", "newborn", "son", "daughter", "my boy", "my girl",
+        "vaccination", "vaccine", "vaccines", "teething",
+    ],
+    "neurology": [
+        "neurology", "neurologist", "migraine", "migraines", "headache", "headaches", "dizziness",
+        "dizzy", "vertigo", "seizure", "seizures", "epilepsy", "numbness", "numb", "tingling",
+        "memory", "memory loss", "tremor", "tremors", "stroke", "nerve", "nerves", "brain",
+        "fainting", "concussion",
+    ],
+}
+
+# A child's complaint goes to pediatrics whatever the symptom
+TERM_BOOST = {"pediatrics": 1.5}
+# Multi-word terms are stronger evidence than single words
+PHRASE_BOOST = 1.5
+# Added to the score total, so a single weak match is never fully confident
+CONFIDENCE_PRIOR = 0.5
+
+WORD_PATTERN = re.compile(r"[a-z]+")
+
+SpecialtyMatch = namedtuple("SpecialtyMatch", ["specialty", "label", "doctor", "confidence", "terms"])
+
+
+def complaint_terms(text):
+    """Words, word pairs and word triples of text, lowercased, for looking up in the index"""
+    words = WORD_PATTERN.findall((text or "").lower())
+    terms = list(words)
+    terms.extend(" ".join(pair) for pair in zip(words, words[1:]))
+    terms.extend(" ".join(triple) for triple in zip(words, words[1:], words[2:]))
+    return terms
+
+
+class SpecialtyRouter:
+    """Maps a free-text complaint to one of the clinic's specialties without the LLM.
+
+    The index is built once per clinic config: each term is weighted by how few
+    specialties share it (IDF), so "rash" points firmly at dermatology while
+    "headache" is split between general medicine and neurology. route() sums the
+    weights of the terms found in a message and reports the best specialty with a
+    confidence in [0, 1), plus the doctor in it with the fewest upcoming bookings.
+    """
+
+    def __init__(self, snapshot=None, availability=None):
+        self.availability = availability
+        self._lock = threading.Lock()
+        # Breaks ties between equally loaded doctors in turn
+        self._turns = itertools.count()
+        self.routed = 0
+        self.unmatched = 0
+        if snapshot is None:
+            # Follow clinic_details.json so added specialties and doctors are routed without a restart
+            snapshot = clinic_config.current()
+            clinic_config.subscribe(self.configure)
+        self.configure(snapshot)
+
+    def configure(self, snapshot):
+        """Rebuild the term index for a clinic config snapshot"""
+        doctors = {specialty: list(names) for specialty, names in snapshot.details["doctors"].items() if names}
+        terms_by_specialty = {
+            # Specialties without a term list are still found by name
+            specialty: set(SYMPTOM_TERMS.get(specialty, [])) | {specialty_label(specialty).lower()}
+            for specialty in doctors
+        }
+        specialties_per_term = defaultdict(int)
+        for terms in terms_by_specialty.values():
+            for term in terms:
+                specialties_per_term[term] += 1
+
+        index = defaultdict(list)
+        for specialty, terms in terms_by_specialty.items():
+            for term in terms:
+                weight = math.log(1 + len(doctors) / specialties_per_term[term])
+                weight *= TERM_BOOST.get(specialty, 1.0) * (PHRASE_BOOST if " " in term else 1.0)
+                index[term].append((specialty, weight))
+        self._index = (dict(index), doctors)
+
+    def route(self, text):
+        """Return the SpecialtyMatch for a complaint, or None if nothing in it points anywhere"""
+        index, doctors = self._index
+        scores = defaultdict(float)
+        matched = defaultdict(list)
+        for term in complaint_terms(text):
+            for specialty, weight in index.get(term, ()):
+                scores[specialty] += weight
+                matched[specialty].append(term)
+        if not scores:
+            self.unmatched += 1
+            return None
+
+        specialty = max(scores, key=scores.get)
+        confidence = scores[specialty] / (sum(scores.values()) + CONFIDENCE_PRIOR)
+        self.routed += 1
+        return SpecialtyMatch(specialty, specialty_label(specialty), self._pick_doctor(doctors[specialty]),
+                              round(confidence, 3), matched[specialty])
+
+    def mentions(self, text):
+        """True if text holds any complaint or specialty term the router knows"""
+        index, _ = self._index
+        return any(term in index for term in complaint_terms(text))
+
+    def stats(self):
+        return {"routed": self.routed, "unmatched": self.unmatched}
+
+    def _pick_doctor(self, candidates):
+        """The least booked doctor of a specialty, taking turns between equally booked ones"""
+        with self._lock:
+            turn = next(self._turns)
+        rotated = candidates[turn % len(candidates):] + candidates[:turn % len(candidates)]
+        if not self.availability:
+            return rotated[0]
+        return min(rotated, key=self.availability.upcoming_bookings)
@@ -0,0 +1,53 @@
+import os
+import sys
+from datetime import date, timedelta
+
+import pytest
+
+# The modules live flat in the repository root, as they are imported by main.py and app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel  # noqa: E402
+
+from availability import AvailabilityEngine  # noqa: E402
+from chatbot_engine import ChatbotEngine  # noqa: E402
+from clinic_config import clinic_config  # noqa: E402
+from faq_router import FAQRouter  # noqa: E402
+from specialty_router import SpecialtyRouter  # noqa: E402
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+
+def future_day(weekday, weeks=1):
+    """The first given weekday at least `weeks` weeks from today, so slots are always in the future"""
+    start = date.today() + timedelta(weeks=weeks)
+    return start + timedelta(days=(WEEKDAYS.index(weekday) - start.weekday()) % 7)
+
+
+def spoken(day):
+    """A date the way a patient types it, e.g. "November 03, 2026" """
+    return day.strftime("%B %d, %Y")
+
+
+@pytest.fixture
+def availability():
+    # Built from a snapshot so it doesn't subscribe to clinic_details.json reloads
+    return AvailabilityEngine(snapshot=clinic_config.current())
+
+
+@pytest.fixture
+def specialty_router(availability):
+    return SpecialtyRouter(snapshot=clinic_config.current(), availability=availability)
+
+
+@pytest.fixture
+def make_engine(availability, specialty_router):
+    """Build a ChatbotEngine on a fake LLM that answers with `replies` in turn"""
+
+    def make(replies=("Hello! May I know your name?",), **kwargs):
+        kwargs.setdefault("availability", availability)
+        kwargs.setdefault("specialty_router", specialty_router)
+        kwargs.setdefault("faq_router", FAQRouter(snapshot=clinic_config.current()))
+        return ChatbotEngine(llm=FakeListChatModel(responses=list(replies)), **kwargs)
+
+    return make
@@ -0,0 +1,85 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+import chatbot_engine
+import main
+from llm_resilience import CircuitBreaker
+
+
+def no_llm(model=None):
+    raise RuntimeError("GROQ_API_KEY is not set")
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """The API with an LLM client that can't be built"""
+    monkeypatch.setattr(chatbot_engine, "create_llm", no_llm)
+    monkeypatch.setattr(main.chatbot, "_llm", None)
+    monkeypatch.setattr(main, "llm_breaker", CircuitBreaker())
+    return TestClient(main.app)
+
+
+def stream_events(response):
+    events = []
+    for frame in response.text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in frame.splitlines())
+        events.append((lines.get("event"), json.loads(lines["data"])))
+    return events
+
+
+def test_chat_without_an_llm_client_still_answers(api):
+    response = api.post("/chat", json={"message": "What are your working hours?"})
+    assert response.status_code == 200
+    assert "Weekdays 9:00 AM - 6:00 PM" in response.json()["response"]
+
+    response = api.post("/chat", json={"message": "Hi", "session_id": response.json()["session_id"]})
+    assert response.status_code == 200
+    assert "name" in response.json()["response"].lower()
+
+
+def test_chat_stream_without_an_llm_client_still_answers(api):
+    response = api.post("/chat/stream", json={"message": "Hi"})
+    assert response.status_code == 200
+    events = stream_events(response)
+    assert events[0][0] == "session"
+    assert events[-1][0] == "done"
+    assert "name" in events[-1][1]["response"].lower()
+
+
+class BrokenSessions:
+    def get_or_create(self, session_id=None):
+        raise RuntimeError("session store unavailable")
+
+    def touch(self, session_id):
+        pass
+
+
+def test_session_store_failure_is_not_a_500(api, monkeypatch):
+    monkeypatch.setattr(main, "sessions", BrokenSessions())
+    response = api.post("/chat", json={"message": "Hi"})
+    assert response.status_code == 200
+    assert "technical difficulties" in response.json()["response"]
+
+    events = stream_events(api.post("/chat/stream", json={"message": "Hi"}))
+    assert events[-1][0] == "error"
+
+
+def test_batch_conversations_stay_out_of_the_chat_sessions(api):
+    live = api.post("/chat", json={"message": "What are your working hours?"}).json()["session_id"]
+    before = main.sessions.stats()
+
+    response = api.post("/chat/batch", json={"items": [
+        {"message": "What are your working hours?"},
+        {"message": "My name is Ann Lee", "session_id": "a"},
+        {"message": "Where are you located?", "session_id": "a"},
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["session_id"] for result in results] == [None, "a", "a"]
+    assert results[2]["appointment"]["patient_name"] == "Ann Lee"
+    assert "123 Medical Plaza" in results[2]["response"]
+
+    assert main.sessions.stats() == before
+    assert main.sessions.get_or_create(live)[0] == live
@@ -0,0 +1,62 @@
+import threading
+
+from appointment_queue import AppointmentQueue
+
+
+class RecordingSheets:
+    def __init__(self, fail=False):
+        self.rows = []
+        self.fail = fail
+        self._lock = threading.Lock()
+
+    def add_appointments(self, rows):
+        if self.fail:
+            raise RuntimeError("Sheets unavailable")
+        with self._lock:
+            self.rows.extend(tuple(row) for row in rows)
+
+
+def test_flush_sends_pending_rows_and_clears_the_log(tmp_path):
+    sheets = RecordingSheets()
+    queue = AppointmentQueue(sheets, db_path=str(tmp_path / "queue.db"), batch_size=2)
+    for patient in ("Ann Lee", "Bo Chan", "Cy Doe"):
+        queue.enqueue(patient, "Dr. Smith", "2030-01-07", "10:00")
+    assert queue.pending_count() == 3
+
+    assert queue.flush_once()
+    assert queue.flush_once()
+    assert queue.pending_count() == 0
+    assert [row[1] for row in sheets.rows] == ["Ann Lee", "Bo Chan", "Cy Doe"]
+
+
+def test_failed_flush_keeps_rows_for_the_next_attempt(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    failing = AppointmentQueue(RecordingSheets(fail=True), db_path=db_path)
+    failing.enqueue("Ann Lee", "Dr. Smith", "2030-01-07", "10:00")
+    assert not failing.flush_once()
+
+    sheets = RecordingSheets()
+    assert AppointmentQueue(sheets, db_path=db_path).flush_once()
+    assert len(sheets.rows) == 1
+
+
+def test_workers_sharing_a_log_send_each_row_once(tmp_path):
+    db_path = str(tmp_path / "queue.db")
+    sheets = RecordingSheets()
+    queues = [AppointmentQueue(sheets, db_path=db_path, batch_size=5) for _ in range(4)]
+    for number in range(60):
+        queues[number % 4].enqueue(f"Patient {number}", "Dr. Smith", "2030-01-07", "10:00")
+
+    def flush(queue):
+        for _ in range(10):
+            queue.flush_once()
+
+    threads = [threading.Thread(target=flush, args=(queue,)) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(sheets.rows) == 60
+    assert len(set(sheets.rows)) == 60
+    assert queues[0].pending_count() == 0
@@ -0,0 +1,210 @@
+import asyncio
+
+from conftest import future_day, spoken
+
+
+def chat(engine, *messages):
+    """Send messages in turn; return the last reply"""
+    reply = None
+    for message in messages:
+        reply = asyncio.run(engine.aget_response(message))
+    return reply
+
+
+def test_booking_walks_through_every_state(make_engine):
+    engine = make_engine()
+    assert engine.booking.state == "asking_name"
+
+    chat(engine, "My name is Ayesha Khan")
+    assert engine.booking.state == "asking_doctor"
+    assert engine.booking.name == "Ayesha Khan"
+
+    reply = chat(engine, "I'd like to see Dr. Williams")
+    assert engine.booking.state == "asking_time"
+    assert "Dr. Williams" in reply
+
+    day = future_day("tuesday")
+    reply = chat(engine, f"{spoken(day)} at 10:00 AM")
+    assert engine.booking.state == "confirming"
+    assert "reply 'confirm'" in reply
+    assert engine.booking.details()["appointment_date"] == day.isoformat()
+    assert engine.booking.details()["appointment_time"] == "10:00"
+
+    reply = chat(engine, "Yes, please confirm")
+    assert engine.booking.state == "done"
+    assert "Patient Name: Ayesha Khan" in reply
+    assert engine.booking.appointment() == {
+        "patient_name": "Ayesha Khan",
+        "recommended_doctor": "Dr. Williams",
+        "appointment_date": day.isoformat(),
+        "appointment_time": "10:00",
+    }
+
+
+def test_closed_day_is_refused_and_time_asked_again(make_engine):
+    engine = make_engine()
+    reply = chat(engine, "Hi, I'm Omar Ali and I want to see Dr. Thomas",
+                 f"{spoken(future_day('sunday'))} at 10 AM")
+    assert "closed on Sundays" in reply
+    assert engine.booking.state == "asking_time"
+    assert engine.booking.time is None
+
+
+def test_declining_keeps_the_offer_open(make_engine):
+    engine = make_engine(replies=["Of course, what time would suit you better?"])
+    chat(engine, "My name is Ann Lee", "Dr. Smith", f"{spoken(future_day('wednesday'))} at 2:30 PM")
+    chat(engine, "No, not that one")
+    assert engine.booking.state == "confirming"
+    assert engine.booking.appointment() is None
+
+
+def test_slot_taken_by_another_patient_is_not_offered(make_engine, availability):
+    day = future_day("thursday")
+    first = make_engine()
+    chat(first, "My name is Ann Lee", "Dr. Smith", f"{spoken(day)} at 11:00 AM")
+    assert availability.book("Dr. Smith", first.booking.slot_dt)
+
+    second = make_engine()
+    reply = chat(second, "My name is Bo Chan", "Dr. Smith", f"{spoken(day)} at 11:00 AM")
+    assert "not available at that time" in reply
+    assert second.booking.state == "asking_time"
+
+
+def test_conflict_on_save_reopens_the_time(make_engine):
+    saved = []
+
+    def save(**appointment):
+        if not saved:
+            saved.append(appointment)
+            return "conflict", [f"{appointment['appointment_date']} 10:30"]
+        saved.append(appointment)
+        return "booked", []
+
+    engine = make_engine(save_appointment=save)
+    day = future_day("tuesday")
+    chat(engine, "My name is Bo Chan", "Dr. Williams", f"{spoken(day)} at 10:00 AM")
+
+    reply = chat(engine, "confirm")
+    assert "has just been booked by another patient" in reply
+    assert "10:30 AM" in reply
+    assert "scheduled" not in reply
+    assert engine.booking.state == "asking_time"
+    assert engine.booking.save_status == "conflict"
+
+    chat(engine, f"{spoken(day)} at 11:00 AM")
+    reply = chat(engine, "confirm")
+    assert engine.booking.state == "done"
+    assert engine.booking.save_status == "booked"
+    assert saved[-1]["appointment_time"] == "11:00"
+
+
+def test_confirmed_appointment_is_saved_once(make_engine):
+    saved = []
+    engine = make_engine(save_appointment=lambda **appointment: saved.append(appointment) or ("booked", []))
+    chat(engine, "My name is Ann Lee", "Dr. Smith", f"{spoken(future_day('friday'))} at 3 PM", "confirm")
+    chat(engine, "ok thanks")
+    assert len(saved) == 1
+
+
+def test_session_state_survives_a_dump_and_load(make_engine):
+    engine = make_engine()
+    chat(engine, "My name is Ann Lee", "Dr. Smith", f"{spoken(future_day('friday'))} at 3 PM")
+
+    restored = make_engine()
+    restored.load_state(engine.dump_state())
+    assert restored.booking.state == "confirming"
+    assert restored.booking.details() == engine.booking.details()
+    assert [m.content for m in restored.conversation_history] == [m.content for m in engine.conversation_history]
+
+
+ASK_PROBLEM = "Thank you! What brings you in today?"
+
+
+def recap(name, doctor, date, time, closing="Shall I go ahead and book it?"):
+    return f"Let me make sure I have this right:\nPatient Name: {name}\nDoctor: {doctor}\nDate: {date}\nTime: {time}\n\n{closing}"
+
+
+def test_llm_recap_fills_slots_but_does_not_book(make_engine):
+    saved = []
+    day = future_day("wednesday")
+    engine = make_engine(replies=[ASK_PROBLEM, recap("Ann Lee", "Dr. Smith", spoken(day), "2:30 PM")],
+                         save_appointment=lambda **appointment: saved.append(appointment) or ("booked", []))
+    chat(engine, "My name is Ann Lee")
+    reply = chat(engine, "The GP, half past two on the day after next Tuesday")
+    assert reply.startswith("Let me make sure")
+    assert engine.booking.state == "confirming"
+    assert engine.booking.appointment() is None
+    assert not saved
+
+    reply = chat(engine, "No wait, make it 4 PM")
+    assert engine.booking.state == "confirming"
+    assert engine.booking.details()["appointment_time"] == "16:00"
+    assert not saved
+
+    chat(engine, "Yes, confirm")
+    assert engine.booking.state == "done"
+    assert saved[0]["appointment_time"] == "16:00"
+
+
+def test_llm_recap_of_an_invalid_slot_is_corrected(make_engine):
+    engine = make_engine(replies=[ASK_PROBLEM, recap("Ann Lee", "Dr. Smith", "January 05, 2021", "10:00 AM", "All booked!")])
+    chat(engine, "My name is Ann Lee")
+    reply = chat(engine, "Whatever is earliest, you choose")
+    assert "future date" in reply
+    assert engine.booking.state == "asking_time"
+    assert engine.conversation_history[-1].content == reply
+
+
+def test_llm_recap_on_a_closed_day_is_not_adopted(make_engine):
+    day = future_day("sunday")
+    engine = make_engine(replies=[ASK_PROBLEM, recap("Ann Lee", "Dr. Smith", spoken(day), "10:00 AM")])
+    chat(engine, "My name is Ann Lee")
+    reply = chat(engine, "Whatever is earliest, you choose")
+    assert "closed on Sundays" in reply
+    assert engine.booking.state == "asking_time"
+
+
+def test_llm_claiming_a_booking_is_turned_into_an_offer(make_engine):
+    day = future_day("thursday")
+    engine = make_engine(replies=[ASK_PROBLEM, recap("Ann Lee", "Dr. Smith", spoken(day), "11:00 AM", "Your appointment is booked!")])
+    chat(engine, "My name is Ann Lee")
+    reply = chat(engine, "yes go ahead")
+    assert "reply 'confirm'" in reply
+    assert "booked!" not in reply
+    assert engine.booking.state == "confirming"
+
+
+def test_streamed_recap_is_followed_by_the_correction(make_engine):
+    engine = make_engine(replies=[ASK_PROBLEM, recap("Ann Lee", "Dr. Smith", "January 05, 2021", "10:00 AM")])
+    chat(engine, "My name is Ann Lee")
+
+    async def stream():
+        return [token async for token in engine.astream_response("Whatever is earliest, you choose")]
+
+    reply = "".join(asyncio.run(stream()))
+    assert reply.startswith("Let me make sure")
+    assert reply.endswith("Could you please choose another date and time?")
+    assert engine.booking.state == "asking_time"
+
+
+def test_booking_request_naming_a_specialty_keeps_its_date_and_time(make_engine):
+    engine = make_engine()
+    chat(engine, "My name is Ann Lee")
+    chat(engine, "Can I see a cardiologist on Monday at 10am?")
+    assert engine.booking.date == "Monday"
+    assert engine.booking.time == "10AM"
+    assert engine.booking.doctor == "Dr. Williams"
+
+
+def test_booking_request_with_a_contact_question_keeps_the_doctor(make_engine):
+    engine = make_engine()
+    chat(engine, "My name is Ann Lee")
+    chat(engine, "Could Dr. Brown see me tomorrow at 11am, what is your address?")
+    assert engine.booking.doctor == "Dr. Brown"
+    assert engine.booking.time == "11AM"
+
+
+def test_plain_faq_is_still_answered_mid_booking(make_engine):
+    engine = make_engine()
+    chat(engine, "My name is Ann Lee")
+    assert "123 Medical Plaza" in chat(engine, "What is your address?")
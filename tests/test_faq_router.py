@@ -0,0 +1,30 @@
+from clinic_config import clinic_config
+from faq_router import FAQRouter
+
+
+def make_router():
+    return FAQRouter(snapshot=clinic_config.current())
+
+
+def test_answers_clinic_questions_without_the_llm():
+    router = make_router()
+    assert "Weekdays 9:00 AM - 6:00 PM" in router.answer("What are your working hours?")
+    assert "123 Medical Plaza" in router.answer("Where are you located?")
+    assert "Dr. Williams" in router.answer("Which doctors do you have in cardiology?")
+
+
+def test_leaves_booking_and_free_text_to_the_rest_of_the_engine():
+    router = make_router()
+    assert router.answer("I want to book an appointment") is None
+    assert router.answer("My name is Ann Lee") is None
+    assert router.answer("I have a rash on my arm") is None
+
+
+def test_caches_answers_but_not_patient_text():
+    router = make_router()
+    router.answer("What are your working hours?")
+    router.answer("What are your working hours?")
+    router.answer("My name is Ann Lee")
+    stats = router.stats()
+    assert stats["cache_hits"] == 1
+    assert stats["cache_size"] == 1
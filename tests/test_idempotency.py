@@ -0,0 +1,127 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from availability import AvailabilityEngine
+from clinic_config import clinic_config
+from conftest import future_day
+from idempotency import IdempotencyCache, IdempotencyKeyReused, SQLiteIdempotencyCache, request_fingerprint
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.rows = []
+
+    def enqueue(self, *appointment):
+        self.rows.append(appointment)
+
+
+class EmptyMirror:
+    def contains(self, *appointment):
+        return False
+
+    def record(self, *appointment):
+        pass
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """The API with Sheets swapped for an in-memory queue and a fresh calendar and idempotency cache"""
+    queue = RecordingQueue()
+    monkeypatch.setattr(main, "sheets_available", True)
+    monkeypatch.setattr(main, "appointment_queue", queue)
+    monkeypatch.setattr(main, "appointment_mirror", EmptyMirror())
+    monkeypatch.setattr(main, "availability", AvailabilityEngine(snapshot=clinic_config.current()))
+    monkeypatch.setattr(main, "idempotency_cache", IdempotencyCache())
+    client = TestClient(main.app)
+    client.queue = queue
+    return client
+
+
+def appointment(patient="Ann Lee", time="10:00"):
+    return {
+        "patient_name": patient,
+        "problem": "Fever",
+        "recommended_doctor": "Dr. Smith",
+        "appointment_date": future_day("monday").isoformat(),
+        "appointment_time": time,
+    }
+
+
+def test_cache_replays_a_stored_result():
+    cache = IdempotencyCache()
+    fingerprint = request_fingerprint({"a": 1})
+    assert cache.get("scope", "key", fingerprint) is None
+    cache.put("scope", "key", fingerprint, 200, {"message": "ok"})
+    assert cache.get("scope", "key", fingerprint) == (200, {"message": "ok"})
+    assert cache.stats()["hits"] == 1
+
+
+def test_cache_rejects_a_key_reused_for_another_request():
+    cache = IdempotencyCache()
+    cache.put("scope", "key", request_fingerprint({"a": 1}), 200, {})
+    with pytest.raises(IdempotencyKeyReused):
+        cache.get("scope", "key", request_fingerprint({"a": 2}))
+
+
+def test_cache_forgets_expired_and_least_recent_entries():
+    cache = IdempotencyCache(max_entries=2, ttl_seconds=0)
+    cache.put("scope", "a", "f", 200, {})
+    assert cache.get("scope", "a", "f") is None
+
+    cache = IdempotencyCache(max_entries=2)
+    for key in "abc":
+        cache.put("scope", key, "f", 200, {})
+    assert cache.get("scope", "a", "f") is None
+    assert len(cache) == 2
+
+
+def test_retry_with_the_same_key_is_replayed_not_booked_again(api):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = api.post("/schedule_appointment", json=appointment(), headers=headers)
+    retry = api.post("/schedule_appointment", json=appointment(), headers=headers)
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+    assert retry.json() == first.json()
+    assert len(api.queue.rows) == 1
+
+
+def test_same_key_with_a_different_body_is_refused(api):
+    headers = {"Idempotency-Key": "retry-2"}
+    api.post("/schedule_appointment", json=appointment(), headers=headers)
+    response = api.post("/schedule_appointment", json=appointment(time="11:00"), headers=headers)
+    assert response.status_code == 422
+
+
+def test_second_patient_for_the_same_slot_gets_a_conflict(api):
+    assert api.post("/schedule_appointment", json=appointment()).status_code == 200
+    response = api.post("/schedule_appointment", json=appointment(patient="Bo Chan"))
+    assert response.status_code == 409
+    assert response.json()["detail"]["alternatives"]
+    assert len(api.queue.rows) == 1
+
+
+def test_conflict_is_replayed_for_its_key(api):
+    api.post("/schedule_appointment", json=appointment())
+    headers = {"Idempotency-Key": "retry-3"}
+    first = api.post("/schedule_appointment", json=appointment(patient="Bo Chan"), headers=headers)
+    retry = api.post("/schedule_appointment", json=appointment(patient="Bo Chan"), headers=headers)
+    assert first.status_code == retry.status_code == 409
+    assert retry.headers.get("Idempotent-Replayed") == "true"
+
+
+def test_sqlite_cache_is_shared_between_workers(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = SQLiteIdempotencyCache(db_path), SQLiteIdempotencyCache(db_path)
+    fingerprint = request_fingerprint(appointment())
+
+    assert worker_b.get("schedule", "key-1", fingerprint) is None
+    worker_a.put("schedule", "key-1", fingerprint, 200, {"message": "Appointment scheduled successfully"})
+    assert worker_b.get("schedule", "key-1", fingerprint) == (200, {"message": "Appointment scheduled successfully"})
+
+    # The first stored result wins
+    worker_b.put("schedule", "key-1", fingerprint, 409, {"detail": "conflict"})
+    assert worker_a.get("schedule", "key-1", fingerprint)[0] == 200
+    with pytest.raises(IdempotencyKeyReused):
+        worker_a.get("schedule", "key-1", request_fingerprint(appointment(time="11:00")))
+    assert len(worker_a) == 1
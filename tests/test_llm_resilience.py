@@ -0,0 +1,102 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from llm_resilience import CircuitBreaker, hedged_invoke
+
+
+class SlowModel(FakeListChatModel):
+    delay: float = 0.0
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.delay)
+        return await super().ainvoke(messages, *args, **kwargs)
+
+
+class FailingModel(FakeListChatModel):
+    async def ainvoke(self, messages, *args, **kwargs):
+        raise RuntimeError("provider down")
+
+
+def test_breaker_opens_on_errors_and_closes_after_a_good_probe():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, p95_seconds=10, open_seconds=0.05)
+    for ok in (True, False, False, False):
+        breaker.record(0.1, ok)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record(0.1, ok=True)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_breaker_opens_on_slow_calls():
+    breaker = CircuitBreaker(window=10, min_calls=4, error_rate=0.5, p95_seconds=1, open_seconds=30)
+    for _ in range(4):
+        breaker.record(2.0, ok=True)
+    assert breaker.state == "open"
+    assert breaker.stats()["trips"] == 1
+
+
+def test_failed_probe_opens_the_breaker_again():
+    breaker = CircuitBreaker(window=10, min_calls=1, error_rate=0.5, p95_seconds=10, open_seconds=0.01)
+    breaker.record(0.1, ok=False)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record(0.1, ok=False)
+    assert breaker.state == "open"
+
+
+def test_hedge_answers_when_the_primary_is_slow():
+    primary = SlowModel(responses=["primary"], delay=1.0)
+    hedge = FakeListChatModel(responses=["hedge"])
+    start = time.monotonic()
+    reply = asyncio.run(hedged_invoke(primary, hedge, "hi", hedge_after=0.05))
+    assert reply.content == "hedge"
+    assert time.monotonic() - start < 0.5
+
+
+def test_hedge_takes_over_when_the_primary_fails():
+    reply = asyncio.run(hedged_invoke(FailingModel(responses=["x"]), FakeListChatModel(responses=["hedge"]),
+                                      "hi", hedge_after=5))
+    assert reply.content == "hedge"
+
+
+def test_without_a_hedge_errors_propagate():
+    with pytest.raises(RuntimeError):
+        asyncio.run(hedged_invoke(FailingModel(responses=["x"]), None, "hi", hedge_after=0.05))
+
+
+def test_engine_answers_from_templates_when_the_llm_fails(make_engine):
+    engine = make_engine(breaker=CircuitBreaker())
+    engine.llm = FailingModel(responses=["x"])
+    reply = asyncio.run(engine.aget_response("Hi"))
+    assert "name" in reply.lower()
+    assert engine.booking.state == "asking_name"
+
+
+def test_engine_without_a_breaker_still_raises(make_engine):
+    engine = make_engine()
+    engine.llm = FailingModel(responses=["x"])
+    with pytest.raises(RuntimeError):
+        asyncio.run(engine.aget_response("Hi"))
+
+
+def test_sync_get_response_goes_through_the_breaker(make_engine):
+    engine = make_engine(breaker=CircuitBreaker())
+    engine.llm = FailingModel(responses=["x"])
+    assert "name" in engine.get_response("Hi").lower()
+    assert engine.breaker.stats()["recent_error_rate"] == 1.0
+
+
+def test_sync_get_response_answers_from_the_llm(make_engine):
+    engine = make_engine(replies=["first", "second"])
+    assert engine.get_response("Hi") == "first"
+    assert engine.get_response("Hello again") == "second"
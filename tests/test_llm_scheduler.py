@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+
+from llm_scheduler import LANE_BOOKING, LANE_CONFIRM, LANE_NEW, LLMQueueFullError, LLMScheduler
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def test_waiting_calls_start_in_lane_order():
+    scheduler = LLMScheduler(max_concurrent=1, max_waiting=10, wait_timeout=5)
+    started = []
+
+    async def call(name, lane):
+        async with scheduler.slot(lane):
+            started.append(name)
+            await asyncio.sleep(0.01)
+
+    async def scenario():
+        async with scheduler.slot(LANE_NEW):
+            tasks = [asyncio.create_task(call("new", LANE_NEW)),
+                     asyncio.create_task(call("booking", LANE_BOOKING)),
+                     asyncio.create_task(call("confirm", LANE_CONFIRM))]
+            await asyncio.sleep(0.01)
+        await asyncio.gather(*tasks)
+
+    run(scenario())
+    assert started == ["confirm", "booking", "new"]
+
+
+async def hold(scheduler, lane, release):
+    async with scheduler.slot(lane):
+        await release.wait()
+
+
+def test_full_queue_sheds_a_less_important_caller():
+    scheduler = LLMScheduler(max_concurrent=1, max_waiting=1, wait_timeout=5)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(scheduler, LANE_NEW, release))
+        await asyncio.sleep(0)
+        greeting = asyncio.create_task(hold(scheduler, LANE_NEW, release))
+        await asyncio.sleep(0)
+        confirm = asyncio.create_task(hold(scheduler, LANE_CONFIRM, release))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMQueueFullError):
+            await greeting
+        release.set()
+        await asyncio.gather(running, confirm)
+
+    run(scenario())
+    assert scheduler.shed == 1
+    assert scheduler.in_flight == 0
+
+
+def test_full_queue_rejects_a_caller_it_cannot_make_room_for():
+    scheduler = LLMScheduler(max_concurrent=1, max_waiting=1, wait_timeout=5)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(hold(scheduler, LANE_CONFIRM, release))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold(scheduler, LANE_CONFIRM, release))
+        await asyncio.sleep(0)
+        with pytest.raises(LLMQueueFullError):
+            await hold(scheduler, LANE_NEW, release)
+        release.set()
+        await asyncio.gather(running, waiting)
+
+    run(scenario())
+    assert scheduler.rejected == 1
+
+
+def test_no_queue_at_all_rejects_instead_of_failing():
+    scheduler = LLMScheduler(max_concurrent=1, max_waiting=0)
+
+    async def scenario():
+        async with scheduler.slot():
+            with pytest.raises(LLMQueueFullError):
+                async with scheduler.slot():
+                    pass
+
+    run(scenario())
+
+
+def test_request_rate_limit_turns_away_calls_that_would_wait_too_long():
+    scheduler = LLMScheduler(max_concurrent=10, wait_timeout=0.1, requests_per_minute=1)
+
+    async def scenario():
+        async with scheduler.slot():
+            pass
+        with pytest.raises(LLMQueueFullError) as error:
+            async with scheduler.slot():
+                pass
+        return error.value.retry_after
+
+    assert run(scenario()) >= 1
@@ -0,0 +1,64 @@
+import asyncio
+
+import pytest
+
+from conftest import future_day, spoken
+from slot_extractor import extract_slots
+
+
+def chat(engine, *messages):
+    for message in messages:
+        asyncio.run(engine.aget_response(message))
+    return engine
+
+
+@pytest.mark.parametrize("reply", [
+    "good morning", "book appointment", "I need help", "next week", "in the afternoon", "hmm", "urgent",
+])
+def test_bare_replies_that_are_not_names_are_ignored(make_engine, reply):
+    engine = make_engine(replies=["Hello! May I know your name?"] * 2)
+    chat(engine, "Hello", reply)
+    assert engine.booking.name is None
+    assert engine.booking.state == "asking_name"
+
+
+def test_bare_name_reply_is_taken(make_engine):
+    engine = chat(make_engine(), "Hello", "Ayesha Khan")
+    assert engine.booking.name == "Ayesha Khan"
+
+
+def test_stated_name_corrects_an_earlier_one(make_engine):
+    engine = make_engine(replies=["Hello! May I know your name?", "Thanks! Which doctor would you like to see?"])
+    chat(engine, "Hello", "Ayesha")
+    chat(engine, "Sorry, my name is Ayesha Khan")
+    assert engine.booking.name == "Ayesha Khan"
+
+
+def test_later_im_does_not_replace_the_name(make_engine):
+    engine = chat(make_engine(), "My name is Ann Lee", "I'm Free On Monday")
+    assert engine.booking.name == "Ann Lee"
+
+
+@pytest.mark.parametrize("message", ["I'm pregnant", "I'm diabetic", "I am Dr. Smith's patient", "I'm Pregnant"])
+def test_conditions_and_titles_after_im_are_not_names(message):
+    assert extract_slots(message).name is None
+
+
+def test_im_takes_capitalised_names_and_my_name_is_any_case():
+    assert extract_slots("Hi, I'm Omar Ali and I need Dr. Thomas").name == "Omar Ali"
+    assert extract_slots("i'm worried about my blood sugar").name is None
+    assert extract_slots("my name is ann lee").name == "ann lee"
+
+
+def test_condition_reply_to_the_name_question_is_not_a_name(make_engine):
+    engine = make_engine(replies=["Hello! May I know your name?"] * 2)
+    chat(engine, "Hello", "I'm pregnant")
+    assert engine.booking.name is None
+
+
+def test_patients_surname_is_not_taken_for_a_doctor_in_the_availability_check(make_engine):
+    engine = chat(make_engine(), "My name is Ann Brown")
+    day = spoken(future_day("friday"))
+    assert engine._availability_note(f"I'm Ann Brown, could I come {day} at 10 AM?") is None
+    note = engine._availability_note(f"Could Dr. Brown see me {day} at 10 AM?")
+    assert "Dr. Brown" in note.content
@@ -0,0 +1,47 @@
+import asyncio
+
+from session_store import SessionStore, SharedSessionStore, SQLiteSessionBackend, decode_session, encode_session
+
+
+def test_memory_store_keeps_sessions_and_evicts_the_least_recent(make_engine):
+    store = SessionStore(make_engine, max_sessions=2)
+    first, engine = store.get_or_create()
+    assert store.get_or_create(first) == (first, engine)
+
+    second, _ = store.get_or_create()
+    store.get_or_create()
+    assert store.get_or_create(second)[0] == second
+    assert store.get_or_create(first)[0] != first
+    assert store.stats()["evictions"] >= 1
+
+
+def test_unknown_session_id_starts_a_new_session(make_engine):
+    store = SessionStore(make_engine)
+    session_id, _ = store.get_or_create("not-a-session")
+    assert session_id != "not-a-session"
+
+
+def test_encoded_session_round_trips(make_engine):
+    engine = make_engine()
+    asyncio.run(engine.aget_response("My name is Ann Lee"))
+    restored = make_engine()
+    assert decode_session(encode_session(engine), restored)
+    assert restored.booking.name == "Ann Lee"
+    assert not decode_session(b"not a session", make_engine())
+
+
+def test_shared_store_carries_a_session_between_workers(tmp_path, make_engine):
+    db_path = str(tmp_path / "sessions.db")
+    worker_a = SharedSessionStore(make_engine, SQLiteSessionBackend(db_path))
+    worker_b = SharedSessionStore(make_engine, SQLiteSessionBackend(db_path))
+
+    session_id, engine = worker_a.get_or_create()
+    asyncio.run(engine.aget_response("My name is Ann Lee"))
+    worker_a.touch(session_id)
+
+    same_id, resumed = worker_b.get_or_create(session_id)
+    assert same_id == session_id
+    assert resumed.booking.name == "Ann Lee"
+
+    assert worker_b.delete(session_id)
+    assert worker_a.get_or_create(session_id)[0] != session_id
@@ -0,0 +1,33 @@
+from datetime import datetime
+
+from availability import AvailabilityEngine
+from clinic_config import clinic_config
+from conftest import future_day
+from slot_claims import SQLiteSlotClaims
+
+
+def worker(db_path):
+    return AvailabilityEngine(snapshot=clinic_config.current(), claims=SQLiteSlotClaims(db_path))
+
+
+def test_workers_sharing_claims_cannot_book_the_same_slot(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = worker(db_path), worker(db_path)
+    when = datetime.combine(future_day("monday"), datetime.min.time()).replace(hour=10)
+
+    assert worker_b.is_free("Dr. Smith", when)
+    assert worker_a.book("Dr. Smith", when)
+    assert not worker_b.book("dr smith", when)
+    # The losing worker now knows the slot is gone
+    assert not worker_b.is_free("Dr. Smith", when)
+    assert worker_b.book("Dr. Williams", when)
+
+
+def test_released_slot_can_be_claimed_again(tmp_path):
+    db_path = str(tmp_path / "sessions.db")
+    worker_a, worker_b = worker(db_path), worker(db_path)
+    when = datetime.combine(future_day("tuesday"), datetime.min.time()).replace(hour=11)
+
+    assert worker_a.book("Dr. Smith", when)
+    worker_a.release("Dr. Smith", when)
+    assert worker_b.book("Dr. Smith", when)